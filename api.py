@@ -0,0 +1,468 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, quote, urlsplit
+
+import clicks
+import database
+import health
+import importer
+import store
+import urls
+import writer
+
+HOST = os.environ.get('LINK_MANAGER_API_HOST', '127.0.0.1')
+PORT = int(os.environ.get('LINK_MANAGER_API_PORT', '8600'))
+# Threads running data functions; each keeps its own pooled connection
+WORKERS = 16
+MAX_BODY = 1024 * 1024
+MAX_PAGE_SIZE = 500
+DEFAULT_PAGE_SIZE = 25
+# Most links one batch request may create or delete
+MAX_BATCH = 1000
+# Seconds an idle keep-alive connection stays open
+IDLE_TIMEOUT = 30
+
+REASONS = {
+    200: 'OK', 201: 'Created', 202: 'Accepted', 204: 'No Content', 302: 'Found', 400: 'Bad Request', 401: 'Unauthorized',
+    404: 'Not Found', 405: 'Method Not Allowed', 409: 'Conflict', 411: 'Length Required',
+    413: 'Payload Too Large', 500: 'Internal Server Error', 501: 'Not Implemented'
+}
+LINK_FIELDS = ('id', 'name', 'url', 'description', 'created_at')
+# Reserved and already-escaped characters left alone when a URL goes into a Location header
+URL_CHARACTERS = ":/?#[]@!$&'()*+,;=%~"
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Request:
+    def __init__(self, method, target, headers, body):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path.rstrip('/') or '/'
+        self.query = {name: values[-1] for name, values in parse_qs(parts.query).items()}
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        try:
+            data = json.loads(self.body or b'{}')
+        except ValueError as e:
+            raise HTTPError(400, f"Invalid JSON body: {e}")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "The JSON body must be an object")
+        return data
+
+    def int_param(self, name, default=None, maximum=None):
+        value = self.query.get(name)
+        if value is None:
+            return default
+        try:
+            number = int(value)
+        except ValueError:
+            raise HTTPError(400, f"{name} must be an integer")
+        if number < 1:
+            raise HTTPError(400, f"{name} must be positive")
+        return min(number, maximum) if maximum else number
+
+    def tag_filter(self):
+        """(tag_ids, match_all) from ?tags=1,2&match=all"""
+        try:
+            tag_ids = tuple(sorted({int(tag_id) for tag_id in self.query.get('tags', '').split(',') if tag_id}))
+        except ValueError:
+            raise HTTPError(400, "tags must be comma-separated tag ids")
+        return tag_ids, self.query.get('match', 'any') == 'all'
+
+
+def link_json(row):
+    """JSON object for a link row (page rows also carry health and page metadata)"""
+    data = dict(zip(LINK_FIELDS, row))
+    if len(row) == 7:
+        data['health_status'] = row[5]
+        data['meta_description'] = row[6]
+    return data
+
+
+def search_cursor(cursor):
+    return None if cursor is None else f"{cursor[0]!r}:{cursor[1]}"
+
+
+def parse_search_cursor(value):
+    if value is None:
+        return None
+    try:
+        rank, last_id = value.rsplit(':', 1)
+        return float(rank), int(last_id)
+    except ValueError:
+        raise HTTPError(400, "Invalid cursor")
+
+
+def clean_url(url):
+    link = urls.normalize_url(url) if isinstance(url, str) else None
+    if link is None:
+        raise HTTPError(400, f"Not a web link: {url!r}")
+    return link
+
+
+def tag_names(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return store.parse_tags(value)
+    if isinstance(value, list):
+        return store.parse_tags(','.join(str(name) for name in value))
+    raise HTTPError(400, "tags and collections must be a list or a comma-separated string")
+
+
+def outcome(success, message, status=200):
+    """Response for a store (success, message) result"""
+    if success:
+        return status, {'message': message}
+    if 'not found' in message.lower():
+        raise HTTPError(404, message)
+    if 'already saved' in message:
+        raise HTTPError(409, message)
+    raise HTTPError(400, message)
+
+
+def list_links(user_id, request):
+    health_filter = request.query.get('health')
+    if health_filter and health_filter not in health.HEALTH_FILTERS:
+        raise HTTPError(400, f"health must be one of {', '.join(health.HEALTH_FILTERS)}")
+    tag_ids, match_all = request.tag_filter()
+    links, next_cursor = store.get_links_page(
+        user_id, request.int_param('cursor'), request.int_param('limit', DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE),
+        health_filter, tag_ids, match_all
+    )
+    return 200, {'links': [link_json(link) for link in links], 'next_cursor': next_cursor}
+
+
+def search(user_id, request):
+    query = request.query.get('q', '').strip()
+    if not query:
+        raise HTTPError(400, "q is required")
+    tag_ids, match_all = request.tag_filter()
+    results, next_cursor, total = store.search_links_page(
+        user_id, query, parse_search_cursor(request.query.get('cursor')),
+        request.int_param('limit', DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE), tag_ids, match_all,
+        request.query.get('fuzzy', '') not in ('', '0')
+    )
+    return 200, {
+        'results': [dict(link_json(row), highlight=row[5], snippet=row[6]) for row in results],
+        'next_cursor': search_cursor(next_cursor),
+        'total': total
+    }
+
+
+def get_link(user_id, request, link_id):
+    link = store.get_link(user_id, int(link_id))
+    if link is None:
+        raise HTTPError(404, "Link not found.")
+    tags = store.get_link_tags(user_id, link[0])
+    return 200, dict(link_json(link), tags=tags['tag'], collections=tags['collection'])
+
+
+def create_link(user_id, request):
+    data = request.json()
+    name = str(data.get('name') or '').strip()
+    if not name:
+        raise HTTPError(400, "name is required")
+    link = clean_url(data.get('url') or data.get('link'))
+    # Written directly (not through the batch writer) so the response can carry the new id
+    success, message, link_id = store.create_link(
+        user_id, name, link, str(data.get('description') or ''),
+        tag_names(data.get('tags')), tag_names(data.get('collections'))
+    )
+    status, payload = outcome(success, message, 201)
+    payload['id'] = link_id
+    return status, payload
+
+
+def update_link(user_id, request, link_id):
+    data = request.json()
+    current = store.get_link(user_id, int(link_id))
+    if current is None:
+        raise HTTPError(404, "Link not found.")
+    url = data.get('url') or data.get('link')
+    # Fields and tags change in one transaction, so a failed tag update leaves the link untouched
+    return outcome(*writer.link_writes().update_link(
+        current[0], user_id,
+        str(data.get('name') or current[1]),
+        clean_url(url) if url else current[2],
+        str(data['description']) if data.get('description') is not None else current[3],
+        tag_names(data['tags']) if 'tags' in data else None,
+        tag_names(data['collections']) if 'collections' in data else None
+    ))
+
+
+def delete_link(user_id, request, link_id):
+    return outcome(*writer.link_writes().delete_link(int(link_id), user_id))
+
+
+def batch_items(data, field):
+    items = data.get(field)
+    if not isinstance(items, list) or not items:
+        raise HTTPError(400, f"{field} must be a non-empty list")
+    if len(items) > MAX_BATCH:
+        raise HTTPError(413, f"At most {MAX_BATCH} {field} per request")
+    return items
+
+
+def create_links(user_id, request):
+    rows = []
+    for record in batch_items(request.json(), 'links'):
+        if not isinstance(record, dict) or not str(record.get('name') or '').strip():
+            raise HTTPError(400, "Every link needs a name and a url")
+        rows.append((str(record['name']).strip(), clean_url(record.get('url') or record.get('link')),
+                     str(record.get('description') or '')))
+    success, message, link_ids = store.create_links(user_id, rows)
+    status, payload = outcome(success, message, 201)
+    payload['ids'] = link_ids
+    return status, payload
+
+
+def delete_links(user_id, request):
+    try:
+        ids = [int(link_id) for link_id in batch_items(request.json(), 'ids')]
+    except (TypeError, ValueError):
+        raise HTTPError(400, "ids must be integers")
+    return outcome(*store.delete_links(user_id, ids))
+
+
+def list_tags(user_id, request):
+    return 200, {'tags': [
+        {'id': tag_id, 'kind': kind, 'name': name, 'link_count': count}
+        for tag_id, kind, name, count in store.get_tag_facets(user_id)
+    ]}
+
+
+def follow_link(request, link_id):
+    """Click-tracking redirect (no token: the browser follows it); ?u is the owner, ?s the link's signature"""
+    user_id = request.int_param('u')
+    if user_id is None or not clicks.verify(user_id, int(link_id), request.query.get('s', '')):
+        raise HTTPError(404, "Link not found.")
+    link = store.get_link(user_id, int(link_id))
+    if link is None:
+        raise HTTPError(404, "Link not found.")
+    clicks.record(user_id, link[0])
+    return 302, {'location': link[2]}
+
+
+def record_open(user_id, request, link_id):
+    """Tracking hook for clients that open links themselves (e.g. the browser extension)"""
+    if store.get_link(user_id, int(link_id)) is None:
+        raise HTTPError(404, "Link not found.")
+    clicks.record(user_id, int(link_id))
+    return 202, {'message': "Open recorded."}
+
+
+ROUTES = [
+    ('GET', re.compile(r'/links'), list_links),
+    ('POST', re.compile(r'/links'), create_link),
+    ('POST', re.compile(r'/links/batch'), create_links),
+    ('POST', re.compile(r'/links/delete'), delete_links),
+    ('GET', re.compile(r'/links/(\d+)'), get_link),
+    ('PATCH', re.compile(r'/links/(\d+)'), update_link),
+    ('DELETE', re.compile(r'/links/(\d+)'), delete_link),
+    ('GET', re.compile(r'/search'), search),
+    ('GET', re.compile(r'/tags'), list_tags),
+    ('POST', re.compile(r'/links/(\d+)/open'), record_open),
+    ('GET', re.compile(r'/go/(\d+)'), follow_link),
+]
+# Handlers called without a user id, as their URLs carry their own proof
+PUBLIC = {follow_link}
+
+
+def authenticate(request):
+    scheme, _, token = request.headers.get('authorization', '').partition(' ')
+    user_id = store.token_user_id(token.strip()) if scheme.lower() == 'bearer' and token.strip() else None
+    if user_id is None:
+        raise HTTPError(401, "A valid bearer token is required")
+    return user_id
+
+
+def dispatch(request):
+    """Route a request and run its handler (called on a worker thread); returns (status, payload)"""
+    try:
+        allowed = []
+        for method, pattern, handler in ROUTES:
+            match = pattern.fullmatch(request.path)
+            if match is None:
+                continue
+            if method != request.method:
+                allowed.append(method)
+                continue
+            if handler in PUBLIC:
+                return handler(request, *match.groups())
+            return handler(authenticate(request), request, *match.groups())
+        if allowed:
+            raise HTTPError(405, f"Use {', '.join(allowed)} for {request.path}")
+        raise HTTPError(404, f"No such endpoint: {request.path}")
+    except HTTPError as e:
+        return e.status, {'error': e.message}
+    except Exception:
+        traceback.print_exc()
+        return 500, {'error': "Internal server error"}
+
+
+def response(status, payload, keep_alive):
+    body = b'' if payload is None else json.dumps(payload, ensure_ascii=False).encode()
+    headers = [
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+        "Content-Type: application/json; charset=utf-8",
+        f"Content-Length: {len(body)}",
+        "Access-Control-Allow-Origin: *",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    if status == 302:
+        # Percent-encode anything a latin-1 header can't carry
+        location = quote(payload['location'], safe=URL_CHARACTERS)
+        headers += [f"Location: {location}", "Cache-Control: no-store"]
+    if status == 204:
+        headers += [
+            "Access-Control-Allow-Methods: GET, POST, PATCH, DELETE, OPTIONS",
+            "Access-Control-Allow-Headers: Authorization, Content-Type",
+            "Access-Control-Max-Age: 86400",
+        ]
+    return ("\r\n".join(headers) + "\r\n\r\n").encode('latin-1') + body
+
+
+class ApiServer:
+    """asyncio HTTP/1.1 server (with keep-alive) that runs the data functions on a thread pool"""
+
+    def __init__(self, host=HOST, port=PORT, workers=WORKERS):
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='api')
+
+    async def read_request(self, reader):
+        """Parse one request; returns (Request, keep_alive) or None when the client is done"""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+            return None
+        request_line, *header_lines = head.decode('latin-1').split("\r\n")
+        try:
+            method, target, version = request_line.split()
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+        headers = {}
+        for line in header_lines:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+        if 'transfer-encoding' in headers:
+            raise HTTPError(501, "Chunked request bodies are not supported; send Content-Length")
+        try:
+            length = int(headers.get('content-length', '0'))
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > MAX_BODY:
+            raise HTTPError(413, f"Request bodies are limited to {MAX_BODY} bytes")
+        body = await reader.readexactly(length) if length else b''
+        return Request(method.upper(), target, headers, body), keep_alive
+
+    async def handle(self, reader, client):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    parsed = await self.read_request(reader)
+                except HTTPError as e:
+                    client.write(response(e.status, {'error': e.message}, False))
+                    break
+                except asyncio.IncompleteReadError:
+                    break
+                if parsed is None:
+                    break
+                request, keep_alive = parsed
+                if request.method == 'OPTIONS':
+                    status, payload = 204, None
+                else:
+                    status, payload = await loop.run_in_executor(self.executor, dispatch, request)
+                client.write(response(status, payload, keep_alive))
+                await client.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            client.close()
+            try:
+                await client.wait_closed()
+            except OSError:
+                pass
+
+    async def serve(self, ready=None):
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        if ready:
+            ready(self)
+        async with server:
+            await server.serve_forever()
+
+
+def cmd_serve(args):
+    server = ApiServer(args.host, args.port, args.workers)
+    database.data_pools()
+    clicks.buffer.start()
+    print(f"Serving the Link Manager API on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def find_user(parser, email):
+    user_id = importer.find_user_id(email)
+    if user_id is None:
+        parser.error(f"No user with email {email}")
+    return user_id
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON HTTP API for Link Manager")
+    parser.add_argument('--db', help="database file (default: LINK_MANAGER_DB or link_manager.db)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('serve', help="run the API server")
+    command.add_argument('--host', default=HOST)
+    command.add_argument('--port', type=int, default=PORT)
+    command.add_argument('--workers', type=int, default=WORKERS)
+
+    command = commands.add_parser('token', help="create an API token for a user (printed once)")
+    command.add_argument('email')
+    command.add_argument('--name', default='', help="label used to revoke the token later")
+
+    command = commands.add_parser('revoke', help="revoke a user's tokens with the given name")
+    command.add_argument('email')
+    command.add_argument('name')
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.configure(args.db)
+    if args.command == 'serve':
+        return cmd_serve(args)
+    user_id = find_user(parser, args.email)
+    if args.command == 'token':
+        print(store.create_api_token(user_id, args.name))
+    else:
+        print(f"Revoked {store.revoke_api_tokens(user_id, args.name)} tokens", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,246 +1,40 @@
 import streamlit as st
-import sqlite3
-import hashlib
 import pandas as pd
-from datetime import datetime
-import re
+import tempfile
+import threading
+
+import cache
+import clicks
+import database
+import enrichment
+import exporter
+import fuzzy
+import health
+import importer
+import instrumentation
+import maintenance
+import pages
+import store
+import writer
 
 # Database setup
 def init_database():
-    """Initialize the database with required tables"""
-    conn = sqlite3.connect('link_manager.db')
-    cur = conn.cursor()
-    
-    # User table
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS USER (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT NOT NULL UNIQUE,
-            password TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    # Link table
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS LINK (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            name TEXT NOT NULL,
-            link TEXT NOT NULL,
-            description TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES USER(id) ON DELETE CASCADE
-        )
-    """)
-    
-    # Migrate existing database if needed
-    migrate_database()
-    
-    conn.commit()
-    conn.close()
-
-def migrate_database():
-    """Add missing columns to existing database"""
-    conn = sqlite3.connect('link_manager.db')
-    cur = conn.cursor()
-    
+    """Open the shared connection pools (one per shard when sharded); migrations run once per process"""
     try:
-        # Check if created_at column exists in USER table
-        cur.execute("PRAGMA table_info(USER)")
-        user_columns = [column[1] for column in cur.fetchall()]
-        if 'created_at' not in user_columns:
-            cur.execute("ALTER TABLE USER ADD COLUMN created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
-            
-        # Check if created_at column exists in LINK table
-        cur.execute("PRAGMA table_info(LINK)")
-        link_columns = [column[1] for column in cur.fetchall()]
-        if 'created_at' not in link_columns:
-            cur.execute("ALTER TABLE LINK ADD COLUMN created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
-            
-        # Check if user_id column exists in LINK table (for old databases)
-        if 'user_id' not in link_columns:
-            cur.execute("ALTER TABLE LINK ADD COLUMN user_id INTEGER DEFAULT 1")
-            
-        conn.commit()
+        database.data_pools()
     except Exception as e:
         st.error(f"Database migration error: {e}")
-    finally:
-        conn.close()
-
-def hash_password(password):
-    """Hash password using SHA-256"""
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def validate_email(email):
-    """Validate email format"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
-
-def register_user(name, email, password):
-    """Register a new user"""
-    conn = sqlite3.connect('link_manager.db')
-    cur = conn.cursor()
-    
-    try:
-        hashed_password = hash_password(password)
-        cur.execute(
-            "INSERT INTO USER (name, email, password) VALUES (?, ?, ?)",
-            (name, email, hashed_password)
-        )
-        conn.commit()
-        return True, "Registration successful!"
-    except sqlite3.IntegrityError:
-        return False, "Email already exists!"
-    except Exception as e:
-        return False, f"Registration failed: {str(e)}"
-    finally:
-        conn.close()
-
-def login_user(email, password):
-    """Login user and return user info"""
-    conn = sqlite3.connect('link_manager.db')
-    cur = conn.cursor()
-    
-    hashed_password = hash_password(password)
-    cur.execute(
-        "SELECT id, name, email FROM USER WHERE email = ? AND password = ?",
-        (email, hashed_password)
-    )
-    user = cur.fetchone()
-    conn.close()
-    
-    return user
-
-def get_user_links(user_id):
-    """Get all links for a specific user"""
-    conn = sqlite3.connect('link_manager.db')
-    cur = conn.cursor()
-    
-    # Check if user_id column exists, if not get all links (for backward compatibility)
-    try:
-        cur.execute(
-            "SELECT id, name, link, description, created_at FROM LINK WHERE user_id = ? ORDER BY id DESC",
-            (user_id,)
-        )
-        links = cur.fetchall()
-    except sqlite3.OperationalError:
-        # Fallback for old database without user_id column
-        cur.execute("SELECT id, name, link, description, NULL FROM LINK ORDER BY id DESC")
-        links = cur.fetchall()
-    
-    conn.close()
-    return links
-
-def add_link(user_id, name, link, description):
-    """Add a new link for user"""
-    conn = sqlite3.connect('link_manager.db')
-    cur = conn.cursor()
-    
-    try:
-        # Try with user_id first
-        cur.execute(
-            "INSERT INTO LINK (user_id, name, link, description) VALUES (?, ?, ?, ?)",
-            (user_id, name, link, description)
-        )
-        conn.commit()
-        return True, "Link added successfully!"
-    except sqlite3.OperationalError:
-        # Fallback for old database without user_id column
-        try:
-            cur.execute(
-                "INSERT INTO LINK (name, link, description) VALUES (?, ?, ?)",
-                (name, link, description)
-            )
-            conn.commit()
-            return True, "Link added successfully!"
-        except Exception as e:
-            return False, f"Failed to add link: {str(e)}"
-    except Exception as e:
-        return False, f"Failed to add link: {str(e)}"
-    finally:
-        conn.close()
-
-def update_link(link_id, user_id, name, link, description):
-    """Update an existing link"""
-    conn = sqlite3.connect('link_manager.db')
-    cur = conn.cursor()
-    
-    try:
-        # Try with user_id first
-        cur.execute(
-            "UPDATE LINK SET name = ?, link = ?, description = ? WHERE id = ? AND user_id = ?",
-            (name, link, description, link_id, user_id)
-        )
-        conn.commit()
-        if cur.rowcount > 0:
-            return True, "Link updated successfully!"
-        else:
-            # Try without user_id for backward compatibility
-            cur.execute(
-                "UPDATE LINK SET name = ?, link = ?, description = ? WHERE id = ?",
-                (name, link, description, link_id)
-            )
-            conn.commit()
-            if cur.rowcount > 0:
-                return True, "Link updated successfully!"
-            else:
-                return False, "Link not found."
-    except Exception as e:
-        return False, f"Failed to update link: {str(e)}"
-    finally:
-        conn.close()
+        st.stop()
 
-def delete_link(link_id, user_id):
-    """Delete a link"""
-    conn = sqlite3.connect('link_manager.db')
-    cur = conn.cursor()
-    
-    try:
-        # Try with user_id first
-        cur.execute("DELETE FROM LINK WHERE id = ? AND user_id = ?", (link_id, user_id))
-        conn.commit()
-        if cur.rowcount > 0:
-            return True, "Link deleted successfully!"
-        else:
-            # Try without user_id for backward compatibility
-            cur.execute("DELETE FROM LINK WHERE id = ?", (link_id,))
-            conn.commit()
-            if cur.rowcount > 0:
-                return True, "Link deleted successfully!"
-            else:
-                return False, "Link not found."
-    except Exception as e:
-        return False, f"Failed to delete link: {str(e)}"
-    finally:
-        conn.close()
+@st.cache_resource
+def enrichment_worker():
+    """One metadata enrichment worker per server process"""
+    return enrichment.EnrichmentWorker().start()
 
-def search_links(user_id, query):
-    """Search links by name or description"""
-    conn = sqlite3.connect('link_manager.db')
-    cur = conn.cursor()
-    
-    try:
-        cur.execute(
-            """SELECT id, name, link, description, created_at FROM LINK 
-               WHERE user_id = ? AND (name LIKE ? OR description LIKE ?) 
-               ORDER BY id DESC""",
-            (user_id, f"%{query}%", f"%{query}%")
-        )
-        links = cur.fetchall()
-    except sqlite3.OperationalError:
-        # Fallback for old database without user_id column
-        cur.execute(
-            """SELECT id, name, link, description, NULL FROM LINK 
-               WHERE (name LIKE ? OR description LIKE ?) 
-               ORDER BY id DESC""",
-            (f"%{query}%", f"%{query}%")
-        )
-        links = cur.fetchall()
-    
-    conn.close()
-    return links
+@st.cache_resource
+def maintenance_scheduler():
+    """One maintenance scheduler per server process (runs coordinate through the maintenance_run table)"""
+    return maintenance.MaintenanceScheduler().start()
 
 # Initialize session state
 def init_session_state():
@@ -251,7 +45,96 @@ def init_session_state():
     if 'page' not in st.session_state:
         st.session_state.page = 'login'
 
+# Pagination helpers (keyset cursors are kept per list in session state)
+PAGE_SIZES = [10, 25, 50, 100]
+
+def page_size_select(key, sizes=PAGE_SIZES, default=25):
+    """Show a page size selector and return the chosen size"""
+    return st.selectbox("Links per page", sizes, index=sizes.index(default), key=f"{key}_page_size")
+
+def page_cursor(key, reset_on=None):
+    """Return the cursor for the page being shown, starting over when reset_on changes"""
+    state = st.session_state.get(f"{key}_pager")
+    if state is None or state['reset_on'] != reset_on:
+        state = {'reset_on': reset_on, 'cursors': [None]}
+        st.session_state[f"{key}_pager"] = state
+    return state['cursors'][-1]
+
+def pagination_controls(key, next_cursor):
+    """Show previous/next buttons for a list paginated with page_cursor()"""
+    cursors = st.session_state[f"{key}_pager"]['cursors']
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("← Previous", key=f"{key}_prev", disabled=len(cursors) == 1, use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        st.caption(f"Page {len(cursors)}")
+    with col3:
+        if st.button("Next →", key=f"{key}_next", disabled=next_cursor is None, use_container_width=True):
+            cursors.append(next_cursor)
+            st.rerun()
+
+# Tag and collection filter (facet counts come from the trigger-maintained tag table)
+def tag_label(kind, name, count):
+    return f"{'📁' if kind == 'collection' else '#'} {name} ({count})"
+
+def tag_filter(key, user_id):
+    """Show a tag/collection multiselect with link counts; returns (tag_ids, match_all)"""
+    facets = {tag_id: (kind, name, count) for tag_id, kind, name, count in store.get_tag_facets(user_id)}
+    if not facets:
+        return (), False
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        selected = st.multiselect(
+            "Tags and collections",
+            options=list(facets),
+            format_func=lambda tag_id: tag_label(*facets[tag_id]),
+            key=f"{key}_tags"
+        )
+    with col2:
+        match = st.radio("Match", ["Any", "All"], horizontal=True, key=f"{key}_tag_match")
+    return tuple(sorted(tag_id for tag_id in selected if tag_id in facets)), match == "All"
+
+# Searchable link picker
+PICKER_LIMIT = 50
+
+def link_picker(label, key, user_id, page_links):
+    """Pick one link from the current page, or find any link by name or #id.
+
+    Only the current page or at most PICKER_LIMIT search hits are loaded and
+    every lookup goes through an id-keyed dict, so picking a link costs the
+    same no matter how many links the user has.
+    """
+    query = st.text_input(
+        "Find link",
+        key=f"{key}_find",
+        placeholder="Search all links by name, or #id (leave empty for this page)"
+    ).strip()
+    
+    if query.startswith('#') and query[1:].isdigit():
+        link = store.get_link(user_id, int(query[1:]))
+        candidates = [link] if link else []
+    elif query:
+        candidates, _, _ = store.search_links_page(user_id, query, limit=PICKER_LIMIT)
+    else:
+        candidates = page_links
+    
+    links_by_id = {link[0]: link for link in candidates}
+    if not links_by_id:
+        st.info("No matching links.")
+        return None
+    
+    selected = st.selectbox(
+        label,
+        options=list(links_by_id),
+        format_func=lambda link_id: f"{link_id} - {links_by_id[link_id][1]}",
+        key=f"{key}_select"
+    )
+    return links_by_id.get(selected)
+
 # Main application
+@instrumentation.profiled_run
 def main():
     st.set_page_config(
         page_title="Link Manager",
@@ -260,8 +143,12 @@ def main():
         initial_sidebar_state="expanded"
     )
     
-    # Initialize database and session state
+    # Open the database (migrates on first run) and initialize session state
     init_database()
+    if enrichment.WORKER_ENABLED:
+        enrichment_worker()
+    if maintenance.SCHEDULER_ENABLED:
+        maintenance_scheduler()
     init_session_state()
     
     # Custom CSS
@@ -321,7 +208,7 @@ def show_auth_page():
             
             if submit_login:
                 if email and password:
-                    user = login_user(email, password)
+                    user = store.login_user(email, password)
                     if user:
                         st.session_state.logged_in = True
                         st.session_state.user_info = {
@@ -348,14 +235,14 @@ def show_auth_page():
             
             if submit_register:
                 if name and email and password and confirm_password:
-                    if not validate_email(email):
+                    if not store.validate_email(email):
                         st.error("Please enter a valid email address!")
                     elif len(password) < 6:
                         st.error("Password must be at least 6 characters long!")
                     elif password != confirm_password:
                         st.error("Passwords do not match!")
                     else:
-                        success, message = register_user(name, email, password)
+                        success, message = store.register_user(name, email, password)
                         if success:
                             st.success(message)
                             st.info("Please go to the Login tab to sign in.")
@@ -364,6 +251,48 @@ def show_auth_page():
                 else:
                     st.error("Please fill in all fields!")
 
+def show_performance_panel():
+    """Sidebar debug panel with per-rerun timings, slowest queries and dumps"""
+    with st.expander("⏱️ Performance"):
+        if not instrumentation.enabled:
+            st.caption("Timing is off. Recording adds a timer around every query and page.")
+            if st.button("Start recording", use_container_width=True):
+                instrumentation.enable()
+                st.rerun()
+            return
+        if st.button("Stop recording", use_container_width=True):
+            instrumentation.disable()
+            st.rerun()
+        if instrumentation.runs:
+            last = instrumentation.runs[-1]
+            st.caption(
+                f"Last rerun: {last['total_ms']:.1f} ms, {last['sql_ms']:.1f} ms in "
+                f"{last['sql_count']} queries ({last['statements']} statements)"
+            )
+            for name, ms in sorted(last['spans_ms'].items(), key=lambda item: -item[1]):
+                st.caption(f"{name}: {ms:.1f} ms")
+        spans = instrumentation.span_stats()
+        if spans:
+            st.markdown("**Pages and builders**")
+            st.dataframe(
+                pd.DataFrame(spans)[['name', 'count', 'p50_ms', 'p95_ms']].round(2),
+                hide_index=True, use_container_width=True
+            )
+        slowest = sorted(instrumentation.query_stats(), key=lambda summary: -summary['p95_ms'])[:10]
+        if slowest:
+            st.markdown("**Slowest queries (p95)**")
+            st.dataframe(
+                pd.DataFrame(slowest)[['name', 'count', 'p50_ms', 'p95_ms', 'max_ms']].round(2),
+                hide_index=True, use_container_width=True
+            )
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("JSON", instrumentation.dump_json(), file_name="timings.json",
+                               mime="application/json", use_container_width=True)
+        with col2:
+            st.download_button("Prometheus", instrumentation.dump_prometheus(), file_name="timings.prom",
+                               mime="text/plain", use_container_width=True)
+
 def show_dashboard():
     """Show main dashboard"""
     # Sidebar
@@ -382,6 +311,37 @@ def show_dashboard():
         
         st.markdown("---")
         
+        with st.expander("🗄️ Database connections"):
+            for pool_stats in database.connection_stats():
+                st.caption(
+                    f"{pool_stats['open_connections']} open, {pool_stats['in_use']} in use, "
+                    f"peak {pool_stats['peak_in_use']}, {pool_stats['lock_retries']} lock retries"
+                )
+            cache_stats = cache.query_cache.stats()
+            st.caption(
+                f"Query cache: {cache_stats['entries']}/{cache_stats['max_entries']} entries, "
+                f"{cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                f"({cache_stats['hit_ratio']:.0%} hit ratio)"
+            )
+            if enrichment.WORKER_ENABLED:
+                worker_stats = enrichment_worker().snapshot()
+                queue = worker_stats['queue']
+                st.caption(
+                    f"Enrichment: {worker_stats['links']} links ({worker_stats['links_per_second']:.1f}/s), "
+                    f"{worker_stats['cache_hits']} cache hits, {worker_stats['failures']} failures; "
+                    f"queue {queue.get('pending', 0)} pending, {queue.get('running', 0)} running, "
+                    f"{queue.get('failed', 0)} failed"
+                )
+            else:
+                st.caption(f"Enrichment worker off; queue: {enrichment.queue_depth()}")
+            latest = {}
+            for run in maintenance.history():
+                latest.setdefault(run['task'], run)
+            for run in latest.values():
+                st.caption(f"Maintenance {run['started_at']}: {maintenance.describe(run)}")
+        
+        show_performance_panel()
+        
         if st.button("Logout", use_container_width=True):
             st.session_state.logged_in = False
             st.session_state.user_info = None
@@ -397,72 +357,106 @@ def show_dashboard():
     elif page == "Manage Links":
         show_manage_links_page()
 
+@instrumentation.timed
 def show_dashboard_page():
     """Show dashboard overview"""
     st.title("📊 Dashboard")
     
     user_id = st.session_state.user_info['id']
-    links = get_user_links(user_id)
-    
-    # Statistics
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        st.markdown("""
-        <div class="stats-card">
-            <h2>📊</h2>
-            <h3>{}</h3>
-            <p>Total Links</p>
-        </div>
-        """.format(len(links)), unsafe_allow_html=True)
-    
-    with col2:
-        recent_links = [link for link in links if link[4]][:7]  # Last 7 days
-        st.markdown("""
-        <div class="stats-card">
-            <h2>🆕</h2>
-            <h3>{}</h3>
-            <p>Recent Links</p>
-        </div>
-        """.format(len(recent_links)), unsafe_allow_html=True)
-    
-    with col3:
-        st.markdown("""
-        <div class="stats-card">
-            <h2>👤</h2>
-            <h3>Active</h3>
-            <p>Account Status</p>
-        </div>
-        """, unsafe_allow_html=True)
+    # Statistics are filled in once the page data is loaded below
+    stats_area = st.container()
     
     st.markdown("---")
     
     # Recent links
     st.subheader("🔗 Recent Links")
     
+    page_size = page_size_select("dashboard", sizes=[5, 10, 25], default=5)
+    data = pages.dashboard_page_data(user_id, page_cursor("dashboard", page_size), page_size)
+    stats, links, next_cursor = data['stats'], data['links'], data['next_cursor']
+    
+    with stats_area:
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            st.markdown("""
+            <div class="stats-card">
+                <h2>📊</h2>
+                <h3>{}</h3>
+                <p>Total Links</p>
+            </div>
+            """.format(stats['total']), unsafe_allow_html=True)
+        
+        with col2:
+            st.markdown("""
+            <div class="stats-card">
+                <h2>🆕</h2>
+                <h3>{}</h3>
+                <p>Added in Last 7 Days</p>
+            </div>
+            """.format(stats['last_7_days']), unsafe_allow_html=True)
+        
+        with col3:
+            st.markdown("""
+            <div class="stats-card">
+                <h2>📅</h2>
+                <h3>{}</h3>
+                <p>Added in Last 30 Days</p>
+            </div>
+            """.format(stats['last_30_days']), unsafe_allow_html=True)
+        
+        with col4:
+            st.markdown("""
+            <div class="stats-card">
+                <h2>👤</h2>
+                <h3>Active</h3>
+                <p>Account Status</p>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        if stats['last_added']:
+            st.caption(f"Last link added: {stats['last_added']} UTC")
+    
     if links:
-        recent_links = links[:5]  # Show last 5 links
-        for link in recent_links:
+        for link in links:
             with st.container():
                 col1, col2 = st.columns([3, 1])
                 with col1:
                     st.markdown(f"**{link[1]}**")
-                    st.markdown(f"[🔗 {link[2]}]({link[2]})")
+                    st.markdown(f"[🔗 {link[2]}]({clicks.tracked_url(user_id, link[0], link[2])})")
                     if link[3]:
                         st.caption(link[3])
+                    elif link[6]:  # description fetched from the page
+                        st.caption(link[6])
                 with col2:
-                    if link[4]:  # created_at exists
-                        try:
-                            date = datetime.fromisoformat(link[4]).strftime("%Y-%m-%d")
-                            st.caption(f"Added: {date}")
-                        except (ValueError, TypeError):
-                            st.caption("Added: Unknown")
-                    else:
-                        st.caption("Added: Unknown")
+                    st.caption(f"Added: {pages.format_date(link[4])}")
                 st.markdown("---")
+        pagination_controls("dashboard", next_cursor)
     else:
         st.info("No links found. Add your first link!")
+    
+    if 'most_visited' in data:
+        show_link_usage(user_id, data, stats['total'])
+
+def show_link_usage(user_id, data, total):
+    """Most visited and never opened links, from the click rollups"""
+    st.subheader("👀 Link Usage")
+    st.caption(f"{data['opened']} of {total} links opened at least once (counts are saved every few seconds)")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown(f"**Most visited (last {clicks.MOST_VISITED_DAYS} days)**")
+        for link_id, name, link, count, last_day in data['most_visited']:
+            st.markdown(f"[{name}]({clicks.tracked_url(user_id, link_id, link)}) · {count} opens, last {last_day}")
+        if not data['most_visited']:
+            st.caption("No opens recorded yet.")
+    with col2:
+        st.markdown("**Never opened**")
+        for link_id, name, link, created_at in data['never_opened']:
+            st.markdown(f"[{name}]({clicks.tracked_url(user_id, link_id, link)}) · added {pages.format_date(created_at)}")
+        if not data['never_opened']:
+            st.caption("Every link has been opened.")
 
+@instrumentation.timed
 def show_add_link_page():
     """Show add link page"""
     st.title("➕ Add New Link")
@@ -471,6 +465,8 @@ def show_add_link_page():
         name = st.text_input("Link Name*", placeholder="Enter a name for your link")
         url = st.text_input("URL*", placeholder="https://example.com")
         description = st.text_area("Description", placeholder="Optional description")
+        tags = st.text_input("Tags", placeholder="Comma-separated, e.g. python, reading list")
+        collections = st.text_input("Collections", placeholder="Comma-separated")
         
         col1, col2 = st.columns(2)
         with col1:
@@ -485,7 +481,9 @@ def show_add_link_page():
                     url = 'https://' + url
                 
                 user_id = st.session_state.user_info['id']
-                success, message = add_link(user_id, name, url, description)
+                success, message = writer.link_writes().add_link(
+                    user_id, name, url, description, store.parse_tags(tags), store.parse_tags(collections)
+                )
                 
                 if success:
                     st.success(message)
@@ -497,102 +495,252 @@ def show_add_link_page():
         
         if clear:
             st.rerun()
+    
+    st.markdown("---")
+    show_import_section()
+
+def show_import_section():
+    """Import bookmarks from a browser export, CSV or JSON Lines file"""
+    st.subheader("📥 Import Bookmarks")
+    st.caption(
+        "Upload a browser bookmark export (.html), a CSV file with name/url/description columns, "
+        "or a JSON Lines file with one link per line. Links you already have are skipped."
+    )
+    
+    uploaded = st.file_uploader("Bookmark file", type=["html", "htm", "csv", "jsonl", "ndjson"])
+    collect_existing = st.checkbox(
+        "Add links I already have to their folder's collection",
+        help="Bookmark folders become collections of the imported links; tick this to file the skipped ones too"
+    )
+    
+    if uploaded and st.button("Import Links", use_container_width=True):
+        user_id = st.session_state.user_info['id']
+        progress_bar = st.progress(0.0)
+        status = st.empty()
+        
+        def show_progress(stats):
+            progress_bar.progress(min(uploaded.tell() / max(uploaded.size, 1), 1.0))
+            status.caption(
+                f"{stats['read']} read, {stats['imported']} imported, "
+                f"{stats['duplicates']} duplicates ({stats['links_per_second']:.0f} links/s)"
+            )
+        
+        try:
+            stats = importer.import_file(
+                user_id, uploaded, importer.detect_format(uploaded.name),
+                progress=show_progress, collect_existing=collect_existing
+            )
+        except Exception as e:
+            st.error(f"Import failed: {str(e)}")
+        else:
+            progress_bar.progress(1.0)
+            st.success(
+                f"Imported {stats['imported']} links in {stats['seconds']:.1f}s "
+                f"({stats['duplicates']} duplicates and {stats['invalid']} invalid entries skipped)"
+            )
 
+@instrumentation.timed
 def show_search_page():
     """Show search links page"""
     st.title("🔍 Search Links")
     
-    search_query = st.text_input("Search by name or description", placeholder="Enter search terms...")
+    search_query = st.text_input(
+        "Search by name, description or URL",
+        placeholder='Enter search terms... use "quotes" for exact phrases'
+    )
+    
+    user_id = st.session_state.user_info['id']
+    tag_ids, match_all = tag_filter("search", user_id)
+    typo_tolerant = st.checkbox(
+        "Typo-tolerant", key="search_typo_tolerant", disabled=not fuzzy.available(),
+        help="Also match words spelled similarly to the ones you typed"
+    )
     
     if search_query:
-        user_id = st.session_state.user_info['id']
-        results = search_links(user_id, search_query)
+        page_size = page_size_select("search")
+        cursor = page_cursor("search", (search_query, page_size, tag_ids, match_all, typo_tolerant))
+        data = pages.search_page_data(user_id, search_query, cursor, page_size, tag_ids, match_all, typo_tolerant)
+        results, next_cursor = data['results'], data['next_cursor']
         
-        st.subheader(f"Search Results ({len(results)} found)")
+        st.subheader(f"Search Results ({data['total']} found)")
+        if data['typo_tolerant'] and not typo_tolerant and data['total']:
+            st.caption("No exact matches, showing similar words instead.")
+        if data['corrections']:
+            st.caption("Matched " + ", ".join(f"*{word}* as *{term}*" for word, term in data['corrections'].items()))
         
         if results:
             for link in results:
                 with st.container():
                     col1, col2, col3 = st.columns([2, 2, 1])
                     with col1:
-                        st.markdown(f"**{link[1]}**")
-                        st.markdown(f"[🔗 Open Link]({link[2]})")
+                        st.markdown(f"**{link[5]}**" if link[5] == link[1] else link[5])
+                        st.markdown(f"[🔗 Open Link]({clicks.tracked_url(user_id, link[0], link[2])})")
                     with col2:
-                        if link[3]:
-                            st.caption(link[3])
+                        if link[6]:
+                            st.caption(link[6])
                     with col3:
-                        if link[4]:  # created_at exists
-                            try:
-                                date = datetime.fromisoformat(link[4]).strftime("%Y-%m-%d")
-                                st.caption(f"Added: {date}")
-                            except (ValueError, TypeError):
-                                st.caption("Added: Unknown")
-                        else:
-                            st.caption("Added: Unknown")
+                        st.caption(f"Added: {pages.format_date(link[4])}")
                     st.markdown("---")
+            pagination_controls("search", next_cursor)
         else:
             st.info("No links found matching your search.")
 
+def show_export_section(user_id):
+    """Offer a download of all the user's links"""
+    with st.expander("📤 Export Links"):
+        col1, col2 = st.columns(2)
+        with col1:
+            fmt = st.selectbox(
+                "Format", exporter.FORMATS,
+                format_func=lambda f: {'csv': 'CSV', 'jsonl': 'JSON Lines', 'html': 'Bookmark HTML'}[f],
+                key="export_format"
+            )
+        with col2:
+            compress = st.checkbox("Gzip compress", key="export_gzip")
+        
+        if st.button("Prepare Export", use_container_width=True):
+            # Rows are streamed into a temporary file instead of being built in memory
+            export_file = tempfile.TemporaryFile()
+            count = exporter.export_links(user_id, export_file, fmt, compress)
+            export_file.seek(0)
+            st.download_button(
+                f"⬇️ Download {count} links",
+                data=export_file,
+                file_name=exporter.export_filename(fmt, compress),
+                mime='application/gzip' if compress else exporter.MIME_TYPES[fmt],
+                use_container_width=True
+            )
+
+EDITABLE_COLUMNS = ['Name', 'URL', 'Description']
+
+def show_bulk_actions(user_id, original, edited):
+    """Save cell edits and delete ticked rows from the Manage Links table in single transactions"""
+    changed = edited[(edited[EDITABLE_COLUMNS] != original[EDITABLE_COLUMNS]).any(axis=1)]
+    selected_ids = edited.loc[edited['Select'], 'ID'].tolist()
+    
+    if len(changed):
+        st.markdown(f"**Pending changes ({len(changed)} links)**")
+        diff = []
+        for row in changed.itertuples(index=False):
+            before = original.loc[original['ID'] == row.ID].iloc[0]
+            for column in EDITABLE_COLUMNS:
+                if getattr(row, column) != before[column]:
+                    diff.append({'ID': row.ID, 'Field': column, 'Old': before[column], 'New': getattr(row, column)})
+        st.dataframe(pd.DataFrame(diff), use_container_width=True, hide_index=True)
+        
+        if st.button(f"💾 Save {len(changed)} Changed Links", use_container_width=True):
+            if (changed['Name'].str.strip() == '').any() or (changed['URL'].str.strip() == '').any():
+                st.error("Name and URL are required!")
+            else:
+                rows = [
+                    (row.ID, row.Name, row.URL, '' if row.Description == 'No description' else row.Description)
+                    for row in changed.itertuples(index=False)
+                ]
+                success, message = store.update_links(user_id, rows)
+                if success:
+                    st.success(message)
+                    st.rerun()
+                else:
+                    st.error(message)
+    
+    if selected_ids:
+        st.warning(f"{len(selected_ids)} links selected for deletion")
+        if st.button(f"🗑️ Delete {len(selected_ids)} Selected Links", type="secondary", use_container_width=True):
+            success, message = store.delete_links(user_id, selected_ids)
+            if success:
+                st.success(message)
+                st.rerun()
+            else:
+                st.error(message)
+
+HEALTH_FILTER_OPTIONS = {'All': None, 'Healthy': 'healthy', 'Broken': 'broken', 'Unchecked': 'unchecked'}
+
+def start_health_check(user_id):
+    """Check the user's links in a background thread; results show up on the next rerun"""
+    thread = st.session_state.get('health_check_thread')
+    if thread is not None and thread.is_alive():
+        return False
+    thread = threading.Thread(target=health.run_health_check, kwargs={'user_id': user_id}, daemon=True)
+    thread.start()
+    st.session_state.health_check_thread = thread
+    return True
+
+@instrumentation.timed
 def show_manage_links_page():
     """Show manage links page"""
     st.title("⚙️ Manage Links")
     
     user_id = st.session_state.user_info['id']
-    links = get_user_links(user_id)
+    total_links = store.count_user_links(user_id)
     
-    if not links:
+    if not total_links:
         st.info("No links to manage. Add some links first!")
         return
     
-    # Convert to DataFrame for better display
-    df_data = []
-    for link in links:
-        created_date = 'Unknown'
-        if link[4]:  # created_at exists
-            try:
-                created_date = datetime.fromisoformat(link[4]).strftime("%Y-%m-%d")
-            except (ValueError, TypeError):
-                created_date = 'Unknown'
-        
-        df_data.append({
-            'ID': link[0],
-            'Name': link[1],
-            'URL': link[2],
-            'Description': link[3] if link[3] else 'No description',
-            'Created': created_date
-        })
-    
-    df = pd.DataFrame(df_data)
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col1:
+        page_size = page_size_select("manage")
+    with col2:
+        health_filter = HEALTH_FILTER_OPTIONS[st.selectbox("Link health", list(HEALTH_FILTER_OPTIONS), key="manage_health")]
+    with col3:
+        checking = st.session_state.get('health_check_thread')
+        checking = checking is not None and checking.is_alive()
+        if st.button("🩺 Check links now", disabled=checking, use_container_width=True):
+            start_health_check(user_id)
+            st.rerun()
+        if checking:
+            st.caption("Checking links in the background…")
+    tag_ids, match_all = tag_filter("manage", user_id)
     
-    # Display table
-    st.dataframe(df, use_container_width=True, hide_index=True)
+    cursor = page_cursor("manage", (page_size, health_filter, tag_ids, match_all))
+    data = pages.manage_page_data(user_id, cursor, page_size, health_filter, tag_ids, match_all)
+    links, next_cursor, df = data['links'], data['next_cursor'], data['table']
+    if not links:
+        if cursor is None:
+            st.info("No links match these filters.")
+            return
+        # The page emptied out (its links were deleted), go back to the first page
+        st.session_state.pop("manage_pager", None)
+        st.rerun()
+    st.caption(f"{data['total']} links in total")
+    
+    show_export_section(user_id)
+    
+    # Editable table: tick rows to delete them, edit cells to change them
+    edited = st.data_editor(
+        df,
+        use_container_width=True,
+        hide_index=True,
+        disabled=['ID', 'Created', 'Health'],
+        key=f"manage_editor_{health_filter}_{'-'.join(map(str, tag_ids))}_{match_all}_{cursor}"
+    )
+    pagination_controls("manage", next_cursor)
+    show_bulk_actions(user_id, df, edited)
     
     st.markdown("---")
     
-    # Edit/Delete section
+    # Edit/Delete section (lookups go through an id-indexed map of the loaded links)
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("Edit Link")
-        link_ids = [link[0] for link in links]
-        link_names = [f"{link[0]} - {link[1]}" for link in links]
+        current_link = link_picker("Select link to edit", "edit", user_id, links)
         
-        selected_link = st.selectbox("Select link to edit", 
-                                   options=link_ids, 
-                                   format_func=lambda x: next(name for id_, name in zip(link_ids, link_names) if id_ == x))
-        
-        if selected_link:
-            # Get current link data
-            current_link = next(link for link in links if link[0] == selected_link)
-            
+        if current_link:
+            link_tags = store.get_link_tags(user_id, current_link[0])
             with st.form("edit_form"):
                 new_name = st.text_input("Name", value=current_link[1])
                 new_url = st.text_input("URL", value=current_link[2])
                 new_description = st.text_area("Description", value=current_link[3] if current_link[3] else "")
+                new_tags = st.text_input("Tags", value=", ".join(link_tags['tag']))
+                new_collections = st.text_input("Collections", value=", ".join(link_tags['collection']))
                 
                 if st.form_submit_button("Update Link"):
                     if new_name and new_url:
-                        success, message = update_link(selected_link, user_id, new_name, new_url, new_description)
+                        success, message = writer.link_writes().update_link(
+                            current_link[0], user_id, new_name, new_url, new_description,
+                            store.parse_tags(new_tags), store.parse_tags(new_collections)
+                        )
                         if success:
                             st.success(message)
                             st.rerun()
@@ -603,17 +751,13 @@ def show_manage_links_page():
     
     with col2:
         st.subheader("Delete Link")
-        delete_link_id = st.selectbox("Select link to delete", 
-                                    options=link_ids, 
-                                    format_func=lambda x: next(name for id_, name in zip(link_ids, link_names) if id_ == x),
-                                    key="delete_select")
+        current_link = link_picker("Select link to delete", "delete", user_id, links)
         
-        if delete_link_id:
-            current_link = next(link for link in links if link[0] == delete_link_id)
+        if current_link:
             st.warning(f"You are about to delete: **{current_link[1]}**")
             
             if st.button("🗑️ Delete Link", type="secondary"):
-                success, message = delete_link(delete_link_id, user_id)
+                success, message = writer.link_writes().delete_link(current_link[0], user_id)
                 if success:
                     st.success(message)
                     st.rerun()
@@ -0,0 +1,154 @@
+"""Measure how a backup of a live database affects concurrent writers.
+
+Generates a database (or reuses --db), then for each method runs --threads
+writers adding links through store.add_link for --seconds while a backup
+runs over and over in another thread, and reports writer latency next to
+the number of backups completed and their duration:
+
+  none      no backup, the baseline
+  stepped   maintenance.backup_file: BACKUP_STEP_PAGES pages per step, all
+            read from one snapshot
+  restart   the online backup API stepped without holding a snapshot: every
+            commit between two steps restarts the copy
+  locked    BEGIN IMMEDIATE, copy the file, COMMIT: what a plain file copy
+            needs to be consistent, and writers wait for it
+
+Usage: python benchmarks/bench_backup.py [--users 10] [--links 20000] [--threads 4] [--seconds 5]
+                                        [--methods none stepped restart locked] [--db existing.db]
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache  # noqa: E402
+import database  # noqa: E402
+import maintenance  # noqa: E402
+import store  # noqa: E402
+from benchmarks import generate  # noqa: E402
+
+
+def locked_copy(source_path, target_path):
+    pool = database.get_pool(source_path)
+    with pool.transaction():
+        shutil.copyfile(source_path, target_path)
+    return {}
+
+
+def unpinned_backup(source_path, target_path, stop):
+    """Stepped backup where each step reads the latest data; gives up when stop is set"""
+    stats = {'restarts': 0, 'complete': True}
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            stats['restarts'] += 1
+        last_remaining = remaining
+        if stop.is_set():
+            stats['complete'] = False
+            raise InterruptedError
+        if remaining:
+            time.sleep(maintenance.BACKUP_STEP_SLEEP)
+
+    source, target = sqlite3.connect(source_path), sqlite3.connect(target_path)
+    try:
+        source.backup(target, pages=maintenance.BACKUP_STEP_PAGES, progress=progress)
+    except InterruptedError:
+        pass
+    finally:
+        source.close()
+        target.close()
+    return stats
+
+
+def run_backups(method, path, target, stop, durations, details):
+    """Back up path repeatedly until stop is set"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        if method == 'stepped':
+            details.append(maintenance.backup_file(path, target))
+        elif method == 'restart':
+            details.append(unpinned_backup(path, target, stop))
+        else:
+            details.append(locked_copy(path, target))
+        if details[-1].get('complete', True):
+            durations.append(time.perf_counter() - started)
+
+
+def run(path, method, args, tmp):
+    user_ids = [row[0] for row in database.get_pool(path).fetchall("SELECT id FROM USER")]
+    stop = threading.Event()
+    latencies, durations, details = [], [], []
+
+    def writer(number):
+        i = 0
+        while not stop.is_set():
+            user_id = user_ids[(number + i) % len(user_ids)]
+            started = time.perf_counter()
+            store.add_link(user_id, f"Bench {method} {number}-{i}", f"https://bench.example/{method}/{number}/{i}", "")
+            latencies.append(time.perf_counter() - started)
+            i += 1
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(args.threads)]
+    if method != 'none':
+        threads.append(threading.Thread(
+            target=run_backups, args=(method, path, os.path.join(tmp, 'backup.db'), stop, durations, details)
+        ))
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        'links_per_second': len(latencies) / args.seconds,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'backups': len(durations),
+        'backup_s': statistics.median(durations) if durations else 0,
+        'restarts': sum(detail.get('restarts', 0) for detail in details)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--links', type=int, default=20000, help="links per user")
+    parser.add_argument('--threads', type=int, default=4, help="writer threads")
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--methods', nargs='+', default=['none', 'stepped', 'restart', 'locked'],
+                        choices=['none', 'stepped', 'restart', 'locked'])
+    parser.add_argument('--db', help="reuse this database instead of generating one (links are added to it)")
+    args = parser.parse_args()
+
+    cache.query_cache.max_entries = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db
+        if not path:
+            path = os.path.join(tmp, 'backup.source.db')
+            print(f"Generating {args.users} users x {args.links} links", file=sys.stderr)
+            generate.generate(path, args.users, args.links)
+        database.configure(path)
+        print(f"{maintenance.file_size(path) / 2 ** 20:.0f} MB database, {args.threads} writers")
+        print(f"{'method':<9} {'links/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'backups':>8} "
+              f"{'backup s':>9} {'restarts':>9}")
+        for method in args.methods:
+            result = run(path, method, args, tmp)
+            print(f"{method:<9} {result['links_per_second']:>8.0f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+                  f"{result['max_ms']:>8.1f} {result['backups']:>8} {result['backup_s']:>9.2f} "
+                  f"{result['restarts']:>9}")
+
+
+if __name__ == '__main__':
+    main()
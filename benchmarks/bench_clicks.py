@@ -0,0 +1,188 @@
+"""Measure click recording and the usage views against the obvious alternatives.
+
+Recording: --threads threads record --clicks clicks (Zipf-distributed over
+the links, like real usage) either with one upsert transaction per click or
+through clicks.ClickBuffer, and the time per click and the number of
+transactions are reported.
+
+Views: "most visited" (last 30 days and all time) and "never opened" are
+read from the rollups (clicks.py) and, for comparison, computed from an
+indexed raw log with one row per click (--events Zipf-distributed rows
+spread over a year, built only for this benchmark).
+
+Usage: python benchmarks/bench_clicks.py [--users 10] [--links 10000] [--threads 8] [--clicks 20000]
+                                        [--events 1000000] [--db existing.db]
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache  # noqa: E402
+import clicks  # noqa: E402
+import database  # noqa: E402
+import queries  # noqa: E402
+from benchmarks import generate  # noqa: E402
+
+RAW_MOST_VISITED = """
+    SELECT l.id, l.name, l.link, e.clicks FROM (
+        SELECT link_id, COUNT(*) AS clicks FROM click_event
+        WHERE user_id = ? AND clicked_at >= ?
+        GROUP BY link_id
+        ORDER BY clicks DESC
+        LIMIT ?
+    ) e
+    JOIN LINK l ON l.id = e.link_id
+    ORDER BY e.clicks DESC
+"""
+
+RAW_NEVER_OPENED = """
+    SELECT l.id, l.name, l.link, l.created_at FROM LINK l
+    WHERE l.user_id = ? AND NOT EXISTS (SELECT 1 FROM click_event e WHERE e.link_id = l.id)
+    ORDER BY l.created_at
+    LIMIT ?
+"""
+
+
+def click_stream(user_id, link_ids, count, seed=0):
+    rng = random.Random(seed)
+    weights = list(itertools.accumulate(generate.zipf_weights(len(link_ids))))
+    return [(user_id, link_id) for link_id in rng.choices(link_ids, cum_weights=weights, k=count)]
+
+
+def record_unbuffered(stream):
+    day = time.strftime('%Y-%m-%d', time.gmtime())
+    stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+    for user_id, link_id in stream:
+        with database.user_pool(user_id).transaction() as conn:
+            conn.execute(queries.ADD_DAILY_CLICKS, (day, 1, link_id, user_id))
+            conn.execute(queries.ADD_TOTAL_CLICKS, (1, stamp, link_id, user_id))
+
+
+def record_buffered(stream, buffer):
+    for user_id, link_id in stream:
+        buffer.record(user_id, link_id)
+
+
+def time_recording(method, streams):
+    buffer = clicks.ClickBuffer()
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=record_unbuffered if method == 'per click' else record_buffered,
+                         args=(stream,) if method == 'per click' else (stream, buffer))
+        for stream in streams
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    recorded = time.perf_counter() - started
+    if method == 'buffered':
+        buffer.stop()
+    total = time.perf_counter() - started
+    count = sum(len(stream) for stream in streams)
+    transactions = count if method == 'per click' else buffer.stats['flushes']
+    return count / recorded, recorded / count * 1e6, total, transactions
+
+
+def build_raw_log(user_ids, link_ids, events, seed=0):
+    rng = random.Random(seed)
+    weights = {user_id: list(itertools.accumulate(generate.zipf_weights(len(ids)))) for user_id, ids in link_ids.items()}
+    pool = database.get_pool()
+    with pool.transaction() as conn:
+        conn.execute("DROP TABLE IF EXISTS click_event")
+        conn.execute("CREATE TABLE click_event (user_id INTEGER, link_id INTEGER, clicked_at TEXT)")
+        now = time.time()
+        rows = (
+            (user_id, rng.choices(link_ids[user_id], cum_weights=weights[user_id])[0],
+             time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(now - rng.random() * 365 * 86400)))
+            for user_id in itertools.islice(itertools.cycle(user_ids), events)
+        )
+        conn.executemany("INSERT INTO click_event VALUES (?, ?, ?)", rows)
+        conn.execute("CREATE INDEX idx_click_event_user ON click_event (user_id, clicked_at, link_id)")
+        conn.execute("CREATE INDEX idx_click_event_link ON click_event (link_id)")
+    # Give the rollups the same clicks
+    buffer = clicks.ClickBuffer(flush_size=10 ** 9)
+    for user_id, link_id, clicked_at in pool.fetchall("SELECT user_id, link_id, clicked_at FROM click_event"):
+        buffer.record(user_id, link_id, time.mktime(time.strptime(clicked_at, '%Y-%m-%d %H:%M:%S')) - time.timezone)
+    buffer.stop()
+
+
+def time_query(func, repeat=20):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def run(path, args):
+    database.configure(path)
+    pool = database.get_pool()
+    user_ids = [row[0] for row in pool.fetchall("SELECT id FROM USER ORDER BY id")]
+    link_ids = {user_id: [row[0] for row in pool.fetchall(queries.USER_LINKS, (user_id,))] for user_id in user_ids}
+    print(f"{sum(len(ids) for ids in link_ids.values())} links, {args.threads} threads, {args.clicks} clicks")
+
+    print(f"{'recording':<10} {'clicks/s':>10} {'us/click':>9} {'total s':>8} {'transactions':>13}")
+    per_thread = args.clicks // args.threads
+    for method in ('per click', 'buffered'):
+        streams = [
+            click_stream(user_ids[n % len(user_ids)], link_ids[user_ids[n % len(user_ids)]], per_thread, seed=n)
+            for n in range(args.threads)
+        ]
+        rate, per_click, total, transactions = time_recording(method, streams)
+        print(f"{method:<10} {rate:>10.0f} {per_click:>9.1f} {total:>8.2f} {transactions:>13}")
+
+    with pool.transaction() as conn:
+        conn.execute("DELETE FROM link_click_daily")
+        conn.execute("DELETE FROM link_click_total")
+    print(f"Building a raw log of {args.events} clicks and the matching rollups", file=sys.stderr)
+    build_raw_log(user_ids, link_ids, args.events)
+    user_id = user_ids[0]
+    since = clicks.since_day(30)
+    views = [
+        ('most visited 30 days', lambda: pool.fetchall(RAW_MOST_VISITED, (user_id, since, 5)),
+         lambda: clicks.most_visited(user_id)),
+        ('most visited all time', lambda: pool.fetchall(RAW_MOST_VISITED, (user_id, '', 5)),
+         lambda: clicks.most_visited(user_id, days=None)),
+        ('never opened', lambda: pool.fetchall(RAW_NEVER_OPENED, (user_id, 5)),
+         lambda: clicks.never_opened(user_id)),
+    ]
+    print(f"{'view (p50 ms)':<24} {'raw log':>9} {'rollups':>9}")
+    for name, raw, rollup in views:
+        print(f"{name:<24} {time_query(raw):>9.2f} {time_query(rollup):>9.2f}")
+    with pool.transaction() as conn:
+        conn.execute("DROP TABLE click_event")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--links', type=int, default=10000, help="links per user")
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--clicks', type=int, default=20000)
+    parser.add_argument('--events', type=int, default=1000000, help="clicks in the raw log for the view comparison")
+    parser.add_argument('--db', help="reuse this database instead of generating one (its click rollups are reset)")
+    args = parser.parse_args()
+
+    cache.query_cache.max_entries = 0
+    if args.db:
+        run(args.db, args)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'clicks.db')
+        print(f"Generating {args.users} users x {args.links} links", file=sys.stderr)
+        generate.generate(path, args.users, args.links)
+        run(path, args)
+
+
+if __name__ == '__main__':
+    main()
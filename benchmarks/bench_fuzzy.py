@@ -0,0 +1,160 @@
+"""Measure typo-tolerant search latency and compare it with scanning every link.
+
+Generates a database (or reuses --db) and pads the first user's term
+dictionary with --vocabulary made-up words so it is the size of a real
+collection's vocabulary (the generator itself only uses about 150 words). Queries are
+generator words with one or two typos. For each query it times the
+dictionary lookup (fuzzy.similar_terms, uncached) and the first page of
+typo-tolerant results, and counts how often the intended words were
+searched for and how often they were the top correction. --baseline runs
+that many queries the slow way: edit distance against every word of every
+one of the user's links.
+
+Usage: python benchmarks/bench_fuzzy.py [--users 10] [--links 100000] [--vocabulary 200000] [--queries 200]
+                                       [--baseline 3] [--db existing.db]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache  # noqa: E402
+import database  # noqa: E402
+import fuzzy  # noqa: E402
+import queries  # noqa: E402
+import store  # noqa: E402
+from benchmarks import generate  # noqa: E402
+
+SYLLABLES = "ba be bi bo bu ca co da de di do fa fe fi ga go ha he ka ko la le li lo lu ma me mi mo mu " \
+            "na ne ni no pa pe pi po ra re ri ro sa se si so ta te ti to va ve vi za ze str tr pl gr ch sh th".split()
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+
+def pad_vocabulary(count, user_id, seed=0):
+    """Add count made-up words of 2-5 syllables to a user's term dictionary"""
+    rng = random.Random(seed)
+    terms = set()
+    while len(terms) < count:
+        terms.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 5))))
+    with database.get_pool().transaction() as conn:
+        conn.executemany(queries.ADD_FUZZY_TERM, [(user_id, term) for term in terms])
+    fuzzy.similar_terms.cache_clear()
+
+
+def typo(rng, word):
+    """word with one random deletion, insertion, substitution or swap"""
+    i = rng.randrange(len(word))
+    kind = rng.choice(['delete', 'insert', 'substitute', 'swap'])
+    if kind == 'delete':
+        return word[:i] + word[i + 1:]
+    if kind == 'insert':
+        return word[:i] + rng.choice(LETTERS) + word[i:]
+    if kind == 'substitute':
+        return word[:i] + rng.choice(LETTERS.replace(word[i], '')) + word[i + 1:]
+    i = min(i, len(word) - 2)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def make_queries(count, seed=0):
+    """(query, intended words) pairs of one or two misspelled generator words"""
+    rng = random.Random(seed)
+    words = sorted({word for word in generate.WORDS if len(word) >= 4})
+    result = []
+    while len(result) < count:
+        intended = rng.sample(words, rng.choice([1, 1, 2]))
+        misspelled = [typo(rng, word) for word in intended]
+        if all(wrong != right for wrong, right in zip(misspelled, intended)):
+            result.append((' '.join(misspelled), intended))
+    return result
+
+
+def scan_search(user_id, query):
+    """Typo-tolerant search without an index: edit distance against every word of every link"""
+    query_words = fuzzy.words(query)
+    matches = []
+    for row in database.get_pool().fetchall(queries.USER_LINKS, (user_id,)):
+        row_words = set(fuzzy.words(' '.join(filter(None, row[1:4]))))
+        if all(any(fuzzy.edit_distance(q, w) <= fuzzy.max_edits(q) for w in row_words) for q in query_words):
+            matches.append(row[0])
+    return matches
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def report(name, seconds):
+    seconds = sorted(seconds)
+    print(f"{name:<22} {statistics.median(seconds) * 1000:>9.2f} {percentile(seconds, 0.95) * 1000:>9.2f} "
+          f"{seconds[-1] * 1000:>9.2f}")
+
+
+def run(path, args):
+    database.configure(path)
+    pool = database.get_pool()
+    if not pool.capabilities['fuzzy']:
+        raise SystemExit("This SQLite build has no FTS5 trigram tokenizer")
+    fuzzy.refresh_terms(limit=None)
+    user_id = pool.fetchone(queries.USER_BY_EMAIL, (generate.user_email(1),))[0]
+    if args.vocabulary:
+        pad_vocabulary(args.vocabulary, user_id)
+    terms = pool.fetchone("SELECT COUNT(*) FROM fuzzy_term WHERE user_id = ?", (user_id,))[0]
+    links = pool.fetchone("SELECT COUNT(*) FROM LINK")[0]
+    print(f"{links} links, {terms} words in the user's dictionary, {args.queries} queries")
+
+    lookup, search, corrected, found = [], [], 0, 0
+    search_page = store.search_links_page.__wrapped__
+    for query, intended in make_queries(args.queries):
+        fuzzy.similar_terms.cache_clear()
+        started = time.perf_counter()
+        match, corrections = fuzzy.fuzzy_query(user_id, query)
+        lookup.append(time.perf_counter() - started)
+        corrected += [corrections.get(word) for word in fuzzy.words(query)] == intended
+        found += all(queries.fts_quote(word) in match for word in intended)
+        fuzzy.similar_terms.cache_clear()
+        started = time.perf_counter()
+        search_page(user_id, query, None, 25, (), False, True)
+        search.append(time.perf_counter() - started)
+
+    print(f"{'':<22} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    report('dictionary lookup', lookup)
+    report('typo-tolerant page', search)
+    if args.baseline:
+        scans = []
+        for query, _ in make_queries(args.baseline, seed=1):
+            started = time.perf_counter()
+            scan_search(user_id, query)
+            scans.append(time.perf_counter() - started)
+        report('edit distance scan', scans)
+    print(f"Intended words searched for {found}/{args.queries} queries, "
+          f"and the top correction for {corrected}/{args.queries}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--links', type=int, default=100000, help="links per user")
+    parser.add_argument('--vocabulary', type=int, default=200000, help="made-up words added to the first user's dictionary")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--baseline', type=int, default=3, help="queries to run by scanning every link")
+    parser.add_argument('--db', help="reuse this database instead of generating one (it is modified)")
+    args = parser.parse_args()
+
+    cache.query_cache.max_entries = 0
+    if args.db:
+        run(args.db, args)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'fuzzy.db')
+        print(f"Generating {args.users} users x {args.links} links", file=sys.stderr)
+        generate.generate(path, args.users, args.links)
+        run(path, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Compare the old and new Manage Links picker at different link counts.
+
+The old page loaded every link and formatted each selectbox option with a
+linear scan (O(n^2) per selectbox, twice per rerun). The new picker loads one
+page (or a bounded search) and formats options through an id-keyed dict.
+
+Usage: python benchmarks/bench_manage_picker.py [--sizes 10 1000 10000 100000] [--old-limit 10000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import queries  # noqa: E402
+
+PAGE_SIZE = 25
+
+
+def old_picker(pool, user_id):
+    links = pool.fetchall(queries.USER_LINKS, (user_id,))
+    link_ids = [link[0] for link in links]
+    link_names = [f"{link[0]} - {link[1]}" for link in links]
+    # Two selectboxes, each formatting every option with a linear scan
+    for _ in range(2):
+        labels = [next(name for id_, name in zip(link_ids, link_names) if id_ == x) for x in link_ids]
+    selected = link_ids[len(link_ids) // 2]
+    current = next(link for link in links if link[0] == selected)
+    return labels, current
+
+
+def new_picker(pool, user_id):
+    links = pool.fetchall(queries.user_links_page(), (user_id, queries.MAX_ID, PAGE_SIZE + 1))[:PAGE_SIZE]
+    links_by_id = {link[0]: link for link in links}
+    for _ in range(2):
+        labels = [f"{link_id} - {links_by_id[link_id][1]}" for link_id in links_by_id]
+    selected = links[len(links) // 2][0]
+    # Jumping to any link by #id is a primary-key lookup
+    current = pool.fetchone(queries.GET_LINK, (selected, user_id))
+    return labels, current
+
+
+def timed(func, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000, 100000])
+    parser.add_argument('--old-limit', type=int, default=10000,
+                        help="skip the O(n^2) picker above this many links")
+    args = parser.parse_args()
+
+    print(f"{'links':>8} {'old (ms)':>12} {'new (ms)':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            pool = database.get_pool(os.path.join(tmp, f"picker_{size}.db"))
+            pool.executemany(
+                queries.ADD_LINK,
+                ((1, f"Link {i}", f"https://example.com/{i}", "", i) for i in range(size))
+            )
+            old = f"{timed(old_picker, pool, 1, repeat=1) * 1000:12.1f}" if size <= args.old_limit else f"{'skipped':>12}"
+            new = f"{timed(new_picker, pool, 1) * 1000:10.2f}"
+            print(f"{size:>8} {old} {new}")
+    database.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Measure single-link write throughput against the number of shard files.
+
+For every shard count a fresh directory database is laid out with
+sharding.rebalance(), --users users are registered and --threads threads
+add links for them through store.add_link (one commit per link, like
+concurrent sessions or API callers). Shard count 0 is the unsharded single
+file. With --synchronous full every commit is fsynced, which is where
+writers on different files stop waiting for each other.
+
+Usage: python benchmarks/bench_shards.py [--shards 0 2 4 8] [--threads 16] [--links 300] [--users 64]
+                                         [--synchronous normal|full]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache  # noqa: E402
+import database  # noqa: E402
+import sharding  # noqa: E402
+import store  # noqa: E402
+
+
+def run(path, shard_count, threads, links, users, synchronous):
+    database.configure(path)
+    sharding.rebalance(shard_count)
+    user_ids = []
+    for number in range(users):
+        store.register_user(f"User {number}", f"user{number}@example.com", "password")
+        user_ids.append(store.login_user(f"user{number}@example.com", "password")[0])
+    latencies = []
+    failures = []
+
+    def worker(number):
+        for pool in database.data_pools():
+            pool.execute(f"PRAGMA synchronous = {synchronous.upper()}")
+        for i in range(links):
+            user_id = user_ids[(number + i * threads) % users]
+            start = time.perf_counter()
+            success, message = store.add_link(user_id, f"Link {number}-{i}", f"https://bench.example/{number}/{i}", "")
+            latencies.append(time.perf_counter() - start)
+            if not success:
+                failures.append(message)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    lock_retries = sum(pool.stats()['lock_retries'] for pool in database.data_pools())
+    database.close_all()
+    if failures:
+        raise SystemExit(f"{shard_count} shards: {len(failures)} failed writes, e.g. {failures[0]}")
+    latencies.sort()
+    return {
+        'links_per_second': threads * links / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+        'lock_retries': lock_retries
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shards', type=int, nargs='+', default=[0, 2, 4, 8])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--links', type=int, default=300, help="links added per thread")
+    parser.add_argument('--users', type=int, default=64)
+    parser.add_argument('--synchronous', choices=['normal', 'full'], default='normal')
+    args = parser.parse_args()
+
+    cache.query_cache.max_entries = 0
+    print(f"{'shards':>6} {'links/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'lock retries':>13}")
+    for shard_count in args.shards:
+        with tempfile.TemporaryDirectory() as tmp:
+            result = run(os.path.join(tmp, 'shards.db'), shard_count, args.threads, args.links, args.users,
+                         args.synchronous)
+        print(f"{shard_count:>6} {result['links_per_second']:>10.0f} {result['p50_ms']:>8.2f} "
+              f"{result['p99_ms']:>8.2f} {result['lock_retries']:>13}")
+
+
+if __name__ == '__main__':
+    main()
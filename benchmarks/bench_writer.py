@@ -0,0 +1,91 @@
+"""Compare direct link inserts with the group-committing batch writer.
+
+Several threads add links at the same time, like concurrent sessions or API
+callers. "direct" commits every link on its own (store.add_link), and
+"direct-full" does the same with synchronous=FULL, i.e. one fsync per link.
+"normal", "full" and "queued" send the links to writer.BatchWriter with that
+durability setting; throughput includes waiting for the queue to be
+written, latency is what callers wait for.
+
+Usage: python benchmarks/bench_writer.py [--threads 16] [--links 500]
+                                        [--modes direct direct-full normal full queued]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache  # noqa: E402
+import database  # noqa: E402
+import store  # noqa: E402
+import writer  # noqa: E402
+
+MODES = ['direct', 'direct-full', 'normal', 'full', 'queued']
+
+
+def run_mode(path, mode, threads, links):
+    database.configure(path)
+    store.register_user("Bench", "bench@example.com", "password")
+    user_id = store.login_user("bench@example.com", "password")[0]
+    batch_writer = writer.BatchWriter(durability=mode).start() if mode in writer.DURABILITY_LEVELS else None
+    add_link = batch_writer.add_link if batch_writer else store.add_link
+    latencies = []
+    failures = []
+
+    def worker(number):
+        if mode == 'direct-full':
+            database.get_pool().execute("PRAGMA synchronous = FULL")
+        for i in range(links):
+            start = time.perf_counter()
+            success, message = add_link(user_id, f"Link {number}-{i}", f"https://bench.example/{number}/{i}", "")
+            latencies.append(time.perf_counter() - start)
+            if not success:
+                failures.append(message)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    if batch_writer:
+        batch_writer.flush()
+    elapsed = time.perf_counter() - started
+    stats = batch_writer.stats() if batch_writer else None
+    if batch_writer:
+        batch_writer.stop()
+    database.close_all()
+    if failures:
+        raise SystemExit(f"{mode}: {len(failures)} failed writes, e.g. {failures[0]}")
+    latencies.sort()
+    return {
+        'links_per_second': threads * links / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+        'average_batch': stats['average_batch'] if stats else 1.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--links', type=int, default=500, help="links added per thread")
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    args = parser.parse_args()
+
+    cache.query_cache.max_entries = 0
+    print(f"{'mode':<12} {'links/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'avg batch':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in args.modes:
+            result = run_mode(os.path.join(tmp, f"writer_{mode}.db"), mode, args.threads, args.links)
+            print(f"{mode:<12} {result['links_per_second']:>10.0f} {result['p50_ms']:>8.2f} "
+                  f"{result['p95_ms']:>8.2f} {result['average_batch']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
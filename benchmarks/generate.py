@@ -0,0 +1,167 @@
+"""Fill a database with synthetic users and links for benchmarking.
+
+Every user gets the same password (PASSWORD) and the email user<N>@example.com.
+Domains and words follow a Zipf-like distribution, about a third of the links
+have no description, and creation dates lean towards the recent past. Links
+get up to three tags (TAGS, also Zipf-weighted) and a few are put in one of
+COLLECTIONS. The same --seed always produces the same data.
+
+Usage: python benchmarks/generate.py OUTPUT.db [--users 100] [--links 1000] [--seed 0]
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import queries  # noqa: E402
+import store  # noqa: E402
+import urls  # noqa: E402
+
+PASSWORD = 'password'
+BATCH_SIZE = 10000
+# Most recent date a generated link can have; fixed so runs are reproducible
+NEWEST = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+DOMAINS = [
+    'github.com', 'stackoverflow.com', 'youtube.com', 'en.wikipedia.org', 'medium.com',
+    'docs.python.org', 'news.ycombinator.com', 'reddit.com', 'dev.to', 'developer.mozilla.org',
+    'arxiv.org', 'nytimes.com', 'bbc.co.uk', 'theverge.com', 'arstechnica.com',
+    'realpython.com', 'pypi.org', 'blog.rust-lang.org', 'go.dev', 'kubernetes.io',
+    'aws.amazon.com', 'cloud.google.com', 'learn.microsoft.com', 'substack.com', 'twitter.com',
+    'linkedin.com', 'nature.com', 'sqlite.org', 'postgresql.org', 'martinfowler.com',
+    'smashingmagazine.com', 'css-tricks.com', 'freecodecamp.org', 'towardsdatascience.com', 'kaggle.com',
+    'huggingface.co', 'pytorch.org', 'tensorflow.org', 'numpy.org', 'pandas.pydata.org',
+]
+
+WORDS = (
+    "python guide tutorial data performance database search index query cache design system "
+    "web api async server client learning machine model deep network security testing code "
+    "review best practices introduction advanced how to build fast scale streaming pipeline "
+    "cloud deploy docker kubernetes linux shell git release notes blog post video talk paper "
+    "research analysis benchmark optimization memory cpu latency throughput storage sqlite "
+    "postgres rust go javascript react css html browser mobile app startup product history "
+    "science news opinion review recipe travel music book finance health sports game art "
+    "photo design pattern architecture microservices monolith event queue worker thread "
+    "concurrency parallel vector matrix graph tree algorithm structure type compiler runtime"
+).split()
+
+
+TAGS = [
+    'programming', 'python', 'reading', 'reference', 'tools', 'databases', 'ml', 'web', 'devops', 'career',
+    'rust', 'talks', 'papers', 'security', 'design', 'frontend', 'tutorial', 'news', 'ideas', 'archive',
+]
+
+COLLECTIONS = ['Read later', 'Work', 'Side project', 'Favourites']
+
+
+def zipf_weights(count, exponent=1.0):
+    return [1 / (rank + 1) ** exponent for rank in range(count)]
+
+
+class LinkFactory:
+    """Deterministic generator of realistic-looking link rows"""
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.domain_weights = list(itertools.accumulate(zipf_weights(len(DOMAINS))))
+        self.word_weights = list(itertools.accumulate(zipf_weights(len(WORDS), 0.8)))
+        self.tag_weights = list(itertools.accumulate(zipf_weights(len(TAGS))))
+
+    def words(self, count):
+        return self.rng.choices(WORDS, cum_weights=self.word_weights, k=count)
+
+    def link(self, user_id, number):
+        rng = self.rng
+        title = self.words(rng.randint(2, 7))
+        domain = rng.choices(DOMAINS, cum_weights=self.domain_weights)[0]
+        segments = ['-'.join(self.words(rng.randint(1, 4))) for _ in range(rng.randint(1, 3))]
+        # The number keeps URLs unique per user, like distinct articles on one site
+        url = f"https://{domain}/{'/'.join(segments)}-{number}"
+        if rng.random() < 0.2:
+            url += f"?id={rng.randint(1, 10 ** 6)}"
+        description = '' if rng.random() < 0.35 else ' '.join(self.words(rng.randint(5, 40))).capitalize()
+        age = min(rng.expovariate(1 / 120), 3 * 365)
+        created_at = (NEWEST - timedelta(days=age)).strftime('%Y-%m-%d %H:%M:%S')
+        return (user_id, ' '.join(title).title(), url, description, created_at, urls.url_hash(url))
+
+
+    def tags(self):
+        """(tags, collections) for one link"""
+        tags = set(self.rng.choices(TAGS, cum_weights=self.tag_weights, k=self.rng.randint(0, 3)))
+        collections = [self.rng.choice(COLLECTIONS)] if self.rng.random() < 0.1 else []
+        return sorted(tags), collections
+
+
+def user_email(number):
+    return f"user{number}@example.com"
+
+
+def generate(path, users, links_per_user, seed=0, batch_size=BATCH_SIZE, progress=None):
+    """Create users x links_per_user links in the database at path; returns the user ids"""
+    pool = database.get_pool(path)
+    password = store.hash_password(PASSWORD)
+    with pool.transaction() as conn:
+        conn.executemany(queries.REGISTER, ((f"User {n}", user_email(n), password) for n in range(users)))
+    user_ids = [pool.fetchone(queries.USER_BY_EMAIL, (user_email(n),))[0] for n in range(users)]
+
+    factory = LinkFactory(seed)
+    rows = (factory.link(user_id, number) for user_id in user_ids for number in range(links_per_user))
+    written = 0
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        with pool.transaction() as conn:
+            conn.executemany(queries.IMPORT_LINK, batch)
+        written += len(batch)
+        if progress:
+            progress(written, users * links_per_user)
+
+    for user_id in user_ids:
+        with pool.transaction() as conn:
+            conn.executemany(queries.ADD_TAG, [(user_id, 'tag', name) for name in TAGS] +
+                             [(user_id, 'collection', name) for name in COLLECTIONS])
+            tag_ids = {
+                (kind, name): tag_id
+                for tag_id, kind, name in conn.execute("SELECT id, kind, name FROM tag WHERE user_id = ?", (user_id,))
+            }
+            link_tags = []
+            for (link_id,) in conn.execute("SELECT id FROM LINK WHERE user_id = ? ORDER BY id", (user_id,)).fetchall():
+                tags, collections = factory.tags()
+                link_tags += [(tag_ids['tag', name], link_id) for name in tags]
+                link_tags += [(tag_ids['collection', name], link_id) for name in collections]
+            conn.executemany(queries.TAG_LINK, link_tags)
+            conn.execute(queries.PRUNE_TAGS, (user_id,))
+    return user_ids
+
+
+def print_progress(written, total):
+    print(f"\r{written}/{total} links", end='', file=sys.stderr, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output', help="database file to create")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--links', type=int, default=1000, help="links per user")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        parser.error(f"{args.output} already exists")
+    started = time.perf_counter()
+    generate(args.output, args.users, args.links, args.seed, progress=print_progress)
+    database.close_all()
+    print(file=sys.stderr)
+    print(f"Generated {args.users * args.links} links for {args.users} users "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
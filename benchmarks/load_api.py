@@ -0,0 +1,205 @@
+"""Load test the JSON API on localhost and report requests per second and latency.
+
+Generates a database, creates a token for one user, starts `api.py serve` in
+a subprocess and keeps --connections keep-alive connections busy for
+--duration seconds. Each connection sends a mix of first-page listings, next
+page listings, searches and single-link reads (plus link creation with
+--write-ratio).
+
+Usage: python benchmarks/load_api.py [--users 10] [--links 10000] [--connections 32] [--duration 10]
+                                     [--write-ratio 0.0] [-o results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote_plus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import database  # noqa: E402
+import queries  # noqa: E402
+import store  # noqa: E402
+from benchmarks import generate  # noqa: E402
+
+SEARCHES = ['python', 'database performance', '"machine learning"', 'optim', 'rust compiler runtime']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection"""
+
+    def __init__(self, port, token):
+        self.port = port
+        self.token = token
+        self.reader = self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port)
+
+    async def request(self, method, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else b''
+        head = (f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nAuthorization: Bearer {self.token}\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n")
+        self.writer.write(head.encode('latin-1') + body)
+        await self.writer.drain()
+        response = await self.reader.readuntil(b"\r\n\r\n")
+        status = int(response.split(b' ', 2)[1])
+        length = 0
+        for line in response.split(b"\r\n"):
+            if line.lower().startswith(b'content-length:'):
+                length = int(line.split(b':', 1)[1])
+        data = await self.reader.readexactly(length)
+        return status, json.loads(data) if data else None
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+def next_request(rng, state, write_ratio, counter):
+    """Pick the next (kind, method, path, payload) of the traffic mix"""
+    if rng.random() < write_ratio:
+        counter[0] += 1
+        return 'create', 'POST', '/links', {'name': f"Load test {counter[0]}",
+                                            'url': f"https://load.example/{os.getpid()}/{counter[0]}"}
+    roll = rng.random()
+    if roll < 0.35:
+        return 'list', 'GET', '/links', None
+    if roll < 0.55 and state.get('cursor'):
+        return 'list_next', 'GET', f"/links?cursor={state['cursor']}", None
+    if roll < 0.8:
+        query = SEARCHES[rng.randrange(len(SEARCHES))]
+        return 'search', 'GET', f"/search?q={quote_plus(query)}", None
+    return 'get', 'GET', f"/links/{rng.choice(state['ids'])}", None
+
+
+async def run_connection(port, token, deadline, state, write_ratio, seed, samples, errors, counter):
+    rng = random.Random(seed)
+    client = Client(port, token)
+    await client.connect()
+    try:
+        while time.perf_counter() < deadline:
+            kind, method, path, payload = next_request(rng, state, write_ratio, counter)
+            started = time.perf_counter()
+            status, data = await client.request(method, path, payload)
+            samples.setdefault(kind, []).append(time.perf_counter() - started)
+            if status >= 400:
+                errors[status] = errors.get(status, 0) + 1
+            elif kind == 'list' and data['next_cursor']:
+                state['cursor'] = data['next_cursor']
+    finally:
+        await client.close()
+
+
+async def load(port, token, connections, duration, state, write_ratio):
+    samples, errors, counter = {}, {}, [0]
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(
+        run_connection(port, token, deadline, state, write_ratio, seed, samples, errors, counter)
+        for seed in range(connections)
+    ))
+    return samples, errors, time.perf_counter() - started
+
+
+def summarize(samples, elapsed):
+    ordered = sorted(samples)
+    return {
+        'requests': len(ordered),
+        'requests_per_second': round(len(ordered) / elapsed, 1),
+        'p50_ms': round(percentile(ordered, 0.5) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3) if ordered else 0.0
+    }
+
+
+async def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("The API server exited during startup")
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+        except OSError:
+            await asyncio.sleep(0.1)
+            continue
+        writer.close()
+        return
+    raise SystemExit("The API server did not start in time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--links', type=int, default=10000, help="links per user")
+    parser.add_argument('--connections', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds of load")
+    parser.add_argument('--workers', type=int, default=16, help="API server worker threads")
+    parser.add_argument('--write-ratio', type=float, default=0.0, help="fraction of requests that add a link")
+    parser.add_argument('-o', '--output', help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'api_load.db')
+        database.configure(path)
+        print(f"Generating {args.users} users x {args.links} links", file=sys.stderr)
+        generate.generate(path, args.users, args.links)
+        pool = database.get_pool()
+        user_id = pool.fetchone(queries.USER_BY_EMAIL, (generate.user_email(args.users // 2),))[0]
+        token = store.create_api_token(user_id, 'load test')
+        ids = [row[0] for row in pool.fetchall(queries.user_links_page(), (user_id, queries.MAX_ID, 1000))]
+        database.close_all()
+
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, 'api.py'), '--db', path, 'serve',
+             '--port', str(port), '--workers', str(args.workers)],
+            stderr=subprocess.DEVNULL
+        )
+        try:
+            asyncio.run(wait_for_port(port, server))
+            samples, errors, elapsed = asyncio.run(load(
+                port, token, args.connections, args.duration, {'ids': ids}, args.write_ratio
+            ))
+        finally:
+            server.terminate()
+            server.wait()
+
+    results = {
+        'connections': args.connections,
+        'duration_seconds': round(elapsed, 2),
+        'links_per_user': args.links,
+        'total': summarize([sample for kind in samples.values() for sample in kind], elapsed),
+        'endpoints': {kind: summarize(values, elapsed) for kind, values in sorted(samples.items())},
+        'errors': errors
+    }
+    print(f"{'endpoint':<10} {'requests':>9} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for kind, stats in list(results['endpoints'].items()) + [('total', results['total'])]:
+        print(f"{kind:<10} {stats['requests']:>9} {stats['requests_per_second']:>9.0f} "
+              f"{stats['p50_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+    if errors:
+        print(f"Errors by status: {errors}", file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
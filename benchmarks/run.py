@@ -0,0 +1,207 @@
+"""Time the main data paths and page builders at several dataset sizes.
+
+Each scale (USERSxLINKS, links per user) gets a fresh generated database in a
+temporary directory. Operations run for a user in the middle of the dataset
+with the query cache disabled (pass --cache to measure cached reads). Results
+are written as JSON; --compare prints the change against an earlier results
+file and exits non-zero when an operation got slower than --threshold.
+
+Usage: python benchmarks/run.py [--scales 10x100 100x1000 10x10000] [--repeat 20]
+                                [-o results.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache  # noqa: E402
+import database  # noqa: E402
+import pages  # noqa: E402
+import queries  # noqa: E402
+import store  # noqa: E402
+import urls  # noqa: E402
+from benchmarks import generate  # noqa: E402
+
+SCALES = ['10x100', '100x1000', '10x10000']
+REPEAT = 20
+THRESHOLD = 0.2
+SEARCHES = ['python', 'database performance', '"machine learning"', 'optim', 'rust compiler runtime']
+
+
+def timed(func, repeat):
+    """Call func(i) repeat times after one warm-up call; returns per-call timings in ms"""
+    func(-1)
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'median_ms': round(statistics.median(ordered), 4),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        'min_ms': round(ordered[0], 4),
+        'runs': len(ordered)
+    }
+
+
+def bench_url(i):
+    return f"https://benchmark.example/link-{i}"
+
+
+def read_operations(user_id, email):
+    """Read paths and page builders; each takes the iteration number"""
+    tags = {name: tag_id for tag_id, kind, name, count in store.get_tag_facets(user_id)}
+    common = tuple(tags[name] for name in generate.TAGS[:2] if name in tags)
+    rare = tuple(tags[name] for name in generate.TAGS[-2:] if name in tags)
+    return [
+        ('login_user', lambda i: store.login_user(email, generate.PASSWORD)),
+        ('get_user_links', lambda i: store.get_user_links(user_id)),
+        ('search_links', lambda i: store.search_links(user_id, SEARCHES[i % len(SEARCHES)])),
+        ('dashboard_page', lambda i: pages.dashboard_page_data(user_id)),
+        ('search_page', lambda i: pages.search_page_data(user_id, SEARCHES[i % len(SEARCHES)])),
+        ('manage_page', lambda i: pages.manage_page_data(user_id)),
+        ('manage_tags_any', lambda i: pages.manage_page_data(user_id, tag_ids=rare)),
+        ('manage_tags_all', lambda i: pages.manage_page_data(user_id, tag_ids=common, match_all=True)),
+        ('search_tags_all', lambda i: pages.search_page_data(
+            user_id, SEARCHES[i % len(SEARCHES)], tag_ids=common, match_all=True)),
+    ]
+
+
+def run_operations(operations, repeat, results):
+    for name, func in operations:
+        results[name] = summarize(timed(func, repeat))
+        print(f"  {name:<16} {results[name]['median_ms']:>10.3f} ms median {results[name]['p95_ms']:>10.3f} ms p95",
+              file=sys.stderr)
+
+
+def run_scale(directory, users, links, repeat, seed):
+    path = os.path.join(directory, f"bench_{users}x{links}.db")
+    database.configure(path)
+    started = time.perf_counter()
+    generate.generate(path, users, links, seed)
+    generate_seconds = time.perf_counter() - started
+    cache.query_cache.clear()
+
+    pool = database.get_pool()
+    email = generate.user_email(users // 2)
+    user_id = pool.fetchone(queries.USER_BY_EMAIL, (email,))[0]
+    results = {}
+    run_operations(read_operations(user_id, email) + [
+        ('add_link', lambda i: store.add_link(user_id, f"Benchmark link {i}", bench_url(i), "Added by the benchmark")),
+    ], repeat, results)
+    # Update and delete the links add_link created (iteration -1 is the warm-up call)
+    ids = {i: pool.fetchone(queries.FIND_DUPLICATE, (user_id, urls.url_hash(bench_url(i))))[0] for i in range(-1, repeat)}
+    run_operations([
+        ('update_link', lambda i: store.update_link(ids[i], user_id, f"Updated link {i}", bench_url(i), "Updated")),
+        ('delete_link', lambda i: store.delete_link(ids[i], user_id)),
+    ], repeat, results)
+    database.close_all()
+    return {
+        'users': users,
+        'links_per_user': links,
+        'total_links': users * links,
+        'generate_seconds': round(generate_seconds, 2),
+        'operations': results
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, results, threshold):
+    """Print median changes per operation; returns the list of regressions"""
+    regressions = []
+    print(f"{'scale':<12} {'operation':<16} {'before ms':>10} {'after ms':>10} {'change':>8}")
+    for scale, current in results['scales'].items():
+        previous = baseline.get('scales', {}).get(scale)
+        if previous is None:
+            continue
+        for name, stats in current['operations'].items():
+            before = previous['operations'].get(name)
+            if before is None or not before['median_ms']:
+                continue
+            change = stats['median_ms'] / before['median_ms'] - 1
+            flag = ''
+            if change > threshold:
+                flag = '  REGRESSION'
+                regressions.append((scale, name, change))
+            print(f"{scale:<12} {name:<16} {before['median_ms']:>10.3f} {stats['median_ms']:>10.3f} {change:>+8.0%}{flag}")
+    return regressions
+
+
+def parse_scale(value):
+    try:
+        users, links = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"scale must look like 100x1000, not {value!r}")
+    return value, users, links
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', type=parse_scale, nargs='+', default=[parse_scale(s) for s in SCALES],
+                        help=f"USERSxLINKS_PER_USER (default: {' '.join(SCALES)})")
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache', action='store_true', help="keep the query cache enabled")
+    parser.add_argument('-o', '--output', help="write results as JSON to this file")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help="relative median slowdown reported as a regression (default: 0.2)")
+    args = parser.parse_args()
+
+    if not args.cache:
+        cache.query_cache.max_entries = 0
+    results = {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'cache': args.cache,
+        'scales': {}
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for label, users, links in args.scales:
+            print(f"{label}: {users} users x {links} links", file=sys.stderr)
+            results['scales'][label] = run_scale(directory, users, links, args.repeat, args.seed)
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as fp:
+            regressions = compare(json.load(fp), results, args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import database
+import queries
+
+# Maximum number of cached results, overridable with LINK_MANAGER_CACHE_SIZE (0 disables caching)
+CACHE_SIZE = int(os.environ.get('LINK_MANAGER_CACHE_SIZE', '1024'))
+# Seconds between reads of a user's database generation, overridable with
+# LINK_MANAGER_CACHE_RECHECK (0 reads it on every lookup)
+RECHECK_INTERVAL = float(os.environ.get('LINK_MANAGER_CACHE_RECHECK', '1'))
+
+
+class QueryCache:
+    """Bounded LRU cache of per-user read results.
+
+    Every key carries two generation numbers for the user:
+
+    - a local counter bumped by this process's writes (bump()), and
+    - the user's generation in user_stats, which triggers on LINK bump for
+      every write from any connection or process.
+
+    A write from this process makes older entries unreachable immediately;
+    they are never served and age out through LRU eviction. The database
+    generation is read at most once per recheck_interval seconds per user
+    (and again after bump()), so writes from other processes show up within
+    that interval without a lookup on every cached read. Pass
+    cross_process=False to skip it when a single process owns the database.
+    """
+
+    def __init__(self, max_entries=CACHE_SIZE, cross_process=True, recheck_interval=RECHECK_INTERVAL):
+        self.max_entries = max_entries
+        self.cross_process = cross_process
+        self.recheck_interval = recheck_interval
+        self._entries = OrderedDict()
+        self._generations = {}
+        # user_id -> (database generation, monotonic time it was read)
+        self._db_generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _db_generation(self, user_id):
+        now = time.monotonic()
+        checked = self._db_generations.get(user_id)
+        if checked and now - checked[1] < self.recheck_interval:
+            return checked[0]
+        generation = database.user_pool(user_id).fetchone(queries.USER_GENERATION, (user_id,))[0]
+        self._db_generations[user_id] = (generation, now)
+        return generation
+
+    def _key(self, user_id, name, args, kwargs):
+        db_generation = self._db_generation(user_id) if self.cross_process else None
+        return (user_id, self._generations.get(user_id, 0), db_generation, name, args, tuple(sorted(kwargs.items())))
+
+    def call(self, func, user_id, args, kwargs):
+        """Return func(user_id, *args, **kwargs), served from the cache when fresh"""
+        if self.max_entries <= 0:
+            return func(user_id, *args, **kwargs)
+        key = self._key(user_id, func.__name__, args, kwargs)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        value = func(user_id, *args, **kwargs)
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def bump(self, user_id):
+        """Invalidate everything cached for a user after a write"""
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self._db_generations.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._db_generations.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
+
+
+query_cache = QueryCache()
+
+
+def cached(func):
+    """Cache a read function whose first argument is the user id.
+
+    Cached results are shared between callers and must not be mutated.
+    """
+    @functools.wraps(func)
+    def wrapper(user_id, *args, **kwargs):
+        return query_cache.call(func, user_id, args, kwargs)
+    return wrapper
@@ -0,0 +1,224 @@
+import argparse
+import atexit
+import hashlib
+import hmac
+import os
+import sys
+import threading
+import time
+
+import database
+import importer
+import queries
+
+# Base URL of api.py's click redirect as browsers reach it (e.g. http://127.0.0.1:8600); unset: no tracking
+CLICK_URL = os.environ.get('LINK_MANAGER_CLICK_URL')
+# Seconds between flushes of the buffered counts
+FLUSH_INTERVAL = 5.0
+# Distinct (user, link, day) counters that trigger a flush before the interval is up
+FLUSH_SIZE = 1000
+# Window of the "most visited" view, in days (None: all time)
+MOST_VISITED_DAYS = 30
+
+_secrets = {}
+
+
+def enabled():
+    """True if links are rendered through the click redirect"""
+    return bool(CLICK_URL)
+
+
+def secret():
+    """Key signing redirect links, created by the migration in the directory database"""
+    path = database.DB_PATH
+    if path not in _secrets:
+        _secrets[path] = database.get_pool().fetchone(queries.CLICK_SECRET)[0].encode()
+    return _secrets[path]
+
+
+def signature(user_id, link_id):
+    """Short HMAC of a user's link id, so redirect URLs can't be guessed to reveal other users' links"""
+    return hmac.new(secret(), f"{user_id}:{link_id}".encode(), hashlib.sha256).hexdigest()[:20]
+
+
+def verify(user_id, link_id, sig):
+    return hmac.compare_digest(signature(user_id, link_id), sig)
+
+
+def tracked_url(user_id, link_id, url):
+    """Where a rendered link should point: the click redirect when tracking is on, else the link itself"""
+    if not enabled():
+        return url
+    return f"{CLICK_URL.rstrip('/')}/go/{link_id}?u={user_id}&s={signature(user_id, link_id)}"
+
+
+class ClickBuffer:
+    """Count link opens in memory and add them to the rollup tables in batches.
+
+    record() only increments a counter under a lock. A background thread
+    (started on first use) flushes every flush_interval seconds, or sooner
+    once flush_size distinct counters are pending, with one transaction per
+    database file for everything buffered; the rest is flushed at exit. A
+    crash loses at most the clicks of the last interval.
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, flush_size=FLUSH_SIZE):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {'recorded': 0, 'flushed': 0, 'flushes': 0, 'failures': 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self.run_forever, name='click-buffer', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+        return self
+
+    def stop(self, timeout=None):
+        """Stop the flush thread and write out what is still buffered"""
+        self._stop.set()
+        self._wake.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Click flush failed, will retry: {e}", file=sys.stderr)
+
+    def record(self, user_id, link_id, when=None):
+        """Count one open of a link; never touches the database"""
+        when = time.gmtime(when)
+        day, stamp = time.strftime('%Y-%m-%d', when), time.strftime('%Y-%m-%d %H:%M:%S', when)
+        key = (user_id, link_id, day)
+        with self._lock:
+            count, last = self._counts.get(key, (0, stamp))
+            self._counts[key] = (count + 1, max(last, stamp))
+            self.stats['recorded'] += 1
+            full = len(self._counts) >= self.flush_size
+        if self._thread is None:
+            self.start()
+        if full:
+            self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return sum(count for count, _ in self._counts.values())
+
+    def flush(self):
+        """Add everything buffered to the rollups; returns the number of clicks written.
+
+        Counts are taken out of the buffer first so recording never waits on
+        the database. If a write fails they are put back for the next flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                counts, self._counts = self._counts, {}
+            if not counts:
+                return 0
+            by_pool = {}
+            for (user_id, link_id, day), (count, last) in counts.items():
+                by_pool.setdefault(database.user_pool(user_id), []).append((user_id, link_id, day, count, last))
+            written = 0
+            try:
+                for pool, items in by_pool.items():
+                    with pool.transaction() as conn:
+                        conn.executemany(
+                            queries.ADD_DAILY_CLICKS,
+                            [(day, count, link_id, user_id) for user_id, link_id, day, count, _ in items]
+                        )
+                        conn.executemany(
+                            queries.ADD_TOTAL_CLICKS,
+                            [(count, last, link_id, user_id) for user_id, link_id, _, count, last in items]
+                        )
+                    for user_id, link_id, day, count, last in items:
+                        del counts[(user_id, link_id, day)]
+                    written += sum(item[3] for item in items)
+            except Exception:
+                self.stats['failures'] += 1
+                with self._lock:
+                    for key, (count, last) in counts.items():
+                        current, current_last = self._counts.get(key, (0, last))
+                        self._counts[key] = (current + count, max(last, current_last))
+                raise
+            self.stats['flushes'] += 1
+            self.stats['flushed'] += written
+            return written
+
+    def snapshot(self):
+        return dict(self.stats, pending=self.pending())
+
+
+buffer = ClickBuffer()
+
+
+def record(user_id, link_id):
+    """Tracking hook: count one open of a user's link (buffered, see ClickBuffer)"""
+    buffer.record(user_id, link_id)
+
+
+def since_day(days):
+    return time.strftime('%Y-%m-%d', time.gmtime(time.time() - (days - 1) * 86400))
+
+
+def most_visited(user_id, limit=5, days=MOST_VISITED_DAYS):
+    """A user's most opened links, from the daily rollup (last days days) or the all-time totals.
+
+    Returns rows of (id, name, url, clicks, last clicked day or time).
+    Not cached: clicks don't bump the user's cache generation, and the
+    rollups keep this to an index range scan.
+    """
+    pool = database.user_pool(user_id)
+    if days is None:
+        return pool.fetchall(queries.MOST_VISITED, (user_id, limit))
+    return pool.fetchall(queries.MOST_VISITED_SINCE, (user_id, since_day(days), limit))
+
+
+def never_opened(user_id, limit=5):
+    """A user's links without a single recorded open, oldest first: (id, name, url, created_at)"""
+    return database.user_pool(user_id).fetchall(queries.NEVER_OPENED, (user_id, limit))
+
+
+def count_opened(user_id):
+    """Number of a user's links opened at least once"""
+    return database.user_pool(user_id).fetchone(queries.COUNT_OPENED_LINKS, (user_id,))[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show which links a user opens, from the click rollups")
+    parser.add_argument('view', choices=['most-visited', 'never-opened'])
+    parser.add_argument('email')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--days', type=int, default=MOST_VISITED_DAYS, help="most-visited window (0: all time)")
+    parser.add_argument('--db', help="database file (default: LINK_MANAGER_DB or link_manager.db)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.configure(args.db)
+    user_id = importer.find_user_id(args.email)
+    if user_id is None:
+        parser.error(f"No user with email {args.email}")
+    if args.view == 'most-visited':
+        for link_id, name, link, count, last in most_visited(user_id, args.limit, args.days or None):
+            print(f"{count:>6}  {last:<19}  {name[:40]:<40}  {link}")
+    else:
+        for link_id, name, link, created_at in never_opened(user_id, args.limit):
+            print(f"{created_at or '':<19}  {name[:40]:<40}  {link}")
+
+
+if __name__ == '__main__':
+    main()
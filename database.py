@@ -0,0 +1,312 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import queries
+import schema
+
+# Database location, overridable with the LINK_MANAGER_DB environment variable
+DB_PATH = os.environ.get('LINK_MANAGER_DB', 'link_manager.db')
+
+BUSY_TIMEOUT_MS = 5000
+LOCK_RETRIES = 5
+LOCK_BACKOFF = 0.05
+
+# Set by instrumentation.enable(): called as query_hook(sql, seconds) for statements run through a pool
+query_hook = None
+# sqlite3 trace callback installed on every pooled connection (None: tracing off)
+trace_callback = None
+
+
+def is_lock_error(error):
+    """Return True if an OperationalError was caused by a locked/busy database"""
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+class ConnectionPool:
+    """Hand out one long-lived connection per thread for a single database file"""
+
+    def __init__(self, path, busy_timeout_ms=BUSY_TIMEOUT_MS, retries=LOCK_RETRIES):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.retries = retries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._created = 0
+        self._lock_retries = 0
+        self.capabilities = {}
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        if self.path != ':memory:':
+            # Only takes effect on a new file; lets maintenance.py hand free pages back to the filesystem
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        if trace_callback is not None:
+            conn.set_trace_callback(trace_callback)
+        return conn
+
+    def _prune(self):
+        """Close connections owned by threads that have exited"""
+        for thread in [t for t in self._connections if not t.is_alive()]:
+            self._connections.pop(thread).close()
+
+    def connection(self):
+        """Return the calling thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            with self._lock:
+                self._prune()
+                self._connections[threading.current_thread()] = conn
+                self._created += 1
+        return conn
+
+    @contextmanager
+    def checkout(self):
+        """Borrow the thread's connection and count it as in use"""
+        conn = self.connection()
+        with self._lock:
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                self._in_use -= 1
+
+    def retry(self, func, *args):
+        """Call func, retrying with backoff while the database is locked"""
+        for attempt in range(self.retries + 1):
+            try:
+                return func(*args)
+            except sqlite3.OperationalError as e:
+                if not is_lock_error(e) or attempt == self.retries:
+                    raise
+                with self._lock:
+                    self._lock_retries += 1
+                time.sleep(LOCK_BACKOFF * (2 ** attempt))
+
+    def timed(self, sql, func, *args):
+        """retry(func, *args), reporting its duration to query_hook when one is set"""
+        if query_hook is None:
+            return self.retry(func, *args)
+        started = time.perf_counter()
+        try:
+            return self.retry(func, *args)
+        finally:
+            query_hook(sql, time.perf_counter() - started)
+
+    def execute(self, sql, params=()):
+        """Run a single statement in its own implicit transaction"""
+        with self.checkout() as conn:
+            return self.timed(sql, conn.execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        """Run a statement for every parameter set inside one transaction"""
+        with self.transaction() as conn:
+            return self.timed(sql, conn.executemany, sql, seq_of_params)
+
+    def fetchone(self, sql, params=()):
+        with self.checkout() as conn:
+            return self.timed(sql, lambda: conn.execute(sql, params).fetchone())
+
+    def fetchall(self, sql, params=()):
+        with self.checkout() as conn:
+            return self.timed(sql, lambda: conn.execute(sql, params).fetchall())
+
+    @contextmanager
+    def transaction(self):
+        """Run a block inside BEGIN IMMEDIATE ... COMMIT, rolling back on error.
+
+        Nested calls on the same thread join the outer transaction, which
+        commits when the outermost block ends. If the COMMIT itself fails
+        (still locked after the retries, a deferred constraint) the
+        transaction is rolled back before the error is raised, so the
+        connection is never left inside it.
+        """
+        with self.checkout() as conn:
+            depth = getattr(self._local, 'depth', 0)
+            if depth:
+                self._local.depth = depth + 1
+                try:
+                    yield conn
+                finally:
+                    self._local.depth = depth
+                return
+            self.retry(conn.execute, "BEGIN IMMEDIATE")
+            self._local.depth = 1
+            try:
+                yield conn
+                self.retry(conn.execute, "COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._local.depth = 0
+
+    def set_trace_callback(self, callback):
+        """Install (or with None remove) a sqlite3 trace callback on every connection"""
+        with self._lock:
+            for conn in self._connections.values():
+                conn.set_trace_callback(callback)
+
+    def stats(self):
+        """Return connection usage counters for this pool"""
+        with self._lock:
+            self._prune()
+            return {
+                'path': self.path,
+                'open_connections': len(self._connections),
+                'in_use': self._in_use,
+                'peak_in_use': self._peak_in_use,
+                'connections_created': self._created,
+                'lock_retries': self._lock_retries
+            }
+
+    def close_all(self):
+        """Close every connection held by the pool"""
+        with self._lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def configure(path):
+    """Change the database file used by get_pool()"""
+    global DB_PATH
+    DB_PATH = path
+
+
+def open_pool(path):
+    """Create a pool, bring its schema up to date and probe its capabilities"""
+    pool = ConnectionPool(path)
+    schema.migrate(pool)
+    with pool.checkout() as conn:
+        pool.capabilities = schema.probe_capabilities(conn)
+    return pool
+
+
+def get_pool(path=None):
+    """Return the process-wide pool for a database file.
+
+    The first call for a path runs the schema migrations; later calls only
+    do a dictionary lookup.
+    """
+    path = path or DB_PATH
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = open_pool(path)
+                _pools[path] = pool
+    return pool
+
+
+def shard_path(index, path=None):
+    """File of shard index next to a directory database: link_manager.db -> link_manager.shard3.db"""
+    root, ext = os.path.splitext(path or DB_PATH)
+    return f"{root}.shard{index}{ext or '.db'}"
+
+
+def jump_hash(key, buckets):
+    """Jump consistent hash (Lamping & Veach): a bucket in range(buckets) for a 64-bit key.
+
+    Going from n to n + 1 buckets moves only 1/(n + 1) of the keys, all of
+    them into the new bucket.
+    """
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def user_shard(user_id, shard_count):
+    """Stable shard number of a user for a layout with shard_count shards"""
+    key = int.from_bytes(hashlib.blake2b(str(user_id).encode(), digest_size=8).digest(), 'big')
+    return jump_hash(key, shard_count)
+
+
+_shard_counts = {}
+
+
+def shard_count(path=None):
+    """Number of shards of a directory database (0: not sharded), read once per process"""
+    path = path or DB_PATH
+    count = _shard_counts.get(path)
+    if count is None:
+        count = _shard_counts[path] = get_pool(path).fetchone(queries.SHARD_COUNT)[0]
+    return count
+
+
+def set_shard_count(count, path=None):
+    """Record a new shard layout; only sharding.py should call this, while the app is stopped"""
+    get_pool(path).execute(queries.SET_SHARD_COUNT, (count,))
+    _shard_counts[path or DB_PATH] = count
+
+
+def user_db_path(user_id, path=None, count=None):
+    """File holding a user's links, tags and stats under the current (or a given) layout"""
+    count = shard_count(path) if count is None else count
+    return shard_path(user_shard(user_id, count), path) if count else (path or DB_PATH)
+
+
+def user_pool(user_id):
+    """Return the pool for a user's data; USER rows and API tokens stay in get_pool()"""
+    if not shard_count():
+        return get_pool()
+    return get_pool(user_db_path(user_id))
+
+
+def data_pools():
+    """Pools of every file holding link data, for jobs that work across users"""
+    count = shard_count()
+    if not count:
+        return [get_pool()]
+    return [get_pool(shard_path(index)) for index in range(count)]
+
+
+def set_trace_callback(callback):
+    """Trace every statement on current and future pooled connections (None turns tracing off)"""
+    global trace_callback
+    trace_callback = callback
+    for pool in list(_pools.values()):
+        pool.set_trace_callback(callback)
+
+
+def connection_stats():
+    """Return usage counters for every pool in the process"""
+    return [pool.stats() for pool in list(_pools.values())]
+
+
+def close_all():
+    """Close all pooled connections (used on shutdown and in scripts)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
+        _pools.clear()
+        _shard_counts.clear()
@@ -0,0 +1,92 @@
+import argparse
+import json
+
+import cache
+import database
+import queries
+import urls
+
+BATCH_SIZE = 500
+
+
+def merge_into(conn, survivor_id, duplicate_id):
+    """Fold a duplicate into the surviving link and delete it.
+
+    The survivor keeps its own name and URL; an empty description is filled
+    from the duplicate, the earliest creation date is kept, the clicks of
+    both are added up and the duplicate's tags and collections are added to
+    the survivor's.
+    """
+    conn.execute(queries.MERGE_DUPLICATE, (duplicate_id, survivor_id))
+    conn.execute(queries.MERGE_TAGS, (duplicate_id, survivor_id))
+    conn.execute(queries.MERGE_DAILY_CLICKS, (duplicate_id, survivor_id))
+    conn.execute(queries.MERGE_TOTAL_CLICKS, (duplicate_id, survivor_id))
+    conn.execute(queries.DELETE_MERGED, (duplicate_id,))
+
+
+def dedupe_links(batch_size=BATCH_SIZE, dry_run=False):
+    """Merge links whose canonical URL another link of the same user already has.
+
+    Only rows without a url_hash are examined: the migration leaves NULL on
+    every duplicate it finds, and rows written by older clients have none.
+    Rows are processed in id order, one transaction per batch. A row whose
+    hash is still free simply gets it. Returns a report of merged rows:
+    [{'user_id', 'url', 'kept', 'merged': [ids]}].
+    """
+    merges = {}
+    touched_users = set()
+    # In a dry run hashes are not written, so remember which ones would have been claimed
+    claimed = {}
+    for pool in database.data_pools():
+        last_id = 0
+        while True:
+            with pool.transaction() as conn:
+                rows = conn.execute(queries.UNHASHED_LINKS, (last_id, batch_size)).fetchall()
+                if not rows:
+                    break
+                for link_id, user_id, link in rows:
+                    link_hash = urls.url_hash(link)
+                    existing = conn.execute(queries.FIND_DUPLICATE, (user_id, link_hash)).fetchone()
+                    if existing is None and (user_id, link_hash) in claimed:
+                        existing = (claimed[(user_id, link_hash)],)
+                    if existing is None:
+                        if dry_run:
+                            claimed[(user_id, link_hash)] = link_id
+                        else:
+                            conn.execute(queries.SET_URL_HASH, (link_hash, link_id))
+                        continue
+                    # Link ids are only unique within one database file, user ids across all of them
+                    report = merges.setdefault((user_id, existing[0]), {
+                        'user_id': user_id,
+                        'url': urls.canonical_url(link) or link,
+                        'kept': existing[0],
+                        'merged': []
+                    })
+                    report['merged'].append(link_id)
+                    touched_users.add(user_id)
+                    if not dry_run:
+                        merge_into(conn, existing[0], link_id)
+                last_id = rows[-1][0]
+    for user_id in touched_users:
+        cache.query_cache.bump(user_id)
+    return list(merges.values())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge duplicate links (same canonical URL) per user")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--dry-run', action='store_true', help="report what would be merged without changing anything")
+    parser.add_argument('--db', help="database file (default: LINK_MANAGER_DB or link_manager.db)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.configure(args.db)
+    report = dedupe_links(args.batch_size, args.dry_run)
+    for entry in report:
+        print(json.dumps(entry))
+    merged = sum(len(entry['merged']) for entry in report)
+    print(f"{'Would merge' if args.dry_run else 'Merged'} {merged} duplicate links into {len(report)} links")
+
+
+if __name__ == '__main__':
+    main()
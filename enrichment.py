@@ -0,0 +1,344 @@
+import argparse
+import http.client
+import ipaddress
+import os
+import socket
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+import cache
+import database
+import queries
+import urls
+
+# Set LINK_MANAGER_ENRICHMENT=0 to stop the app from starting the worker (enrichment.py still drains the queue)
+WORKER_ENABLED = os.environ.get('LINK_MANAGER_ENRICHMENT', '1') != '0'
+WORKERS = 8
+BATCH_SIZE = 50
+POLL_INTERVAL = 2.0
+TIMEOUT = 10
+MAX_BYTES = 256 * 1024
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 60
+# Fetched metadata is reused for the same canonical URL (any user) until it expires
+CACHE_TTL = '+7 days'
+ERROR_CACHE_TTL = '+1 day'
+# Jobs left 'running' this long (e.g. the process died) are handed out again
+STALE_AFTER = '-10 minutes'
+MAX_TEXT = 500
+USER_AGENT = "LinkManager-Enrichment/1.0"
+FETCH_SCHEMES = ('http', 'https')
+# Users can save any URL, so by default only hosts with public addresses are fetched
+ALLOW_PRIVATE_ADDRESSES = False
+
+
+class MetadataParser(HTMLParser):
+    """Collect title, description, canonical URL and favicon from a page's <head>"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta = {}
+        self._in_title = False
+        self._title = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {name: value or '' for name, value in attrs}
+        if tag == 'title':
+            self._in_title = True
+        elif tag == 'meta':
+            key = (attrs.get('name') or attrs.get('property') or '').lower()
+            if key in ('description', 'og:description', 'og:title', 'og:url') and attrs.get('content'):
+                self.meta.setdefault(key, attrs['content'])
+        elif tag == 'link':
+            rel = attrs.get('rel', '').lower().split()
+            if 'canonical' in rel and attrs.get('href'):
+                self.meta.setdefault('canonical', attrs['href'])
+            elif 'icon' in rel and attrs.get('href'):
+                self.meta.setdefault('icon', attrs['href'])
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._title.append(data)
+
+    @property
+    def title(self):
+        return ' '.join(''.join(self._title).split())
+
+
+def clip(text):
+    text = ' '.join((text or '').split())
+    return text[:MAX_TEXT] or None
+
+
+def check_fetchable(url):
+    """Raise ValueError unless url is http(s) and its host resolves only to public addresses.
+
+    Keeps the worker from being pointed at the server's own network
+    (loopback, private, link-local, reserved and multicast ranges).
+    """
+    parts = urlsplit(url)
+    if parts.scheme.lower() not in FETCH_SCHEMES or not parts.hostname:
+        raise ValueError(f"Not an http(s) URL: {url}")
+    if ALLOW_PRIVATE_ADDRESSES:
+        return
+    try:
+        port = parts.port
+        addresses = {info[4][0] for info in socket.getaddrinfo(parts.hostname, port or 80, proto=socket.IPPROTO_TCP)}
+    except socket.gaierror as e:
+        raise OSError(f"Can't resolve {parts.hostname}: {e}") from e
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%', 1)[0])
+        if getattr(ip, 'ipv4_mapped', None):
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"Refusing to fetch {parts.hostname}: {ip} is not a public address")
+
+
+class CheckedRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Apply check_fetchable() to every redirect target, not just the saved URL"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_fetchable(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+opener = urllib.request.build_opener(CheckedRedirectHandler)
+
+
+def fetch_metadata(url, timeout=TIMEOUT):
+    """Fetch a page and return (status, title, description, canonical_link, favicon).
+
+    Only the first MAX_BYTES of HTML pages are read. HTTP errors are results
+    (status >= 400, no metadata); network errors raise OSError, and URLs
+    check_fetchable() refuses raise ValueError.
+    """
+    check_fetchable(url)
+    request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT, 'Accept': 'text/html,*/*;q=0.5'})
+    try:
+        response = opener.open(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        e.close()
+        return e.code, None, None, None, None
+    with response:
+        final_url = response.geturl()
+        favicon = urljoin(final_url, '/favicon.ico')
+        if response.headers.get_content_type() not in ('text/html', 'application/xhtml+xml'):
+            return response.status, None, None, final_url, favicon
+        body = response.read(MAX_BYTES)
+        charset = response.headers.get_content_charset() or 'utf-8'
+    parser = MetadataParser()
+    try:
+        parser.feed(body.decode(charset, errors='replace'))
+    except LookupError:
+        parser.feed(body.decode('utf-8', errors='replace'))
+    meta = parser.meta
+    canonical = meta.get('canonical') or meta.get('og:url')
+    return (
+        response.status,
+        clip(parser.title or meta.get('og:title')),
+        clip(meta.get('description') or meta.get('og:description')),
+        urljoin(final_url, canonical) if canonical else final_url,
+        urljoin(final_url, meta['icon']) if 'icon' in meta else favicon
+    )
+
+
+class EnrichmentWorker:
+    """Drain the fetch_job queue in the background.
+
+    One dispatcher thread claims batches of jobs, fetches each distinct
+    canonical URL once (from fetch_cache when fresh, otherwise on a thread
+    pool) and writes all results of a batch in one transaction, so the
+    Streamlit request threads never wait on the network.
+    """
+
+    def __init__(self, workers=WORKERS, batch_size=BATCH_SIZE, poll_interval=POLL_INTERVAL, timeout=TIMEOUT):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='enrichment')
+        self.stats = {'links': 0, 'fetches': 0, 'cache_hits': 0, 'failures': 0, 'batches': 0}
+        self.started = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run_forever, name='enrichment-dispatcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.executor.shutdown(wait=False)
+
+    def run_forever(self):
+        for pool in database.data_pools():
+            pool.execute(queries.REQUEUE_STALE_FETCH_JOBS, (STALE_AFTER,))
+            pool.execute(queries.PURGE_FETCH_CACHE)
+        while not self._stop.is_set():
+            try:
+                handled = self.run_batch()
+            except Exception as e:
+                print(f"Enrichment batch failed, will retry: {e!r}", file=sys.stderr)
+                handled = 0
+            if not handled:
+                self._stop.wait(self.poll_interval)
+
+    def run_until_empty(self):
+        """Process jobs until none is ready; returns the number of links handled"""
+        total = 0
+        while True:
+            handled = self.run_batch()
+            if not handled:
+                return total
+            total += handled
+
+    def claim(self, pool):
+        with pool.transaction() as conn:
+            jobs = conn.execute(queries.CLAIM_FETCH_JOBS, (self.batch_size,)).fetchall()
+            conn.executemany(queries.START_FETCH_JOB, ((job[0],) for job in jobs))
+        return jobs
+
+    def run_batch(self):
+        """Claim, fetch and save one batch of jobs from every database file; returns the number of jobs claimed"""
+        return sum(self.run_pool_batch(pool) for pool in database.data_pools())
+
+    def run_pool_batch(self, pool):
+        jobs = self.claim(pool)
+        if not jobs:
+            return 0
+        try:
+            return self.process(pool, jobs)
+        except Exception:
+            # Hand the claimed jobs back (or fail them after MAX_ATTEMPTS) instead of leaving them 'running'
+            with pool.transaction() as conn:
+                conn.executemany(queries.RETRY_FETCH_JOB, ((MAX_ATTEMPTS, RETRY_DELAY, job[0]) for job in jobs))
+            self.stats['failures'] += len(jobs)
+            raise
+
+    def process(self, pool, jobs):
+        # canonical URL hash -> (url to fetch, [link ids])
+        groups = {}
+        for link_id, user_id, link, link_hash in jobs:
+            link_hash = link_hash if link_hash is not None else urls.url_hash(link)
+            groups.setdefault(link_hash, (link, []))[1].append(link_id)
+
+        results = {}
+        for link_hash in groups:
+            cached = pool.fetchone(queries.CACHED_FETCH, (link_hash,))
+            if cached is not None:
+                results[link_hash] = cached
+        fetched = {}
+        failed = []
+        futures = {
+            self.executor.submit(fetch_metadata, link, self.timeout): link_hash
+            for link_hash, (link, _) in groups.items() if link_hash not in results
+        }
+        for future in as_completed(futures):
+            link_hash = futures[future]
+            try:
+                result = future.result()
+            except (OSError, ValueError, http.client.HTTPException):
+                result = None
+            if result is None or result[0] is None:
+                failed.extend(groups[link_hash][1])
+            else:
+                fetched[link_hash] = result
+
+        with pool.transaction() as conn:
+            conn.executemany(queries.SAVE_FETCH, (
+                (link_hash, *result, ERROR_CACHE_TTL if result[0] >= 400 else CACHE_TTL)
+                for link_hash, result in fetched.items()
+            ))
+            results.update(fetched)
+            done = [
+                (title, description, canonical, favicon, link_id)
+                for link_hash, (status, title, description, canonical, favicon) in results.items()
+                for link_id in groups[link_hash][1]
+            ]
+            conn.executemany(queries.SAVE_METADATA, done)
+            conn.executemany(queries.FINISH_FETCH_JOB, ((row[-1],) for row in done))
+            conn.executemany(queries.RETRY_FETCH_JOB, ((MAX_ATTEMPTS, RETRY_DELAY, link_id) for link_id in failed))
+
+        for user_id in {job[1] for job in jobs}:
+            cache.query_cache.bump(user_id)
+        self.stats['batches'] += 1
+        self.stats['links'] += len(done)
+        self.stats['fetches'] += len(futures)
+        self.stats['cache_hits'] += len(groups) - len(futures)
+        self.stats['failures'] += len(failed)
+        return len(jobs)
+
+    def snapshot(self):
+        """Counters, throughput and current queue depth by job state"""
+        elapsed = time.monotonic() - self.started
+        return {
+            **self.stats,
+            'links_per_second': self.stats['links'] / elapsed if elapsed else 0.0,
+            'queue': queue_depth(),
+            'running': self._thread is not None and self._thread.is_alive()
+        }
+
+
+def queue_depth():
+    """Number of fetch jobs per state, e.g. {'pending': 12, 'failed': 1}"""
+    depth = {}
+    for pool in database.data_pools():
+        for state, count in pool.fetchall(queries.FETCH_QUEUE_DEPTH):
+            depth[state] = depth.get(state, 0) + count
+    return depth
+
+
+def enqueue_unenriched():
+    """Queue every link that has never been enriched (links saved before the worker existed)"""
+    queued = 0
+    for pool in database.data_pools():
+        with pool.transaction() as conn:
+            queued += conn.execute(queries.ENQUEUE_UNENRICHED).rowcount
+    return queued
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch page titles, descriptions and favicons for queued links")
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--timeout', type=float, default=TIMEOUT)
+    parser.add_argument('--backfill', action='store_true', help="also queue links saved before enrichment existed")
+    parser.add_argument('--forever', action='store_true', help="keep polling for new jobs instead of exiting when the queue is empty")
+    parser.add_argument('--db', help="database file (default: LINK_MANAGER_DB or link_manager.db)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.configure(args.db)
+    if args.backfill:
+        print(f"Queued {enqueue_unenriched()} links", file=sys.stderr)
+    worker = EnrichmentWorker(args.workers, args.batch_size, timeout=args.timeout)
+    if args.forever:
+        worker.start()
+        try:
+            while True:
+                time.sleep(10)
+                print(worker.snapshot(), file=sys.stderr)
+        except KeyboardInterrupt:
+            worker.stop()
+        return
+    worker.run_until_empty()
+    worker.executor.shutdown()
+    stats = worker.snapshot()
+    print(f"Enriched {stats['links']} links ({stats['fetches']} fetches, {stats['cache_hits']} cache hits, "
+          f"{stats['failures']} failures) at {stats['links_per_second']:.1f} links/s; queue: {stats['queue']}")
+
+
+if __name__ == '__main__':
+    main()
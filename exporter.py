@@ -0,0 +1,136 @@
+import argparse
+import csv
+import gzip
+import html
+import io
+import json
+import sys
+from datetime import datetime, timezone
+
+import database
+import importer
+import queries
+
+FETCH_SIZE = 1000
+FORMATS = ('csv', 'jsonl', 'html')
+EXTENSIONS = {'csv': 'csv', 'jsonl': 'jsonl', 'html': 'html'}
+MIME_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson', 'html': 'text/html'}
+COLUMNS = ('id', 'name', 'url', 'description', 'created_at')
+
+
+def iter_user_links(user_id, fetch_size=FETCH_SIZE):
+    """Yield all of a user's links (oldest first) without loading them all at once"""
+    pool = database.user_pool(user_id)
+    with pool.checkout() as conn:
+        cur = conn.execute(queries.EXPORT_LINKS, (user_id,))
+        while True:
+            rows = cur.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield from rows
+
+
+def write_csv(rows, fp):
+    writer = csv.writer(fp)
+    writer.writerow(COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_jsonl(rows, fp):
+    count = 0
+    for row in rows:
+        fp.write(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False))
+        fp.write('\n')
+        count += 1
+    return count
+
+
+def epoch(created_at):
+    """Convert a stored UTC timestamp to the epoch seconds used by ADD_DATE"""
+    try:
+        return int(datetime.fromisoformat(created_at).replace(tzinfo=timezone.utc).timestamp())
+    except (ValueError, TypeError):
+        return None
+
+
+def write_html(rows, fp):
+    """Write a Netscape bookmark file that browsers and importer.py can read"""
+    fp.write(
+        '<!DOCTYPE NETSCAPE-Bookmark-file-1>\n'
+        '<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">\n'
+        '<TITLE>Bookmarks</TITLE>\n<H1>Bookmarks</H1>\n<DL><p>\n'
+    )
+    count = 0
+    for link_id, name, url, description, created_at in rows:
+        added = epoch(created_at)
+        add_date = f' ADD_DATE="{added}"' if added is not None else ''
+        fp.write(f'    <DT><A HREF="{html.escape(url)}"{add_date}>{html.escape(name)}</A>\n')
+        if description:
+            fp.write(f'    <DD>{html.escape(description)}\n')
+        count += 1
+    fp.write('</DL><p>\n')
+    return count
+
+
+WRITERS = {
+    'csv': write_csv,
+    'jsonl': write_jsonl,
+    'html': write_html
+}
+
+
+def export_links(user_id, binary_fp, fmt, compress=False, fetch_size=FETCH_SIZE):
+    """Stream a user's links to a binary file object, optionally gzip-compressed.
+
+    Returns the number of links written.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    target = gzip.GzipFile(fileobj=binary_fp, mode='wb') if compress else binary_fp
+    text_fp = io.TextIOWrapper(target, encoding='utf-8', newline='', write_through=False)
+    try:
+        count = WRITERS[fmt](iter_user_links(user_id, fetch_size), text_fp)
+        text_fp.flush()
+    finally:
+        # Leave the caller's file object open
+        text_fp.detach()
+        if compress:
+            target.close()
+    return count
+
+
+def export_filename(fmt, compress=False):
+    """Default download name for an export"""
+    name = f"links.{EXTENSIONS[fmt]}"
+    return name + '.gz' if compress else name
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a Link Manager user's links")
+    parser.add_argument('--email', required=True, help="email of the user to export")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--gzip', action='store_true', help="gzip-compress the output")
+    parser.add_argument('-o', '--output', help="output file (default: stdout)")
+    parser.add_argument('--db', help="database file (default: LINK_MANAGER_DB or link_manager.db)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.configure(args.db)
+    user_id = importer.find_user_id(args.email)
+    if user_id is None:
+        parser.error(f"No user with email {args.email}")
+    if args.output:
+        with open(args.output, 'wb') as fp:
+            count = export_links(user_id, fp, args.format, args.gzip)
+    else:
+        count = export_links(user_id, sys.stdout.buffer, args.format, args.gzip)
+        sys.stdout.buffer.flush()
+    print(f"Exported {count} links", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
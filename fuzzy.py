@@ -0,0 +1,210 @@
+import argparse
+import functools
+import os
+import re
+import threading
+import unicodedata
+
+import database
+import queries
+import schema
+
+# Most dictionary words a single query word expands to
+MAX_EXPANSIONS = 5
+# How many trigram-index hits per query word are re-ranked by similarity
+CANDIDATES = 50
+# Pending links whose words a search adds to the dictionary before running
+REFRESH_LIMIT = 2000
+
+# Same word boundaries as link_fts's unicode61 tokenizer: letters and digits
+WORD = re.compile(r'[^\W_]+')
+
+_refresh_lock = threading.Lock()
+
+
+def available():
+    """True if the database has the trigram-indexed term dictionary"""
+    return database.get_pool().capabilities['fuzzy']
+
+
+def fold(text):
+    """Lowercase and strip diacritics like unicode61 with remove_diacritics 2"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def words(text):
+    """The words link_fts indexes for a piece of text"""
+    return WORD.findall(fold(text or ''))
+
+
+def is_term(word):
+    """Same rule as schema.FUZZY_TERM_FILTER: 3-40 characters and not just digits"""
+    return 3 <= len(word) <= 40 and not word.isdigit()
+
+
+def trigrams(word):
+    """Padded trigrams of a word, as pg_trgm builds them"""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    """Share of distinct trigrams two words have in common, from 0 to 1"""
+    a, b = trigrams(a), trigrams(b)
+    return len(a & b) / len(a | b)
+
+
+def edit_distance(a, b):
+    """Insertions, deletions, substitutions and adjacent swaps turning a into b"""
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(
+                previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1])
+            )
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[len(b)]
+
+
+def max_edits(word):
+    """Typos tolerated in a word: one up to 5 characters, two beyond"""
+    return 1 if len(word) <= 5 else 2
+
+
+def refresh_terms(limit=REFRESH_LIMIT, pool=None):
+    """Add the words of new and edited links to their owners' dictionaries.
+
+    Processes up to limit queued links (all of them with limit=None) of
+    pool, or of every data file when pool is None, and returns how many
+    were processed.
+    """
+    if pool is None:
+        return sum(refresh_terms(limit, pool) for pool in database.data_pools())
+    if not pool.capabilities['fuzzy'] or pool.fetchone(queries.HAS_PENDING_FUZZY_LINKS) is None:
+        return 0
+    processed = 0
+    with _refresh_lock:
+        while limit is None or processed < limit:
+            batch = REFRESH_LIMIT if limit is None else min(REFRESH_LIMIT, limit - processed)
+            with pool.transaction() as conn:
+                rows = conn.execute(queries.PENDING_FUZZY_LINKS, (batch,)).fetchall()
+                terms = set()
+                for link_id, user_id, name, description, link in rows:
+                    if user_id is None:  # deleted since it was queued
+                        continue
+                    terms.update(
+                        (user_id, word) for text in (name, description, link) for word in words(text) if is_term(word)
+                    )
+                added = conn.executemany(queries.ADD_FUZZY_TERM, sorted(terms)).rowcount
+                conn.executemany(queries.CLEAR_PENDING_FUZZY_LINK, [(row[0],) for row in rows])
+            if added > 0:
+                similar_terms.cache_clear()
+            processed += len(rows)
+            if len(rows) < batch:
+                break
+    return processed
+
+
+def rebuild_terms():
+    """Rebuild the dictionaries from the terms link_fts indexed (faster than refreshing a large backlog)"""
+    for pool in database.data_pools():
+        with pool.transaction() as conn:
+            conn.execute("DELETE FROM fuzzy_term")
+            conn.execute("INSERT INTO fuzzy_term_trigram (fuzzy_term_trigram) VALUES ('delete-all')")
+            schema.rebuild_fuzzy_terms(conn)
+    similar_terms.cache_clear()
+
+
+@functools.lru_cache(maxsize=4096)
+def similar_terms(word, user_id, path=None):
+    """The words of a user's dictionary closest to word, as (term, similarity), most similar first.
+
+    The trigram index proposes the CANDIDATES words of the user sharing the
+    most trigrams with word; only those are scored, so the cost depends on
+    the query word rather than on the number of links. Of the candidates
+    within max_edits(word), the ones at the smallest edit distance are
+    returned, ordered by trigram similarity. path is the database file
+    holding the user's links (default: the main one).
+    """
+    # The index holds ' word ': every padded trigram except the one for the first letter alone
+    grams = sorted(gram for gram in trigrams(word) if not gram.startswith('  '))
+    match = (f"user_id : {queries.fts_quote(f' {user_id} ')} AND "
+             f"term : ({' OR '.join(queries.fts_quote(gram) for gram in grams)})")
+    rows = database.get_pool(path).fetchall(queries.FUZZY_CANDIDATES, (match, CANDIDATES))
+    limit = max_edits(word)
+    scored = []
+    for term, in rows:
+        distance = edit_distance(word, term) if abs(len(term) - len(word)) <= limit else limit + 1
+        if distance <= limit:
+            scored.append((distance, -similarity(word, term), term))
+    scored.sort()
+    return tuple((term, -score) for distance, score, term in scored[:MAX_EXPANSIONS] if distance == scored[0][0])
+
+
+def fuzzy_query(user_id, text):
+    """Build a typo-tolerant FTS5 MATCH expression scoped to one user.
+
+    Each word matches itself as a prefix or any of its closest dictionary
+    words, so everything the exact search finds is still found; quoted
+    phrases and words too short to correct match exactly. Returns
+    (match, corrections) where corrections maps query words to the best
+    dictionary word used for them; match is None if nothing is searchable.
+    """
+    pool = database.user_pool(user_id)
+    refresh_terms(pool=pool)
+    parts, corrections = [], {}
+    for phrase, term in queries.PHRASE_OR_TERM.findall(text):
+        if phrase.strip():
+            parts.append(queries.fts_quote(phrase.strip()))
+            continue
+        for word in words(term):
+            if not is_term(word):
+                parts.append(queries.fts_quote(word) + '*')
+                continue
+            similar = similar_terms(word, user_id, pool.path)
+            if similar and similar[0][0] != word:
+                corrections[word] = similar[0][0]
+            options = [queries.fts_quote(word) + '*'] + [queries.fts_quote(t) for t, _ in similar if t != word]
+            parts.append(f"({' OR '.join(options)})")
+    if not parts:
+        return None, corrections
+    match = f'user_id : {queries.fts_quote(str(user_id))} AND {{name description link}} : ({" AND ".join(parts)})'
+    return match, corrections
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the term dictionary behind typo-tolerant search")
+    parser.add_argument('command', choices=['refresh', 'rebuild', 'similar'])
+    parser.add_argument('words', nargs='*', help="words to look up (similar)")
+    parser.add_argument('--user', default=os.environ.get('LINK_MANAGER_USER'),
+                        help="email of the user whose words are looked up (similar; default: LINK_MANAGER_USER)")
+    parser.add_argument('--db', help="database file (default: LINK_MANAGER_DB or link_manager.db)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.configure(args.db)
+    if not available():
+        raise SystemExit("Typo-tolerant search needs SQLite with FTS5 and the trigram tokenizer (3.34+)")
+    if args.command == 'refresh':
+        print(f"Added the words of {refresh_terms(limit=None)} links")
+    elif args.command == 'rebuild':
+        rebuild_terms()
+        print("Rebuilt the term dictionary")
+    else:
+        if not args.user:
+            parser.error("similar needs --user or LINK_MANAGER_USER")
+        row = database.get_pool().fetchone(queries.USER_BY_EMAIL, (args.user,))
+        if row is None:
+            parser.error(f"No user with email {args.user}")
+        pool = database.user_pool(row[0])
+        refresh_terms(limit=None, pool=pool)
+        for word in args.words:
+            matches = ', '.join(f"{term} ({score:.2f})" for term, score in similar_terms(fold(word), row[0], pool.path))
+            print(f"{word}: {matches or 'no similar words'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+import argparse
+import asyncio
+import ssl
+import sys
+import time
+from collections import deque
+from urllib.parse import quote, urljoin, urlsplit
+
+import cache
+import database
+import importer
+import queries
+
+CONCURRENCY = 50
+PER_HOST = 2
+POLITENESS_DELAY = 1.0
+TIMEOUT = 10.0
+BATCH_SIZE = 200
+MAX_REDIRECTS = 5
+# Links read ahead of the checks, per unit of concurrency
+READ_AHEAD = 20
+USER_AGENT = "LinkManager-HealthCheck/1.0"
+# Links with other schemes (e.g. ftp://) are skipped and stay unchecked
+CHECK_SCHEMES = ('http', 'https')
+# Characters kept as they are when a path and query are percent-encoded for the request line
+URL_SAFE = "/?:@!$&'()*+,;=%"
+
+# Status stored for links that could not be reached at all
+NETWORK_ERROR = 0
+
+# Manage-page filters, as SQL conditions on LINK.health_status
+HEALTH_FILTERS = {
+    'healthy': "health_status BETWEEN 200 AND 399",
+    'broken': "(health_status >= 400 OR health_status = 0)",
+    'unchecked': "health_status IS NULL"
+}
+
+
+def health_label(status):
+    """Short text for a stored health status"""
+    if status is None:
+        return "—"
+    if status == NETWORK_ERROR:
+        return "❌ unreachable"
+    if status < 400:
+        return f"✅ {status}"
+    return f"❌ {status}"
+
+
+class HostQueue:
+    """Links waiting for one host, with the host's in-flight requests and politeness schedule"""
+
+    def __init__(self, next_start=0.0):
+        self.links = deque()
+        self.running = set()
+        self.next_start = next_start
+
+
+async def http_request(method, url, headers, timeout):
+    """Send one HTTP/1.1 request and return (status, response headers).
+
+    Only the status line and headers are read; the body is never downloaded.
+    Non-ASCII host names are IDNA-encoded and other non-ASCII characters
+    percent-encoded as UTF-8, as browsers do.
+    """
+    parts = urlsplit(url)
+    https = parts.scheme == 'https'
+    port = parts.port or (443 if https else 80)
+    hostname = (parts.hostname or '').encode('idna').decode('ascii')
+    host = f"[{hostname}]" if ':' in hostname else hostname
+    if parts.port:
+        host += f":{parts.port}"
+    path = quote(parts.path or '/', safe=URL_SAFE)
+    if parts.query:
+        path += '?' + quote(parts.query, safe=URL_SAFE)
+    context = ssl.create_default_context() if https else None
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(hostname, port, ssl=context, server_hostname=hostname if https else None),
+        timeout
+    )
+    try:
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {host}",
+                 f"User-Agent: {USER_AGENT}", "Accept: */*", "Connection: close"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+        await writer.drain()
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+    status_line, *header_lines = head.decode('latin-1').split("\r\n")
+    status = int(status_line.split()[1])
+    response_headers = {}
+    for line in header_lines:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            response_headers[name.strip().lower()] = value.strip()
+    return status, response_headers
+
+
+async def check_url(url, etag=None, last_modified=None, timeout=TIMEOUT):
+    """Check one URL: HEAD first, GET if HEAD is refused, following redirects.
+
+    Returns (status, response headers).
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    for _ in range(MAX_REDIRECTS + 1):
+        status, response = await http_request('HEAD', url, headers, timeout)
+        if status in (403, 405, 501):
+            status, response = await http_request('GET', url, headers, timeout)
+        if status in (301, 302, 303, 307, 308) and 'location' in response:
+            url = urljoin(url, response['location'])
+            continue
+        return status, response
+    return status, response
+
+
+class HealthChecker:
+    """Check many links concurrently and write the results back in batches.
+
+    Links wait in per-host queues. Each host with queued links has a small
+    task that starts its requests, at most per_host at a time and delay
+    seconds apart, whenever one of the concurrency request slots is free.
+    A slow or rate-limited host therefore only delays its own links. When
+    a host's queue empties, its next allowed start is kept, so links for it
+    read later still wait out the delay.
+    """
+
+    def __init__(self, concurrency=CONCURRENCY, per_host=PER_HOST, delay=POLITENESS_DELAY,
+                 timeout=TIMEOUT, batch_size=BATCH_SIZE, progress=None):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.delay = delay
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.progress = progress
+        self.stats = {'checked': 0, 'healthy': 0, 'broken': 0, 'not_modified': 0, 'skipped': 0, 'seconds': 0.0}
+        self._results = []
+        self._users = set()
+        self._hosts = {}
+        self._next_start = {}
+
+    async def check(self, link):
+        link_id, user_id, url, previous_status, etag, last_modified = link
+        started = time.perf_counter()
+        try:
+            status, response = await check_url(url, etag, last_modified, self.timeout)
+        except (OSError, asyncio.TimeoutError, ValueError, IndexError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError):
+            status, response = NETWORK_ERROR, {}
+        latency_ms = int((time.perf_counter() - started) * 1000)
+        if status == 304:
+            # Unchanged since the last check: keep the previous result and validators
+            self.stats['not_modified'] += 1
+            status = previous_status if previous_status is not None else 200
+            response = {'etag': etag, 'last-modified': last_modified}
+        self.stats['checked'] += 1
+        self.stats['healthy' if 200 <= status < 400 else 'broken'] += 1
+        self._users.add(user_id)
+        self._results.append((user_id, (status, latency_ms, response.get('etag'), response.get('last-modified'), link_id)))
+        if len(self._results) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        """Write pending results to LINK in one transaction off the event loop"""
+        results, self._results = self._results, []
+        if results:
+            await asyncio.get_running_loop().run_in_executor(None, write_results, results)
+        if self.progress:
+            self.progress(self.stats)
+
+    async def drain_host(self, host, queue, slots, room):
+        """Start the checks queued for one host as its limits allow; ends once the queue is empty"""
+        while queue.links or queue.running:
+            if not queue.links or len(queue.running) >= self.per_host:
+                done, queue.running = await asyncio.wait(queue.running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+                continue
+            wait = queue.next_start - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            await slots.acquire()
+            link = queue.links.popleft()
+            room.release()
+            queue.next_start = time.monotonic() + self.delay
+            task = asyncio.create_task(self.check(link))
+            task.add_done_callback(lambda _: slots.release())
+            queue.running.add(task)
+        # Nothing can be appended between the loop test and here (no await), so no link is left behind
+        del self._hosts[host]
+        if queue.next_start > time.monotonic():
+            self._next_start[host] = queue.next_start
+
+    async def run(self, links):
+        """Check every link from an iterable of health-check rows"""
+        started = time.perf_counter()
+        slots = asyncio.Semaphore(self.concurrency)
+        room = asyncio.Semaphore(self.concurrency * READ_AHEAD)
+        tasks = []
+        for link in links:
+            parts = urlsplit(link[2])
+            if parts.scheme.lower() not in CHECK_SCHEMES:
+                self.stats['skipped'] += 1
+                continue
+            await room.acquire()
+            host = parts.hostname or ''
+            queue = self._hosts.get(host)
+            if queue is None:
+                queue = self._hosts[host] = HostQueue(self._next_start.pop(host, 0.0))
+                tasks.append(asyncio.create_task(self.drain_host(host, queue, slots, room)))
+            queue.links.append(link)
+        await asyncio.gather(*tasks)
+        await self.flush()
+        for user_id in self._users:
+            cache.query_cache.bump(user_id)
+        self.stats['seconds'] = time.perf_counter() - started
+        return self.stats
+
+
+def write_results(results):
+    """Save (user_id, SAVE_HEALTH params) results, one transaction per database file"""
+    groups = {}
+    for user_id, params in results:
+        groups.setdefault(database.user_pool(user_id), []).append(params)
+    for pool, rows in groups.items():
+        with pool.transaction() as conn:
+            conn.executemany(queries.SAVE_HEALTH, rows)
+
+
+def iter_links_to_check(user_id=None, stale_hours=None, batch_size=1000):
+    """Yield (id, user_id, link, health_status, etag, last_modified) in keyset batches"""
+    checked_before = f"-{stale_hours} hours" if stale_hours is not None else "+100 years"
+    for pool in database.data_pools() if user_id is None else [database.user_pool(user_id)]:
+        last_id = 0
+        while True:
+            if user_id is None:
+                rows = pool.fetchall(queries.LINKS_TO_CHECK, (last_id, checked_before, batch_size))
+            else:
+                rows = pool.fetchall(queries.USER_LINKS_TO_CHECK, (user_id, last_id, checked_before, batch_size))
+            if not rows:
+                break
+            yield from rows
+            last_id = rows[-1][0]
+
+
+def run_health_check(user_id=None, stale_hours=None, **options):
+    """Check all links (or one user's), skipping ones checked within stale_hours"""
+    checker = HealthChecker(**options)
+    return asyncio.run(checker.run(iter_links_to_check(user_id, stale_hours)))
+
+
+def print_progress(stats):
+    print(
+        f"\r{stats['checked']} checked, {stats['healthy']} healthy, {stats['broken']} broken, "
+        f"{stats['not_modified']} not modified",
+        end='', file=sys.stderr, flush=True
+    )
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {value}")
+    return number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check stored links and record their HTTP status")
+    parser.add_argument('--email', help="only check this user's links")
+    parser.add_argument('--stale-hours', type=float, help="skip links checked within this many hours")
+    parser.add_argument('--concurrency', type=positive_int, default=CONCURRENCY)
+    parser.add_argument('--per-host', type=positive_int, default=PER_HOST)
+    parser.add_argument('--delay', type=float, default=POLITENESS_DELAY, help="seconds between requests to one host")
+    parser.add_argument('--timeout', type=float, default=TIMEOUT)
+    parser.add_argument('--db', help="database file (default: LINK_MANAGER_DB or link_manager.db)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.configure(args.db)
+    user_id = None
+    if args.email:
+        user_id = importer.find_user_id(args.email)
+        if user_id is None:
+            parser.error(f"No user with email {args.email}")
+    stats = run_health_check(
+        user_id, args.stale_hours, concurrency=args.concurrency, per_host=args.per_host,
+        delay=args.delay, timeout=args.timeout, progress=print_progress
+    )
+    print(file=sys.stderr)
+    print(f"Checked {stats['checked']} links in {stats['seconds']:.1f}s: "
+          f"{stats['healthy']} healthy, {stats['broken']} broken, {stats['skipped']} skipped (not http/https)")
+
+
+if __name__ == '__main__':
+    main()
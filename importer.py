@@ -0,0 +1,297 @@
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+from collections import deque
+from datetime import datetime, timezone
+from html.parser import HTMLParser
+from itertools import islice
+
+import cache
+import database
+import queries
+import store
+from urls import normalize_url, url_hash
+
+BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+
+FORMATS = ('html', 'csv', 'jsonl')
+EXTENSIONS = {
+    'html': 'html', 'htm': 'html',
+    'csv': 'csv',
+    'jsonl': 'jsonl', 'ndjson': 'jsonl'
+}
+
+# Column/key names accepted for each field in CSV and JSON Lines files
+FIELD_ALIASES = {
+    'name': ('name', 'title'),
+    'link': ('link', 'url', 'href'),
+    'description': ('description', 'note', 'notes', 'excerpt'),
+    'created_at': ('created_at', 'created', 'add_date', 'date'),
+    'folder': ('folder', 'collection')
+}
+
+
+def detect_format(filename):
+    """Guess the import format from a file name"""
+    extension = filename.rsplit('.', 1)[-1].lower()
+    if extension not in EXTENSIONS:
+        raise ValueError(f"Unsupported file type: .{extension}")
+    return EXTENSIONS[extension]
+
+
+def parse_timestamp(value):
+    """Convert an epoch or ISO-8601 value to SQLite's CURRENT_TIMESTAMP format"""
+    if value in (None, ''):
+        return None
+    try:
+        if str(value).isdigit():
+            moment = datetime.fromtimestamp(int(value), tz=timezone.utc)
+        else:
+            moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+            if moment.tzinfo:
+                moment = moment.astimezone(timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        return None
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class BookmarkParser(HTMLParser):
+    """Incremental parser for Netscape bookmark files (browser exports)"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.records = deque()
+        self.folders = []
+        self._pending = None
+        self._text = None
+        self._in_folder_title = False
+
+    def _flush(self):
+        if self._pending:
+            self._pending['description'] = self._pending['description'].strip()
+            self.records.append(self._pending)
+        self._pending = None
+        self._text = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('dt', 'dl', 'a', 'h3'):
+            self._flush()
+        if tag == 'a':
+            attrs = dict(attrs)
+            self._pending = {
+                'name': '',
+                'link': attrs.get('href', ''),
+                'description': '',
+                'created_at': attrs.get('add_date'),
+                'folder': '/'.join(self.folders)
+            }
+            self._text = 'name'
+        elif tag == 'dd' and self._pending is not None:
+            self._text = 'description'
+        elif tag == 'h3':
+            self._in_folder_title = True
+            self.folders.append('')
+
+    def handle_endtag(self, tag):
+        if tag == 'a':
+            self._text = None
+        elif tag == 'h3':
+            self._in_folder_title = False
+        elif tag == 'dl':
+            self._flush()
+            if self.folders:
+                self.folders.pop()
+
+    def handle_data(self, data):
+        if self._in_folder_title:
+            self.folders[-1] += data.strip()
+        elif self._pending is not None and self._text:
+            self._pending[self._text] += data
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def parse_html(fp):
+    """Yield bookmark records from a Netscape bookmark HTML stream"""
+    parser = BookmarkParser()
+    while True:
+        chunk = fp.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        parser.feed(chunk)
+        while parser.records:
+            yield parser.records.popleft()
+    parser.close()
+    yield from parser.records
+
+
+def pick(row, field):
+    """Return the first non-empty value for a field from its accepted aliases"""
+    lowered = {str(k).strip().lower(): v for k, v in row.items()}
+    for alias in FIELD_ALIASES[field]:
+        if lowered.get(alias) not in (None, ''):
+            return lowered[alias]
+    return None
+
+
+def parse_csv(fp):
+    """Yield bookmark records from a CSV stream with a header row"""
+    for row in csv.DictReader(fp):
+        yield {field: pick(row, field) for field in FIELD_ALIASES}
+
+
+def parse_jsonl(fp):
+    """Yield bookmark records from a JSON Lines stream (one object per line)"""
+    for line in fp:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            yield {}
+            continue
+        yield {field: pick(row, field) for field in FIELD_ALIASES} if isinstance(row, dict) else {}
+
+
+PARSERS = {
+    'html': parse_html,
+    'csv': parse_csv,
+    'jsonl': parse_jsonl
+}
+
+
+def clean_record(user_id, record):
+    """Turn a parsed record into (INSERT parameters, collection name or None), or None if it is unusable"""
+    link = normalize_url(record.get('link'))
+    if link is None:
+        return None
+    name = str(record.get('name') or '').strip() or link
+    description = str(record.get('description') or '').strip()
+    folder = ' '.join(str(record.get('folder') or '').split())[:store.MAX_TAG_LENGTH] or None
+    return (user_id, name, link, description, parse_timestamp(record.get('created_at')), url_hash(link)), folder
+
+
+def file_into_collections(conn, user_id, records, collection_ids, after_id=None):
+    """Add imported links to the collection named after their bookmark folder.
+
+    records are clean_record() results; collection_ids caches collection ids
+    by name across batches. Only links with an id above after_id (the ones
+    this batch inserted) are filed; with after_id=None links that were
+    already saved join the folder's collection too.
+    """
+    pairs = []
+    for row, folder in records:
+        if folder is None:
+            continue
+        link = conn.execute(queries.FIND_DUPLICATE, (user_id, row[-1])).fetchone()
+        if link is None or (after_id is not None and link[0] <= after_id):
+            continue
+        if folder not in collection_ids:
+            conn.execute(queries.ADD_TAG, (user_id, 'collection', folder))
+            collection_ids[folder] = conn.execute(queries.FIND_TAG, (user_id, 'collection', folder)).fetchone()[0]
+        pairs.append((collection_ids[folder], link[0]))
+    conn.executemany(queries.TAG_LINK, pairs)
+
+
+def import_links(user_id, records, batch_size=BATCH_SIZE, progress=None, collect_existing=False):
+    """Insert parsed records in batched transactions, skipping duplicates.
+
+    records may be any iterable (usually a parser generator); only one batch
+    is held in memory at a time. Links the user already has (same canonical
+    URL) are skipped by the unique url_hash index. Bookmark folders become
+    collections of the imported links; collect_existing also adds the
+    skipped links to their folder's collection. progress, if given, is
+    called with the running stats after every batch. Returns the final
+    stats dict.
+    """
+    pool = database.user_pool(user_id)
+    stats = {'read': 0, 'imported': 0, 'duplicates': 0, 'invalid': 0, 'seconds': 0.0, 'links_per_second': 0.0}
+    started = time.perf_counter()
+    records = iter(records)
+    collection_ids = {}
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        stats['read'] += len(batch)
+        cleaned = [row for row in (clean_record(user_id, record) for record in batch) if row]
+        rows = [row for row, _ in cleaned]
+        stats['invalid'] += len(batch) - len(rows)
+        if rows:
+            with pool.transaction() as conn:
+                after_id = None if collect_existing else conn.execute(queries.LAST_LINK_ID).fetchone()[0]
+                inserted = conn.executemany(queries.IMPORT_LINK, rows).rowcount
+                file_into_collections(conn, user_id, cleaned, collection_ids, after_id)
+            stats['imported'] += inserted
+            stats['duplicates'] += len(rows) - inserted
+        stats['seconds'] = time.perf_counter() - started
+        stats['links_per_second'] = stats['read'] / stats['seconds'] if stats['seconds'] else 0.0
+        if progress:
+            progress(stats)
+    cache.query_cache.bump(user_id)
+    return stats
+
+
+def open_text(binary_fp):
+    """Wrap a binary file object for streaming text parsing; a UTF-8 BOM (as Excel writes) is dropped"""
+    return io.TextIOWrapper(binary_fp, encoding='utf-8-sig', errors='replace', newline='')
+
+
+def import_file(user_id, binary_fp, fmt, batch_size=BATCH_SIZE, progress=None, collect_existing=False):
+    """Stream-parse an uploaded/opened file and import it"""
+    if fmt not in PARSERS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    text_fp = open_text(binary_fp)
+    try:
+        return import_links(user_id, PARSERS[fmt](text_fp), batch_size, progress, collect_existing)
+    finally:
+        # Leave the caller's file object open
+        text_fp.detach()
+
+
+def find_user_id(email):
+    """Look up a user id by email, or None"""
+    row = database.get_pool().fetchone(queries.USER_BY_EMAIL, (email,))
+    return row[0] if row else None
+
+
+def print_progress(stats):
+    print(
+        f"\r{stats['read']} read, {stats['imported']} imported, {stats['duplicates']} duplicates, "
+        f"{stats['invalid']} invalid ({stats['links_per_second']:.0f} links/s)",
+        end='', file=sys.stderr, flush=True
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import bookmarks for a Link Manager user")
+    parser.add_argument('file', help="bookmark file (.html, .csv or .jsonl)")
+    parser.add_argument('--email', required=True, help="email of the user to import for")
+    parser.add_argument('--format', choices=FORMATS, help="file format (default: from the extension)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--collect-existing', action='store_true',
+                        help="also add links you already saved to their bookmark folder's collection")
+    parser.add_argument('--db', help="database file (default: LINK_MANAGER_DB or link_manager.db)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.configure(args.db)
+    user_id = find_user_id(args.email)
+    if user_id is None:
+        parser.error(f"No user with email {args.email}")
+    fmt = args.format or detect_format(args.file)
+    with open(args.file, 'rb') as fp:
+        stats = import_file(user_id, fp, fmt, args.batch_size, print_progress, args.collect_existing)
+    print(file=sys.stderr)
+    print(f"Imported {stats['imported']} of {stats['read']} links in {stats['seconds']:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
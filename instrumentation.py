@@ -0,0 +1,202 @@
+import functools
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+import database
+
+# Start with instrumentation on when LINK_MANAGER_PROFILE is set (it can also be toggled at runtime)
+ENABLED = os.environ.get('LINK_MANAGER_PROFILE', '') not in ('', '0')
+# Number of per-rerun breakdowns kept
+RING_SIZE = 200
+# Timings kept per query/span for percentiles
+SAMPLES = 1000
+# Slowest statements listed per rerun
+TOP_QUERIES = 5
+MAX_LABEL = 200
+
+enabled = False
+runs = deque(maxlen=RING_SIZE)
+_local = threading.local()
+_lock = threading.Lock()
+_queries = {}
+_spans = {}
+
+
+def normalize_sql(sql):
+    """One-line label for a statement"""
+    return re.sub(r'\s+', ' ', sql).strip()[:MAX_LABEL]
+
+
+def _add_sample(table, name, seconds):
+    with _lock:
+        samples = table.get(name)
+        if samples is None:
+            samples = table[name] = {'count': 0, 'total': 0.0, 'max': 0.0, 'recent': deque(maxlen=SAMPLES)}
+        samples['count'] += 1
+        samples['total'] += seconds
+        samples['max'] = max(samples['max'], seconds)
+        samples['recent'].append(seconds)
+
+
+def record_query(sql, seconds):
+    """database.query_hook: called with each timed statement and its duration"""
+    label = normalize_sql(sql)
+    _add_sample(_queries, label, seconds)
+    run = getattr(_local, 'run', None)
+    if run is not None:
+        run['sql_seconds'] += seconds
+        run['sql_count'] += 1
+        run['queries'].append((seconds, label))
+
+
+def trace_statement(sql):
+    """sqlite3 trace callback: counts every statement, including trigger bodies and raw connection use"""
+    run = getattr(_local, 'run', None)
+    if run is not None:
+        run['statements'] += 1
+
+
+def record_span(name, seconds):
+    _add_sample(_spans, name, seconds)
+    run = getattr(_local, 'run', None)
+    if run is not None:
+        run['spans'][name] = run['spans'].get(name, 0.0) + seconds
+
+
+def enable():
+    global enabled
+    enabled = True
+    database.query_hook = record_query
+    database.set_trace_callback(trace_statement)
+
+
+def disable():
+    global enabled
+    enabled = False
+    database.query_hook = None
+    database.set_trace_callback(None)
+
+
+def reset():
+    with _lock:
+        _queries.clear()
+        _spans.clear()
+        runs.clear()
+
+
+def timed(func=None, name=None):
+    """Decorator recording how long each call takes (no-op while disabled)"""
+    if func is None:
+        return functools.partial(timed, name=name)
+    label = name or func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return func(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record_span(label, time.perf_counter() - started)
+    return wrapper
+
+
+def profiled_run(func):
+    """Decorator for the script entry point: collects one breakdown per rerun into runs.
+
+    Streamlit ends a rerun early with an exception (st.rerun(), st.stop()),
+    so the breakdown is recorded in a finally block.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return func(*args, **kwargs)
+        run = {'sql_seconds': 0.0, 'sql_count': 0, 'statements': 0, 'spans': {}, 'queries': []}
+        _local.run = run
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.run = None
+            total = time.perf_counter() - started
+            record_span('rerun', total)
+            run['queries'].sort(reverse=True)
+            runs.append({
+                'finished_at': time.time(),
+                'total_ms': total * 1000,
+                'sql_ms': run['sql_seconds'] * 1000,
+                'sql_count': run['sql_count'],
+                'statements': run['statements'],
+                'spans_ms': {name: seconds * 1000 for name, seconds in run['spans'].items()},
+                'slowest_queries': [
+                    {'sql': label, 'ms': seconds * 1000} for seconds, label in run['queries'][:TOP_QUERIES]
+                ]
+            })
+    return wrapper
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def _summaries(table):
+    with _lock:
+        items = [(name, dict(samples, recent=sorted(samples['recent']))) for name, samples in table.items()]
+    summaries = [{
+        'name': name,
+        'count': samples['count'],
+        'total_ms': samples['total'] * 1000,
+        'p50_ms': percentile(samples['recent'], 0.5) * 1000,
+        'p95_ms': percentile(samples['recent'], 0.95) * 1000,
+        'max_ms': samples['max'] * 1000
+    } for name, samples in items]
+    return sorted(summaries, key=lambda summary: summary['total_ms'], reverse=True)
+
+
+def query_stats():
+    """Per-statement count, total, p50, p95 and max, most expensive first"""
+    return _summaries(_queries)
+
+
+def span_stats():
+    """Same summary for timed functions (pages, DataFrame building, whole reruns)"""
+    return _summaries(_spans)
+
+
+def dump_json():
+    return json.dumps({
+        'enabled': enabled,
+        'queries': query_stats(),
+        'spans': span_stats(),
+        'runs': list(runs)
+    }, indent=2)
+
+
+def _label_value(text):
+    return text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def dump_prometheus():
+    """Prometheus text exposition of the query and span summaries"""
+    lines = []
+    for metric, label, summaries in (
+        ('link_manager_query_seconds', 'query', query_stats()),
+        ('link_manager_span_seconds', 'span', span_stats())
+    ):
+        lines.append(f"# TYPE {metric} summary")
+        for summary in summaries:
+            name = f'{label}="{_label_value(summary["name"])}"'
+            lines.append(f'{metric}{{{name},quantile="0.5"}} {summary["p50_ms"] / 1000:.6f}')
+            lines.append(f'{metric}{{{name},quantile="0.95"}} {summary["p95_ms"] / 1000:.6f}')
+            lines.append(f'{metric}_sum{{{name}}} {summary["total_ms"] / 1000:.6f}')
+            lines.append(f'{metric}_count{{{name}}} {summary["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+if ENABLED:
+    enable()
@@ -1,189 +1,254 @@
-import sqlite3
-from time import sleep
-
-# Database connection
-conn = sqlite3.connect('link_manager.db')
-cur = conn.cursor()
-
-# Create table if not exists
-cur.execute("""
-    CREATE TABLE IF NOT EXISTS LINK(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        link TEXT NOT NULL,
-        description TEXT      
-    )
-""")
-
-
-def list_all():
-    """List all saved links"""
-    cur.execute("SELECT * FROM LINK")
-    rows = cur.fetchall()
-
-    if not rows:
-        print("\nNo links found.\n")
-        return
-
-    print("\nAll Links:")
-    print("-" * 30)
-    for data in rows:
-        print(f"ID: {data[0]}")
-        print(f"Name: {data[1]}")
-        print(f"Link: {data[2]}")
-        print(f"Description: {data[3]}")
-        print("-" * 30)
+import argparse
+import itertools
+import json
+import os
+import sys
+
+import database
+import exporter
+import importer
+import store
+import urls
+
+OUTPUT_FORMATS = ('table', 'jsonl', 'csv')
+SEARCH_PAGE_SIZE = 500
+
+
+def write_table(rows, fp):
+    """Fixed-width columns, written row by row so output starts immediately"""
+    fp.write(f"{'ID':>8}  {'NAME':<30}  {'URL':<50}  {'CREATED':<19}  DESCRIPTION\n")
+    count = 0
+    for link_id, name, link, description, created_at in rows:
+        fp.write(f"{link_id:>8}  {name[:30]:<30}  {link[:50]:<50}  {created_at or '':<19}  {description or ''}\n")
+        count += 1
+    return count
+
+
+OUTPUT_WRITERS = {
+    'table': write_table,
+    'jsonl': exporter.write_jsonl,
+    'csv': exporter.write_csv
+}
+
+
+def iter_search_results(user_id, query, typo_tolerant=False):
+    """Yield every search hit, best first, one keyset page at a time"""
+    cursor = None
+    while True:
+        rows, cursor, _ = store.search_links_page(user_id, query, cursor, SEARCH_PAGE_SIZE, typo_tolerant=typo_tolerant)
+        for row in rows:
+            yield row[:5]
+        if cursor is None:
+            return
+
+
+def read_json_lines(fp):
+    """Yield (line number, object) for each non-blank line; exits on a line that isn't a JSON object"""
+    for line_number, line in enumerate(fp, start=1):
+        if line.strip():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise SystemExit(f"stdin line {line_number}: {e}")
+            if not isinstance(record, dict):
+                raise SystemExit(f"stdin line {line_number}: expected a JSON object, got {type(record).__name__}")
+            yield line_number, record
+
+
+def clean_url(url):
+    link = urls.normalize_url(url) if isinstance(url, str) else None
+    if link is None:
+        raise SystemExit(f"Not a web link: {url!r}")
+    return link
+
+
+def link_row(record):
+    """(name, url, description) for an add record, checked like the Add Link form; raises ValueError"""
+    name = str(record.get('name') or '').strip()
+    if not name:
+        raise ValueError("name is required")
+    url = record.get('url') or record.get('link')
+    link = urls.normalize_url(url) if isinstance(url, str) else None
+    if link is None:
+        raise ValueError(f"not a web link: {url!r}")
+    return name, link, str(record.get('description') or '')
+
+
+def finish(success, message):
+    print(message, file=sys.stderr)
+    return 0 if success else 1
+
+
+def cmd_list(args, user_id):
+    rows = exporter.iter_user_links(user_id)
+    if args.limit:
+        rows = itertools.islice(rows, args.limit)
+    OUTPUT_WRITERS[args.format](rows, sys.stdout)
+    return 0
+
+
+def cmd_search(args, user_id):
+    rows = iter_search_results(user_id, args.query, args.fuzzy)
+    if args.limit:
+        rows = itertools.islice(rows, args.limit)
+    OUTPUT_WRITERS[args.format](rows, sys.stdout)
+    return 0
+
+
+def cmd_add(args, user_id):
+    if args.stdin:
+        rows, errors = [], []
+        for line_number, record in read_json_lines(sys.stdin):
+            try:
+                rows.append(link_row(record))
+            except ValueError as e:
+                errors.append(f"stdin line {line_number}: {e}")
+        if errors:
+            print("\n".join(errors), file=sys.stderr)
+            raise SystemExit(f"add: {len(errors)} invalid lines, nothing was added")
+        if not rows:
+            raise SystemExit("add: no links on stdin")
+        return finish(*store.add_links(user_id, rows))
+    if not args.name or not args.name.strip() or not args.url:
+        raise SystemExit("add: NAME and URL are required (or use --stdin)")
+    return finish(*store.add_link(user_id, args.name.strip(), clean_url(args.url), args.description or ''))
+
+
+def cmd_update(args, user_id):
+    if args.stdin:
+        changes = list(read_json_lines(sys.stdin))
+    elif args.id is not None:
+        changes = [(None, {'id': args.id, 'name': args.name, 'url': args.url, 'description': args.description})]
+    else:
+        raise SystemExit("update: ID is required (or use --stdin)")
+    rows = []
+    for line_number, change in changes:
+        current = store.get_link(user_id, change.get('id')) if isinstance(change.get('id'), int) else None
+        if current is None:
+            where = f"stdin line {line_number}: " if line_number else ""
+            raise SystemExit(f"{where}No link with id {change.get('id')!r}")
+        url = change.get('url') or change.get('link')
+        rows.append((
+            current[0],
+            change.get('name') or current[1],
+            clean_url(url) if url else current[2],
+            change['description'] if change.get('description') is not None else current[3]
+        ))
+    return finish(*store.update_links(user_id, rows))
+
+
+def cmd_delete(args, user_id):
+    ids = args.ids
+    if args.stdin:
+        try:
+            ids = [int(token) for token in sys.stdin.read().split()]
+        except ValueError as e:
+            raise SystemExit(f"delete: ids must be integers ({e})")
+    if not ids:
+        raise SystemExit("delete: no ids given")
+    return finish(*store.delete_links(user_id, ids))
+
+
+def cmd_import(args, user_id):
+    fmt = args.format or (importer.detect_format(args.file) if args.file != '-' else None)
+    if fmt is None:
+        raise SystemExit("import: --format is required when reading stdin")
+    if args.file == '-':
+        stats = importer.import_file(user_id, sys.stdin.buffer, fmt, collect_existing=args.collect_existing)
+    else:
+        with open(args.file, 'rb') as fp:
+            stats = importer.import_file(user_id, fp, fmt, collect_existing=args.collect_existing)
+    print(f"Imported {stats['imported']} of {stats['read']} links "
+          f"({stats['duplicates']} duplicates, {stats['invalid']} invalid)", file=sys.stderr)
+    return 0
 
 
-def add():
-    """Add a new link"""
-    name = input("Enter name of the video: ").strip()
-    link = input("Enter link of the video: ").strip()
-    description = input("Enter description of the video: ").strip()
+def cmd_export(args, user_id):
+    if args.output:
+        with open(args.output, 'wb') as fp:
+            count = exporter.export_links(user_id, fp, args.format, args.gzip)
+    else:
+        count = exporter.export_links(user_id, sys.stdout.buffer, args.format, args.gzip)
+        sys.stdout.buffer.flush()
+    print(f"Exported {count} links", file=sys.stderr)
+    return 0
 
-    if not name or not link:
-        print("Name and Link are required")
-        return
 
-    cur.execute(
-        "INSERT INTO LINK (name, link, description) VALUES (?, ?, ?)",
-        (name, link, description)
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Manage Link Manager links from the command line",
+        epilog="Batch input on stdin is JSON Lines: {\"name\", \"url\", \"description\"} for add, "
+               "plus \"id\" for update; delete reads whitespace-separated ids."
     )
-    conn.commit()
-    print("Link added successfully!")
-
-
-def update():
-    """Update an existing link"""
-    print("-" * 10, "Update", "-" * 10)
-
+    parser.add_argument('--user', default=os.environ.get('LINK_MANAGER_USER'),
+                        help="email of the user to act as (default: LINK_MANAGER_USER)")
+    parser.add_argument('--db', help="database file (default: LINK_MANAGER_DB or link_manager.db)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('list', help="list links, oldest first")
+    command.add_argument('--format', choices=OUTPUT_FORMATS, default='table')
+    command.add_argument('--limit', type=int)
+    command.set_defaults(func=cmd_list)
+
+    command = commands.add_parser('search', help="search links, best matches first")
+    command.add_argument('query')
+    command.add_argument('--format', choices=OUTPUT_FORMATS, default='table')
+    command.add_argument('--limit', type=int)
+    command.add_argument('--fuzzy', action='store_true', help="also match words spelled similarly")
+    command.set_defaults(func=cmd_search)
+
+    command = commands.add_parser('add', help="add a link, or many from stdin in one transaction")
+    command.add_argument('name', nargs='?')
+    command.add_argument('url', nargs='?')
+    command.add_argument('-d', '--description')
+    command.add_argument('--stdin', action='store_true')
+    command.set_defaults(func=cmd_add)
+
+    command = commands.add_parser('update', help="change a link, or many from stdin in one transaction")
+    command.add_argument('id', type=int, nargs='?')
+    command.add_argument('--name')
+    command.add_argument('--url')
+    command.add_argument('-d', '--description')
+    command.add_argument('--stdin', action='store_true')
+    command.set_defaults(func=cmd_update)
+
+    command = commands.add_parser('delete', help="delete links in one transaction")
+    command.add_argument('ids', type=int, nargs='*')
+    command.add_argument('--stdin', action='store_true')
+    command.set_defaults(func=cmd_delete)
+
+    command = commands.add_parser('import', help="import a bookmark, CSV or JSON Lines file ('-' for stdin)")
+    command.add_argument('file')
+    command.add_argument('--format', choices=importer.FORMATS)
+    command.add_argument('--collect-existing', action='store_true',
+                         help="also add links you already saved to their bookmark folder's collection")
+    command.set_defaults(func=cmd_import)
+
+    command = commands.add_parser('export', help="export all links")
+    command.add_argument('--format', choices=exporter.FORMATS, default='csv')
+    command.add_argument('--gzip', action='store_true')
+    command.add_argument('-o', '--output')
+    command.set_defaults(func=cmd_export)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.db:
+        database.configure(args.db)
+    if not args.user:
+        parser.error("--user (or LINK_MANAGER_USER) is required")
+    user_id = importer.find_user_id(args.user)
+    if user_id is None:
+        parser.error(f"No user with email {args.user}")
     try:
-        link_id = int(input("Enter Link id: "))
-    except ValueError:
-        print("Enter a valid numeric id")
-        return
-
-    cur.execute("SELECT * FROM LINK WHERE id = ?", (link_id,))
-    row = cur.fetchone()
-
-    if not row:
-        print("No link found with that id")
-        return
-
-    print("\nCurrent Values:")
-    print(f"Name: {row[1]}")
-    print(f"Link: {row[2]}")
-    print(f"Description: {row[3]}\n")
-
-    name = input("Enter new name (leave blank to keep same): ").strip()
-    link = input("Enter new link (leave blank to keep same): ").strip()
-    description = input("Enter new description (leave blank to keep same): ").strip()
-
-    # Keep old values if user leaves blank
-    name = name if name else row[1]
-    link = link if link else row[2]
-    description = description if description else row[3]
-
-    cur.execute(
-        "UPDATE LINK SET name = ?, link = ?, description = ? WHERE id = ?",
-        (name, link, description, link_id)
-    )
-    conn.commit()
-    print("Record updated successfully!")
-
-
-def delete():
-    """Delete a link"""
-    print("-" * 10, "Delete", "-" * 10)
-
-    try:
-        link_id = int(input("Enter link id: "))
-    except ValueError:
-        print("Invalid id")
-        return
-
-    cur.execute("SELECT * FROM LINK WHERE id = ?", (link_id,))
-    row = cur.fetchone()
-
-    if not row:
-        print("No link found with that id")
-        return
-
-    confirm = input(f"Are you sure you want to delete '{row[1]}'? (y/n): ").lower()
-    if confirm != "y":
-        print("Deletion cancelled")
-        return
-
-    cur.execute("DELETE FROM LINK WHERE id = ?", (link_id,))
-    conn.commit()
-    print("Deleted successfully")
-
-
-def search():
-    """Search for a link by ID"""
-    print("-" * 10, "Search", "-" * 10)
-
-    try:
-        link_id = int(input("Enter the id: "))
-    except ValueError:
-        print("⚠️ Invalid id, must be a positive integer")
-        return
-
-    if link_id <= 0:
-        print("Invalid id, must be greater than zero")
-        return
-
-    cur.execute("SELECT * FROM LINK WHERE id = ?", (link_id,))
-    data = cur.fetchone()
-
-    if data:
-        print(f"ID: {data[0]}")
-        print(f"Name: {data[1]}")
-        print(f"Link: {data[2]}")
-        print(f"Description: {data[3]}")
-    else:
-        print("Not found in the database.")
-
-
-def main():
-    """Main menu loop"""
-    print("\n\n" + "-" * 8 + " Link Manager " + "-" * 8 + "\n")
-
-    while True:
-        print("1. List Links")
-        print("2. Add Link")
-        print("3. Update Link")
-        print("4. Delete Link")
-        print("5. Search Link")
-        print("0. Exit")
-
-        try:
-            user_choice = int(input("Enter your choice: "))
-        except ValueError:
-            print("Invalid input, enter a number 0-5")
-            continue
-
-        if user_choice == 0:
-            print("Exiting ...")
-            sleep(3)
-            break
-
-        match user_choice:
-            case 1:
-                list_all()
-            case 2:
-                add()
-            case 3:
-                update()
-            case 4:
-                delete()
-            case 5:
-                search()
-            case _:
-                print("Invalid choice, please enter 0-5")
-
-    conn.close()
+        return args.func(args, user_id)
+    except BrokenPipeError:
+        # Output piped into e.g. head: stop quietly (and don't fail flushing stdout at exit)
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
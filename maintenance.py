@@ -0,0 +1,411 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+
+import database
+import queries
+
+# Where scheduled backups go; without it the scheduler skips backups (the CLI takes --dir)
+BACKUP_DIR = os.environ.get('LINK_MANAGER_BACKUP_DIR')
+# Backup sets kept; older ones are deleted after each backup
+BACKUP_KEEP = int(os.environ.get('LINK_MANAGER_BACKUP_KEEP', '7'))
+# Pages copied per backup step, and seconds backup_file() pauses after each step so a
+# backup doesn't saturate the disk (Connection.backup's own sleep only applies when a
+# step finds the database busy or locked)
+BACKUP_STEP_PAGES = 256
+BACKUP_STEP_SLEEP = 0.005
+# Rows ANALYZE samples per index (PRAGMA analysis_limit), keeping it quick on large tables
+ANALYSIS_LIMIT = 1000
+# Free pages handed back per write transaction by the incremental vacuum
+VACUUM_STEP_PAGES = 1000
+# How long a TRUNCATE checkpoint may hold up writers before it gives up
+TRUNCATE_TIMEOUT_MS = 100
+# Set LINK_MANAGER_MAINTENANCE=0 to keep the app from running the scheduler
+SCHEDULER_ENABLED = os.environ.get('LINK_MANAGER_MAINTENANCE', '1') != '0'
+POLL_INTERVAL = 60
+
+BACKUP_SET = re.compile(r'\d{8}-\d{6}(-\d+)?')
+
+
+def database_files():
+    """Pools of the directory database and every shard, each file once"""
+    pools = {database.get_pool().path: database.get_pool()}
+    for pool in database.data_pools():
+        pools.setdefault(pool.path, pool)
+    return list(pools.values())
+
+
+def file_size(path):
+    """Bytes a database file takes on disk, including its write-ahead log"""
+    return sum(os.path.getsize(name) for name in (path, path + '-wal') if os.path.exists(name))
+
+
+def page_stats(conn):
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return page_size, free_pages
+
+
+def analyze(pool):
+    """Refresh the planner statistics, sampling at most ANALYSIS_LIMIT rows per index"""
+    with pool.checkout() as conn:
+        conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        try:
+            pool.retry(conn.execute, "ANALYZE")
+        finally:
+            conn.execute("PRAGMA analysis_limit = 0")
+    return {'bytes_reclaimed': 0}
+
+
+def optimize(pool):
+    """PRAGMA optimize: re-analyze only the tables whose statistics are out of date"""
+    with pool.checkout() as conn:
+        conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        try:
+            pool.retry(conn.execute, "PRAGMA optimize")
+        finally:
+            conn.execute("PRAGMA analysis_limit = 0")
+    return {'bytes_reclaimed': 0}
+
+
+def incremental_vacuum(pool):
+    """Hand free pages back to the filesystem, VACUUM_STEP_PAGES per short write transaction.
+
+    Only works on files created with auto_vacuum = INCREMENTAL (new files
+    are); older files report their free space and are skipped until
+    converted with `maintenance.py convert`.
+    """
+    with pool.checkout() as conn:
+        page_size, free_pages = page_stats(conn)
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return {'bytes_reclaimed': 0, 'free_bytes': page_size * free_pages, 'skipped': "auto_vacuum is not INCREMENTAL"}
+        freed = 0
+        while free_pages:
+            with pool.transaction():
+                conn.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})").fetchall()
+            remaining = page_stats(conn)[1]
+            freed += free_pages - remaining
+            if remaining >= free_pages:
+                break
+            free_pages = remaining
+        # The file is truncated when the shrunken pages are checkpointed
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+    return {'bytes_reclaimed': freed * page_size, 'pages_freed': freed}
+
+
+def checkpoint(pool):
+    """Copy the write-ahead log into the database and, if nobody is reading, truncate it.
+
+    A PASSIVE checkpoint never waits. Only when it caught up completely is a
+    TRUNCATE attempted, with a busy timeout of TRUNCATE_TIMEOUT_MS so a
+    writer is held up for at most that long.
+    """
+    wal = pool.path + '-wal'
+    before = os.path.getsize(wal) if os.path.exists(wal) else 0
+    with pool.checkout() as conn:
+        busy, wal_pages, copied = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        truncated = False
+        if not busy and wal_pages == copied:
+            conn.execute(f"PRAGMA busy_timeout = {TRUNCATE_TIMEOUT_MS}")
+            try:
+                truncated = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()[0] == 0
+            finally:
+                conn.execute(f"PRAGMA busy_timeout = {int(pool.busy_timeout_ms)}")
+    after = os.path.getsize(wal) if os.path.exists(wal) else 0
+    return {'bytes_reclaimed': before - after, 'wal_pages': wal_pages, 'checkpointed': copied, 'truncated': truncated}
+
+
+def backup_file(source_path, target_path, pages=BACKUP_STEP_PAGES, sleep=BACKUP_STEP_SLEEP):
+    """Copy a live database file with the online backup API, a few pages at a time.
+
+    Every call copies the whole file (there are no incremental backups), in
+    steps of pages pages with a pause of sleep seconds after each one. The
+    source connection holds one read transaction for the whole copy, so
+    every step reads the same snapshot: commits by other connections neither
+    wait for the backup (WAL readers don't block writers) nor restart it, as
+    they would if each step started its own read. Checkpoints can't get past
+    the snapshot meanwhile, so the write-ahead log grows until the copy is
+    done. The copy is written next to target_path and renamed when complete.
+    """
+    partial = target_path + '.partial'
+    stats = {'steps': 0, 'restarts': 0}
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal last_remaining
+        stats['steps'] += 1
+        if last_remaining is not None and remaining > last_remaining:
+            stats['restarts'] += 1
+        last_remaining = remaining
+        if remaining and sleep:
+            time.sleep(sleep)
+
+    source = sqlite3.connect(source_path, timeout=database.BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    target = sqlite3.connect(partial)
+    try:
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        source.backup(target, pages=pages, progress=progress)
+        source.execute("COMMIT")
+        # A self-contained file: the copied header says WAL, which would need -wal and -shm files beside it
+        target.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        target.close()
+        source.close()
+    os.replace(partial, target_path)
+    stats['bytes'] = os.path.getsize(target_path)
+    return stats
+
+
+def verify_backup(path):
+    """Problems PRAGMA quick_check finds in a backup file (empty if it is sound)"""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return [row[0] for row in conn.execute("PRAGMA quick_check") if row[0] != 'ok']
+    finally:
+        conn.close()
+
+
+def backup_sets(directory):
+    """Complete backup sets in directory, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        (name for name in os.listdir(directory) if BACKUP_SET.fullmatch(name)),
+        key=lambda name: os.path.getmtime(os.path.join(directory, name))
+    )
+
+
+def backup(directory=None, keep=BACKUP_KEEP, verify=True):
+    """Back up the directory database and every shard into a new timestamped set of full copies.
+
+    The set is assembled in <timestamp>.partial and renamed when every file
+    is copied (and, with verify, passed quick_check). Sets beyond the newest
+    keep are deleted, as are leftovers of interrupted runs.
+    """
+    directory = directory or BACKUP_DIR
+    if not directory:
+        raise ValueError("No backup directory: set LINK_MANAGER_BACKUP_DIR")
+    name = stamp = time.strftime('%Y%m%d-%H%M%S')
+    while os.path.exists(os.path.join(directory, name)):
+        name = f"{stamp}-{len(backup_sets(directory))}"
+    partial = os.path.join(directory, name + '.partial')
+    os.makedirs(partial)
+    files = {}
+    for pool in database_files():
+        started = time.perf_counter()
+        target = os.path.join(partial, os.path.basename(pool.path))
+        files[pool.path] = backup_file(pool.path, target)
+        if verify:
+            problems = verify_backup(target)
+            if problems:
+                raise sqlite3.DatabaseError(f"Backup of {pool.path} failed quick_check: {problems[0]}")
+        files[pool.path]['seconds'] = round(time.perf_counter() - started, 3)
+    os.rename(partial, os.path.join(directory, name))
+
+    removed = 0
+    for old in backup_sets(directory)[:-keep] if keep else []:
+        removed += sum(file_size(os.path.join(directory, old, f)) for f in os.listdir(os.path.join(directory, old)))
+        shutil.rmtree(os.path.join(directory, old))
+    for leftover in os.listdir(directory):
+        if leftover.endswith('.partial') and leftover != name + '.partial':
+            shutil.rmtree(os.path.join(directory, leftover), ignore_errors=True)
+    return {'set': os.path.join(directory, name), 'files': files, 'bytes_reclaimed': removed}
+
+
+# Run in this order, each at most once per interval (seconds)
+TASKS = {
+    'analyze': (analyze, 24 * 3600),
+    'optimize': (optimize, 3600),
+    'vacuum': (incremental_vacuum, 24 * 3600),
+    'checkpoint': (checkpoint, 15 * 60),
+    'backup': (backup, 24 * 3600),
+}
+
+
+def claim(task, interval):
+    """Record a run of task unless one started less than interval seconds ago; returns its id or None.
+
+    Checked and recorded in one write transaction on the directory database,
+    so several processes running the scheduler never start the same task twice.
+    """
+    with database.get_pool().transaction() as conn:
+        if interval and conn.execute(queries.RECENT_MAINTENANCE, (task, f"-{interval} seconds")).fetchone():
+            return None
+        return conn.execute(queries.START_MAINTENANCE, (task,)).lastrowid
+
+
+def run_task(task, force=False):
+    """Run a task over every database file if it is due (or force), recording it in maintenance_run.
+
+    Returns {'task', 'seconds', 'bytes_reclaimed', 'detail'}, or None if the
+    task was not due. Space reclaimed is what the vacuum freed, how much the
+    checkpoint shrank the write-ahead logs, or what deleting old backup sets
+    freed. A failed run is recorded with its error and raised.
+    """
+    function, interval = TASKS[task]
+    run_id = claim(task, 0 if force else interval)
+    if run_id is None:
+        return None
+    started = time.perf_counter()
+    reclaimed, detail = 0, {}
+    try:
+        if task == 'backup':
+            detail = backup()
+            reclaimed = detail.pop('bytes_reclaimed')
+        else:
+            for pool in database_files():
+                detail[pool.path] = function(pool)
+                reclaimed += max(0, detail[pool.path]['bytes_reclaimed'])
+    except Exception as e:
+        detail['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        database.get_pool().execute(queries.FINISH_MAINTENANCE, (seconds, reclaimed, json.dumps(detail), run_id))
+    return {'task': task, 'seconds': seconds, 'bytes_reclaimed': reclaimed, 'detail': detail}
+
+
+def scheduled_tasks():
+    """Tasks the scheduler runs: all of them, backups only once a backup directory is configured"""
+    return [task for task in TASKS if task != 'backup' or BACKUP_DIR]
+
+
+def history(limit=20):
+    """Most recent runs, newest first, as dicts"""
+    rows = database.get_pool().fetchall(queries.MAINTENANCE_HISTORY, (limit,))
+    return [
+        {'task': task, 'started_at': started_at, 'seconds': seconds, 'bytes_reclaimed': reclaimed,
+         'detail': json.loads(detail) if detail else None}
+        for task, started_at, seconds, reclaimed, detail in rows
+    ]
+
+
+def convert(pool):
+    """Switch an existing file to auto_vacuum = INCREMENTAL; rewrites it with VACUUM, so stop the app first"""
+    with pool.checkout() as conn:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        pool.retry(conn.execute, "VACUUM")
+        # In WAL mode the rewritten file sits in the log until it is checkpointed
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+class MaintenanceScheduler:
+    """Run due maintenance tasks from a background thread.
+
+    Every poll_interval seconds each task whose interval has passed since
+    its last run (by any process) is run; failures are counted, logged to
+    stderr and retried once the interval has passed again.
+    """
+
+    def __init__(self, tasks=None, poll_interval=POLL_INTERVAL):
+        self.tasks = tasks or scheduled_tasks()
+        self.poll_interval = poll_interval
+        self.stats = {'runs': 0, 'failures': 0, 'bytes_reclaimed': 0}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run_forever, name='maintenance', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            self.run_due()
+            self._stop.wait(self.poll_interval)
+
+    def run_due(self):
+        """Run every task that is due; returns the results of those that ran"""
+        results = []
+        for task in self.tasks:
+            if self._stop.is_set():
+                break
+            try:
+                result = run_task(task)
+            except Exception as e:
+                self.stats['failures'] += 1
+                print(f"Maintenance task {task} failed: {e}", file=sys.stderr)
+                continue
+            if result is not None:
+                self.stats['runs'] += 1
+                self.stats['bytes_reclaimed'] += result['bytes_reclaimed']
+                results.append(result)
+        return results
+
+    def snapshot(self):
+        return dict(self.stats, tasks=list(self.tasks))
+
+
+def describe(run):
+    reclaimed = run['bytes_reclaimed'] or 0
+    seconds = run['seconds']
+    text = f"{run['task']}: {'running' if seconds is None else f'{seconds:.2f}s'}, {reclaimed / 2 ** 20:.1f} MB reclaimed"
+    detail = run['detail'] or {}
+    if 'error' in detail:
+        text += f" - failed: {detail['error']}"
+    skipped = [path for path, result in detail.items() if isinstance(result, dict) and 'skipped' in result]
+    if skipped:
+        text += f" - skipped {len(skipped)} files (auto_vacuum is not INCREMENTAL; see `maintenance.py convert`)"
+    if 'set' in detail:
+        text += f" - {detail['set']}"
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Back up the databases and keep them analyzed, compact and checkpointed")
+    commands = parser.add_subparsers(dest='command', required=True)
+    command = commands.add_parser('run', help="run tasks that are due (all tasks by default)")
+    command.add_argument('tasks', nargs='*', metavar='TASK', help=f"any of {', '.join(TASKS)}")
+    command.add_argument('--force', action='store_true', help="run even if the task ran recently")
+    command = commands.add_parser('report', help="recent runs with their duration and space reclaimed")
+    command.add_argument('--limit', type=int, default=20)
+    commands.add_parser('serve', help="keep running tasks as they fall due")
+    commands.add_parser('convert', help="enable incremental vacuum on existing files with VACUUM (stop the app first)")
+    parser.add_argument('--dir', help="backup directory (default: LINK_MANAGER_BACKUP_DIR)")
+    parser.add_argument('--db', help="directory database (default: LINK_MANAGER_DB or link_manager.db)")
+    args = parser.parse_args(argv)
+
+    global BACKUP_DIR
+    if args.db:
+        database.configure(args.db)
+    if args.dir:
+        BACKUP_DIR = args.dir
+    if args.command == 'run':
+        unknown = set(args.tasks) - set(TASKS)
+        if unknown:
+            parser.error(f"unknown task {sorted(unknown)[0]}; choose from {', '.join(TASKS)}")
+        for task in args.tasks or scheduled_tasks():
+            run = run_task(task, args.force)
+            print(describe(run) if run else f"{task}: not due")
+    elif args.command == 'report':
+        for run in history(args.limit):
+            print(f"{run['started_at']} {describe(run)}")
+    elif args.command == 'serve':
+        scheduler = MaintenanceScheduler()
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            pass
+    else:
+        for pool in database_files():
+            before = file_size(pool.path)
+            converted = convert(pool)
+            print(f"{pool.path}: {'incremental vacuum enabled' if converted else 'could not enable incremental vacuum'}, "
+                  f"{(before - file_size(pool.path)) / 2 ** 20:.1f} MB reclaimed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+from datetime import datetime
+
+import pandas as pd
+
+import clicks
+import fuzzy
+import health
+import instrumentation
+import store
+
+
+def format_date(created_at):
+    """Stored timestamp as YYYY-MM-DD, or 'Unknown'"""
+    if not created_at:
+        return 'Unknown'
+    try:
+        return datetime.fromisoformat(created_at).strftime("%Y-%m-%d")
+    except (ValueError, TypeError):
+        return 'Unknown'
+
+
+@instrumentation.timed
+def dashboard_page_data(user_id, cursor=None, page_size=5):
+    """Everything the Dashboard shows: stat cards, one page of recent links and, with click tracking, usage"""
+    links, next_cursor = store.get_links_page(user_id, cursor, page_size)
+    data = {
+        'stats': store.get_user_stats(user_id),
+        'links': links,
+        'next_cursor': next_cursor
+    }
+    if clicks.enabled():
+        data['most_visited'] = clicks.most_visited(user_id)
+        data['never_opened'] = clicks.never_opened(user_id)
+        data['opened'] = clicks.count_opened(user_id)
+    return data
+
+
+@instrumentation.timed
+def search_page_data(user_id, query, cursor=None, page_size=25, tag_ids=(), match_all=False, typo_tolerant=False):
+    """One page of search results and the total number of matches.
+
+    When an exact search finds nothing, the typo-tolerant search is used
+    instead; 'typo_tolerant' says which one produced the results and
+    'corrections' maps misspelled query words to the words matched for them
+    (empty when the typo-tolerant search found nothing either).
+    """
+    if not fuzzy.available():
+        typo_tolerant = False
+    results, next_cursor, total = store.search_links_page(
+        user_id, query, cursor, page_size, tag_ids, match_all, typo_tolerant
+    )
+    if total == 0 and not typo_tolerant and fuzzy.available():
+        typo_tolerant = True
+        results, next_cursor, total = store.search_links_page(
+            user_id, query, cursor, page_size, tag_ids, match_all, True
+        )
+    return {
+        'results': results,
+        'next_cursor': next_cursor,
+        'total': total,
+        'typo_tolerant': typo_tolerant,
+        'corrections': fuzzy.fuzzy_query(user_id, query)[1] if typo_tolerant and total else {}
+    }
+
+
+# Columns of a get_links_page() row, and the ones the Manage Links editor shows
+PAGE_COLUMNS = ['ID', 'Name', 'URL', 'Description', 'Created', 'Health', 'Meta description']
+TABLE_COLUMNS = ['ID', 'Name', 'URL', 'Description', 'Created', 'Health']
+
+
+def format_dates(created_at):
+    """Vectorized format_date for a Series of stored timestamps; only the distinct values go through Python"""
+    values = created_at.astype(object).where(created_at.notna(), None)
+    return values.map({value: format_date(value) for value in values.unique()})
+
+
+def health_labels(status):
+    """Vectorized health.health_label; only the distinct statuses go through Python"""
+    codes = status.fillna(-1).astype('int64')
+    return codes.map({code: health.health_label(None if code < 0 else code) for code in codes.unique()})
+
+
+@instrumentation.timed
+def manage_table(links):
+    """DataFrame shown in the Manage Links editor, built column-wise from the page rows"""
+    df = pd.DataFrame.from_records(links, columns=PAGE_COLUMNS, exclude=['Meta description'], nrows=len(links))
+    df = df[TABLE_COLUMNS]
+    df['Description'] = df['Description'].fillna('').replace('', 'No description')
+    df['Created'] = format_dates(df['Created'])
+    df['Health'] = health_labels(df['Health'])
+    df.insert(0, 'Select', False)
+    return df
+
+
+@instrumentation.timed
+def manage_page_data(user_id, cursor=None, page_size=25, health_filter=None, tag_ids=(), match_all=False):
+    """Link count, one page of links and the editor table for Manage Links"""
+    links, next_cursor = store.get_links_page(user_id, cursor, page_size, health_filter, tag_ids, match_all)
+    return {
+        'total': store.count_user_links(user_id),
+        'links': links,
+        'next_cursor': next_cursor,
+        'table': manage_table(links)
+    }
@@ -0,0 +1,562 @@
+import re
+import sys
+
+# SQL used by the data functions in app.py, kept here so the query plans can be checked
+
+REGISTER = "INSERT INTO USER (name, email, password) VALUES (?, ?, ?)"
+
+USER_BY_EMAIL = "SELECT id FROM USER WHERE email = ?"
+
+LOGIN = "SELECT id, name, email FROM USER WHERE email = ? AND password = ?"
+
+USER_LINKS = """
+    SELECT id, name, link, description, created_at FROM LINK
+    WHERE user_id = ? ORDER BY id DESC
+"""
+
+GET_LINK = """
+    SELECT id, name, link, description, created_at FROM LINK
+    WHERE id = ? AND user_id = ?
+"""
+
+# Keyset pagination: pass the last id of the previous page (or MAX_ID for the first page)
+MAX_ID = 2 ** 63 - 1
+
+USER_LINKS_PAGE = """
+    SELECT id, name, link, description, created_at, health_status, meta_description FROM LINK
+    WHERE user_id = ? AND id < ? {filter}
+    ORDER BY id DESC LIMIT ?
+"""
+
+
+def filtered(template, condition=None):
+    """Fill a template's {filter} placeholder with an extra AND condition (or nothing)"""
+    return template.format(filter=f"AND {condition}" if condition else "")
+
+
+def user_links_page(condition=None):
+    """USER_LINKS_PAGE, optionally narrowed by an extra SQL condition on LINK"""
+    return filtered(USER_LINKS_PAGE, condition)
+
+COUNT_USER_LINKS = "SELECT COALESCE((SELECT total_links FROM user_stats WHERE user_id = ?), 0)"
+
+USER_GENERATION = "SELECT COALESCE((SELECT generation FROM user_stats WHERE user_id = ?), 0)"
+
+# Dashboard numbers: trigger-maintained total plus range counts on (user_id, created_at)
+USER_STATS = """
+    SELECT
+        COALESCE((SELECT total_links FROM user_stats WHERE user_id = ?1), 0),
+        (SELECT COUNT(*) FROM LINK WHERE user_id = ?1 AND created_at >= datetime('now', '-7 days')),
+        (SELECT COUNT(*) FROM LINK WHERE user_id = ?1 AND created_at >= datetime('now', '-30 days')),
+        (SELECT MAX(created_at) FROM LINK WHERE user_id = ?1)
+"""
+
+# Streaming export, oldest first
+EXPORT_LINKS = """
+    SELECT id, name, link, description, created_at FROM LINK
+    WHERE user_id = ? ORDER BY id
+"""
+
+ADD_LINK = "INSERT INTO LINK (user_id, name, link, description, url_hash) VALUES (?, ?, ?, ?, ?)"
+
+# Duplicate lookup by canonical-URL hash (unique index idx_link_user_url_hash)
+FIND_DUPLICATE = "SELECT id, name FROM LINK WHERE user_id = ? AND url_hash = ?"
+
+# Link health checker (health.py)
+LINKS_TO_CHECK = """
+    SELECT id, user_id, link, health_status, health_etag, health_last_modified FROM LINK
+    WHERE id > ? AND (health_checked_at IS NULL OR health_checked_at < datetime('now', ?))
+    ORDER BY id LIMIT ?
+"""
+
+USER_LINKS_TO_CHECK = """
+    SELECT id, user_id, link, health_status, health_etag, health_last_modified FROM LINK
+    WHERE user_id = ? AND id > ? AND (health_checked_at IS NULL OR health_checked_at < datetime('now', ?))
+    ORDER BY id LIMIT ?
+"""
+
+SAVE_HEALTH = """
+    UPDATE LINK SET health_status = ?, health_latency_ms = ?, health_etag = ?,
+                    health_last_modified = ?, health_checked_at = CURRENT_TIMESTAMP
+    WHERE id = ?
+"""
+
+# Metadata enrichment worker (enrichment.py)
+CLAIM_FETCH_JOBS = """
+    SELECT j.link_id, l.user_id, l.link, l.url_hash FROM fetch_job j
+    JOIN LINK l ON l.id = j.link_id
+    WHERE j.state = 'pending' AND j.available_at <= CURRENT_TIMESTAMP
+    ORDER BY j.available_at LIMIT ?
+"""
+
+START_FETCH_JOB = """
+    UPDATE fetch_job SET state = 'running', attempts = attempts + 1, claimed_at = CURRENT_TIMESTAMP
+    WHERE link_id = ?
+"""
+
+# A job re-queued while running (its URL was edited) stays queued
+FINISH_FETCH_JOB = "DELETE FROM fetch_job WHERE link_id = ? AND state = 'running'"
+
+# Failed jobs wait ? * attempts^2 seconds before the next try, and stay 'failed' after the last one
+RETRY_FETCH_JOB = """
+    UPDATE fetch_job SET
+        state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+        available_at = datetime('now', '+' || (? * attempts * attempts) || ' seconds'),
+        claimed_at = NULL
+    WHERE link_id = ?
+"""
+
+REQUEUE_STALE_FETCH_JOBS = """
+    UPDATE fetch_job SET state = 'pending', claimed_at = NULL
+    WHERE state = 'running' AND claimed_at < datetime('now', ?)
+"""
+
+ENQUEUE_UNENRICHED = """
+    INSERT OR IGNORE INTO fetch_job (link_id)
+    SELECT id FROM LINK WHERE enriched_at IS NULL
+"""
+
+FETCH_QUEUE_DEPTH = "SELECT state, COUNT(*) FROM fetch_job GROUP BY state"
+
+CACHED_FETCH = """
+    SELECT status, title, description, canonical_link, favicon FROM fetch_cache
+    WHERE url_hash = ? AND expires_at > CURRENT_TIMESTAMP
+"""
+
+SAVE_FETCH = """
+    INSERT OR REPLACE INTO fetch_cache (url_hash, status, title, description, canonical_link, favicon, expires_at)
+    VALUES (?, ?, ?, ?, ?, ?, datetime('now', ?))
+"""
+
+PURGE_FETCH_CACHE = "DELETE FROM fetch_cache WHERE expires_at <= CURRENT_TIMESTAMP"
+
+SAVE_METADATA = """
+    UPDATE LINK SET meta_title = ?, meta_description = ?, canonical_link = ?, favicon = ?,
+                    enriched_at = CURRENT_TIMESTAMP
+    WHERE id = ?
+"""
+
+# Dedupe job (dedupe.py)
+UNHASHED_LINKS = """
+    SELECT id, user_id, link FROM LINK
+    WHERE url_hash IS NULL AND id > ?
+    ORDER BY id LIMIT ?
+"""
+
+SET_URL_HASH = "UPDATE LINK SET url_hash = ? WHERE id = ?"
+
+# ?1 is the duplicate, ?2 the surviving link
+MERGE_DUPLICATE = """
+    UPDATE LINK SET
+        description = COALESCE(NULLIF(description, ''), (SELECT description FROM LINK WHERE id = ?1)),
+        created_at = COALESCE(
+            MIN(created_at, (SELECT created_at FROM LINK WHERE id = ?1)),
+            created_at,
+            (SELECT created_at FROM LINK WHERE id = ?1)
+        )
+    WHERE id = ?2
+"""
+
+DELETE_MERGED = "DELETE FROM LINK WHERE id = ?"
+
+# The duplicate's clicks move to the survivor (?1: duplicate id, ?2: survivor id)
+MERGE_DAILY_CLICKS = """
+    INSERT INTO link_click_daily (link_id, day, user_id, clicks)
+    SELECT ?2, day, user_id, clicks FROM link_click_daily WHERE link_id = ?1
+    ON CONFLICT (link_id, day) DO UPDATE SET clicks = clicks + excluded.clicks
+"""
+
+MERGE_TOTAL_CLICKS = """
+    INSERT INTO link_click_total (link_id, user_id, clicks, last_clicked_at)
+    SELECT ?2, user_id, clicks, last_clicked_at FROM link_click_total WHERE link_id = ?1
+    ON CONFLICT (link_id) DO UPDATE SET
+        clicks = clicks + excluded.clicks,
+        last_clicked_at = MAX(last_clicked_at, excluded.last_clicked_at)
+"""
+
+# The duplicate's tags and collections move to the survivor (?1: duplicate id, ?2: survivor id); the
+# link_tag triggers count the moved rows in, and deleting the duplicate counts its own rows out
+MERGE_TAGS = """
+    INSERT OR IGNORE INTO link_tag (tag_id, link_id)
+    SELECT tag_id, ?2 FROM link_tag WHERE link_id = ?1
+"""
+
+# Bulk import: the unique (user_id, url_hash) index makes duplicates no-ops
+IMPORT_LINK = """
+    INSERT OR IGNORE INTO LINK (user_id, name, link, description, created_at, url_hash)
+    VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?)
+"""
+
+# Highest link id in the file; links inserted later in the same transaction have larger ids
+LAST_LINK_ID = "SELECT COALESCE(MAX(id), 0) FROM LINK"
+
+UPDATE_LINK = """
+    UPDATE LINK SET name = ?, link = ?, description = ?, url_hash = ?
+    WHERE id = ? AND user_id = ?
+"""
+
+DELETE_LINK = "DELETE FROM LINK WHERE id = ? AND user_id = ?"
+
+SEARCH_LINKS = """
+    SELECT id, name, link, description, created_at FROM LINK
+    WHERE user_id = ? AND (name LIKE ? OR description LIKE ?)
+    ORDER BY id DESC
+"""
+
+# Full-text search; rows are (id, name, link, description, created_at, name_highlight, snippet)
+SEARCH_LINKS_FTS = """
+    SELECT l.id, l.name, l.link, l.description, l.created_at,
+           highlight(link_fts, 0, '**', '**'),
+           snippet(link_fts, 1, '**', '**', '…', 16)
+    FROM link_fts JOIN LINK l ON l.id = link_fts.rowid
+    WHERE link_fts MATCH ?
+    ORDER BY rank
+"""
+
+# Ranked keyset pagination: pass the (rank, id) of the last row of the previous page
+SEARCH_LINKS_FTS_PAGE = """
+    SELECT l.id, l.name, l.link, l.description, l.created_at,
+           highlight(link_fts, 0, '**', '**'),
+           snippet(link_fts, 1, '**', '**', '…', 16),
+           link_fts.rank
+    FROM link_fts JOIN LINK l ON l.id = link_fts.rowid
+    WHERE link_fts MATCH ?
+      AND (link_fts.rank > ? OR (link_fts.rank = ? AND link_fts.rowid > ?)) {filter}
+    ORDER BY link_fts.rank, link_fts.rowid LIMIT ?
+"""
+
+COUNT_SEARCH_FTS = "SELECT COUNT(*) FROM link_fts WHERE link_fts MATCH ? {filter}"
+
+SEARCH_LINKS_PAGE = """
+    SELECT id, name, link, description, created_at, name, description, 0 FROM LINK
+    WHERE user_id = ? AND (name LIKE ? OR description LIKE ?) AND id < ? {filter}
+    ORDER BY id DESC LIMIT ?
+"""
+
+COUNT_SEARCH = """
+    SELECT COUNT(*) FROM LINK
+    WHERE user_id = ? AND (name LIKE ? OR description LIKE ?) {filter}
+"""
+
+# Tags and collections; link_count is kept up to date by triggers and doubles as the facet count
+TAG_FACETS = """
+    SELECT id, kind, name, link_count FROM tag
+    WHERE user_id = ? AND link_count > 0
+    ORDER BY kind, name
+"""
+
+LINK_TAGS = """
+    SELECT t.kind, t.name FROM link_tag lt JOIN tag t ON t.id = lt.tag_id
+    WHERE lt.link_id = ? AND t.user_id = ?
+"""
+
+LINK_TAG_IDS = "SELECT tag_id FROM link_tag WHERE link_id = ?"
+
+ADD_TAG = "INSERT OR IGNORE INTO tag (user_id, kind, name) VALUES (?, ?, ?)"
+
+FIND_TAG = "SELECT id FROM tag WHERE user_id = ? AND kind = ? AND name = ?"
+
+TAG_LINK = "INSERT OR IGNORE INTO link_tag (tag_id, link_id) VALUES (?, ?)"
+
+UNTAG_LINK = "DELETE FROM link_tag WHERE tag_id = ? AND link_id = ?"
+
+PRUNE_TAGS = "DELETE FROM tag WHERE user_id = ? AND link_count = 0"
+
+LINK_OWNER = "SELECT 1 FROM LINK WHERE id = ? AND user_id = ?"
+
+# One page of tagged links. The link ids are walked newest first straight off
+# the link_tag primary key (tag_id, link_id) and only the page's LINK rows are
+# read, so the cost depends on the page size rather than on how many links a
+# user has. CROSS JOIN keeps link_tag as the outer loop.
+TAGGED_LINKS_PAGE = """
+    SELECT id, name, link, description, created_at, health_status, meta_description FROM LINK
+    WHERE id IN ({ids})
+    ORDER BY id DESC
+"""
+
+TAGGED_IDS_ALL = """
+    SELECT t0.link_id FROM link_tag t0 CROSS JOIN LINK l ON l.id = t0.link_id
+    WHERE t0.tag_id = ? AND t0.link_id < ? {exists} AND l.user_id = ? {filter}
+    ORDER BY t0.link_id DESC LIMIT ?
+"""
+
+TAGGED_IDS_ARM = """
+    SELECT t.link_id FROM link_tag t CROSS JOIN LINK l ON l.id = t.link_id
+    WHERE t.tag_id = ? AND t.link_id < ? AND l.user_id = ? {filter}
+"""
+
+HAS_TAG = "EXISTS (SELECT 1 FROM link_tag WHERE tag_id = ? AND link_id = {id})"
+
+HAS_ANY_TAG = "EXISTS (SELECT 1 FROM link_tag WHERE link_id = {id} AND tag_id IN ({placeholders}))"
+
+
+def tagged_links_page(tag_count, match_all=False, condition=None):
+    """TAGGED_LINKS_PAGE for links carrying all (or any) of tag_count tags.
+
+    Parameters for match_all: the rarest tag id, the cursor, the other tag
+    ids, the user id and the limit. Otherwise (tag id, cursor, user id) for
+    every tag, then the limit; the arms are merged in id order by UNION so
+    each only reads as far as the page needs.
+    """
+    if match_all:
+        exists = ''.join(f" AND {HAS_TAG.format(id='t0.link_id')}" for _ in range(tag_count - 1))
+        ids = filtered(TAGGED_IDS_ALL.replace('{exists}', exists), condition)
+    else:
+        arm = filtered(TAGGED_IDS_ARM, condition).strip()
+        ids = ' UNION '.join([arm] * tag_count) + ' ORDER BY 1 DESC LIMIT ?'
+    return TAGGED_LINKS_PAGE.format(ids=ids)
+
+
+def tag_condition(tag_count, match_all=False, id_column='id'):
+    """SQL condition that the link id_column carries all (or any) of tag_count tags"""
+    if match_all:
+        return ' AND '.join([HAS_TAG.format(id=id_column)] * tag_count)
+    return HAS_ANY_TAG.format(id=id_column, placeholders=', '.join('?' * tag_count))
+
+# JSON API tokens (only their SHA-256 hashes are stored)
+ADD_API_TOKEN = "INSERT INTO api_token (token_hash, user_id, name) VALUES (?, ?, ?)"
+
+API_TOKEN_USER = "SELECT user_id FROM api_token WHERE token_hash = ?"
+
+USER_API_TOKENS = "SELECT name, created_at FROM api_token WHERE user_id = ? ORDER BY created_at"
+
+DELETE_API_TOKENS = "DELETE FROM api_token WHERE user_id = ? AND name = ?"
+
+# Typo-tolerant search: links waiting for their words to be added to the term dictionary
+PENDING_FUZZY_LINKS = """
+    SELECT p.link_id, l.user_id, l.name, l.description, l.link FROM fuzzy_pending p
+    LEFT JOIN LINK l ON l.id = p.link_id
+    ORDER BY p.link_id LIMIT ?
+"""
+
+HAS_PENDING_FUZZY_LINKS = "SELECT 1 FROM fuzzy_pending LIMIT 1"
+
+CLEAR_PENDING_FUZZY_LINK = "DELETE FROM fuzzy_pending WHERE link_id = ?"
+
+ADD_FUZZY_TERM = "INSERT OR IGNORE INTO fuzzy_term (user_id, term) VALUES (?, ?)"
+
+# Words of one user's dictionary sharing the most (and rarest) trigrams with a query word (see fuzzy.similar_terms)
+FUZZY_CANDIDATES = """
+    SELECT t.term FROM fuzzy_term_trigram f
+    JOIN fuzzy_term t ON t.id = f.rowid
+    WHERE fuzzy_term_trigram MATCH ?
+    ORDER BY f.rank LIMIT ?
+"""
+
+# Sharded storage: the layout lives in the directory database (the main file)
+SHARD_COUNT = "SELECT shard_count FROM shard_layout"
+
+SET_SHARD_COUNT = "UPDATE shard_layout SET shard_count = ?"
+
+# Every user with links or tags in a data file
+SHARD_USERS = "SELECT user_id FROM user_stats UNION SELECT user_id FROM tag"
+
+SHARD_LINK_TOTAL = "SELECT COALESCE(SUM(total_links), 0) FROM user_stats"
+
+SHARD_USER_LINKS = "SELECT {columns} FROM LINK WHERE user_id = ? ORDER BY id"
+
+SHARD_USER_TAGS = "SELECT id, kind, name FROM tag WHERE user_id = ?"
+
+SHARD_USER_LINK_TAGS = """
+    SELECT lt.tag_id, lt.link_id FROM link_tag lt
+    JOIN tag t ON t.id = lt.tag_id
+    WHERE t.user_id = ?
+"""
+
+SHARD_USER_FETCH_JOBS = """
+    SELECT j.link_id, j.state, j.attempts, j.available_at, j.claimed_at FROM fetch_job j
+    JOIN LINK l ON l.id = j.link_id
+    WHERE l.user_id = ?
+"""
+
+MOVE_LINK = "INSERT INTO LINK ({columns}) VALUES ({placeholders})"
+
+MOVE_TAG = "INSERT INTO tag (user_id, kind, name) VALUES (?, ?, ?)"
+
+MOVE_FETCH_JOB = """
+    INSERT OR REPLACE INTO fetch_job (link_id, state, attempts, available_at, claimed_at)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+CLEAR_USER_FETCH_JOBS = "DELETE FROM fetch_job WHERE link_id IN (SELECT id FROM LINK WHERE user_id = ?)"
+
+DELETE_USER_LINKS = "DELETE FROM LINK WHERE user_id = ?"
+
+DELETE_USER_TAGS = "DELETE FROM tag WHERE user_id = ?"
+
+DELETE_USER_STATS = "DELETE FROM user_stats WHERE user_id = ?"
+
+SHARD_USER_DAILY_CLICKS = "SELECT link_id, day, clicks FROM link_click_daily WHERE user_id = ?"
+
+SHARD_USER_TOTAL_CLICKS = "SELECT link_id, clicks, last_clicked_at FROM link_click_total WHERE user_id = ?"
+
+MOVE_DAILY_CLICKS = "INSERT INTO link_click_daily (link_id, day, user_id, clicks) VALUES (?, ?, ?, ?)"
+
+MOVE_TOTAL_CLICKS = "INSERT INTO link_click_total (link_id, user_id, clicks, last_clicked_at) VALUES (?, ?, ?, ?)"
+
+# Click rollups: buffered counts are added in batches; clicks on deleted or foreign links insert nothing
+ADD_DAILY_CLICKS = """
+    INSERT INTO link_click_daily (link_id, day, user_id, clicks)
+    SELECT id, ?, user_id, ? FROM LINK WHERE id = ? AND user_id = ?
+    ON CONFLICT (link_id, day) DO UPDATE SET clicks = clicks + excluded.clicks
+"""
+
+ADD_TOTAL_CLICKS = """
+    INSERT INTO link_click_total (link_id, user_id, clicks, last_clicked_at)
+    SELECT id, user_id, ?, ? FROM LINK WHERE id = ? AND user_id = ?
+    ON CONFLICT (link_id) DO UPDATE SET
+        clicks = clicks + excluded.clicks,
+        last_clicked_at = MAX(last_clicked_at, excluded.last_clicked_at)
+"""
+
+CLICK_SECRET = "SELECT secret FROM click_secret WHERE id = 1"
+
+MOST_VISITED = """
+    SELECT l.id, l.name, l.link, c.clicks, c.last_clicked_at FROM link_click_total c
+    JOIN LINK l ON l.id = c.link_id
+    WHERE c.user_id = ?
+    ORDER BY c.clicks DESC
+    LIMIT ?
+"""
+
+# Days are summed per link before the join, so only the top rows touch LINK
+MOST_VISITED_SINCE = """
+    SELECT l.id, l.name, l.link, d.clicks, d.last_day FROM (
+        SELECT link_id, SUM(clicks) AS clicks, MAX(day) AS last_day FROM link_click_daily
+        WHERE user_id = ? AND day >= ?
+        GROUP BY link_id
+        ORDER BY clicks DESC
+        LIMIT ?
+    ) d
+    JOIN LINK l ON l.id = d.link_id
+    ORDER BY d.clicks DESC
+"""
+
+NEVER_OPENED = """
+    SELECT l.id, l.name, l.link, l.created_at FROM LINK l
+    WHERE l.user_id = ? AND NOT EXISTS (SELECT 1 FROM link_click_total c WHERE c.link_id = l.id)
+    ORDER BY l.created_at
+    LIMIT ?
+"""
+
+COUNT_OPENED_LINKS = "SELECT COUNT(*) FROM link_click_total WHERE user_id = ?"
+
+# Maintenance runs, in the directory database
+RECENT_MAINTENANCE = "SELECT 1 FROM maintenance_run WHERE task = ? AND started_at > datetime('now', ?) LIMIT 1"
+
+START_MAINTENANCE = "INSERT INTO maintenance_run (task) VALUES (?)"
+
+FINISH_MAINTENANCE = "UPDATE maintenance_run SET seconds = ?, bytes_reclaimed = ?, detail = ? WHERE id = ?"
+
+MAINTENANCE_HISTORY = """
+    SELECT task, started_at, seconds, bytes_reclaimed, detail FROM maintenance_run
+    ORDER BY id DESC LIMIT ?
+"""
+
+PHRASE_OR_TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def fts_quote(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def fts_query(user_id, text):
+    """Build an FTS5 MATCH expression scoped to one user.
+
+    Quoted parts of the input become phrase queries, every other word is a
+    prefix query, and all of them must match. Returns None if the input has
+    nothing searchable in it.
+    """
+    parts = []
+    for phrase, term in PHRASE_OR_TERM.findall(text):
+        if phrase.strip():
+            parts.append(fts_quote(phrase.strip()))
+        elif term.strip('"*'):
+            parts.append(fts_quote(term.strip('"*')) + '*')
+    if not parts:
+        return None
+    return f'user_id : {fts_quote(str(user_id))} AND {{name description link}} : ({" AND ".join(parts)})'
+
+
+# Every query that runs per request, with sample parameters for EXPLAIN QUERY PLAN
+PER_USER_QUERIES = {
+    'login_user': (LOGIN, ('user@example.com', 'hash')),
+    'get_user_links': (USER_LINKS, (1,)),
+    'get_links_page': (user_links_page(), (1, MAX_ID, 25)),
+    'get_links_page_broken': (user_links_page("(health_status >= 400 OR health_status = 0)"), (1, MAX_ID, 25)),
+    'user_links_to_check': (USER_LINKS_TO_CHECK, (1, 0, '+100 years', 1000)),
+    'count_user_links': (COUNT_USER_LINKS, (1,)),
+    'get_user_stats': (USER_STATS, (1,)),
+    'user_generation': (USER_GENERATION, (1,)),
+    'get_link': (GET_LINK, (1, 1)),
+    'export_links': (EXPORT_LINKS, (1,)),
+    'import_links': (IMPORT_LINK, (1, 'name', 'https://example.com', '', None, 0)),
+    'find_duplicate': (FIND_DUPLICATE, (1, 0)),
+    'update_link': (UPDATE_LINK, ('name', 'link', 'description', 0, 1, 1)),
+    'delete_link': (DELETE_LINK, (1, 1)),
+    'search_links': (SEARCH_LINKS, (1, '%q%', '%q%')),
+    'search_links_page': (filtered(SEARCH_LINKS_PAGE), (1, '%q%', '%q%', MAX_ID, 25)),
+    'search_links_page_tagged': (filtered(SEARCH_LINKS_PAGE, tag_condition(2, True)), (1, '%q%', '%q%', MAX_ID, 1, 2, 25)),
+    'get_tag_facets': (TAG_FACETS, (1,)),
+    'get_link_tags': (LINK_TAGS, (1, 1)),
+    'tagged_links_page_all': (tagged_links_page(2, True), (1, MAX_ID, 2, 1, 25)),
+    'tagged_links_page_any': (tagged_links_page(2), (1, MAX_ID, 1, 2, MAX_ID, 1, 25)),
+    'tagged_links_page_broken': (
+        tagged_links_page(1, True, "(health_status >= 400 OR health_status = 0)"), (1, MAX_ID, 1, 25)
+    ),
+    'claim_fetch_jobs': (CLAIM_FETCH_JOBS, (100,)),
+    'api_token_user': (API_TOKEN_USER, ('hash',)),
+    'most_visited': (MOST_VISITED, (1, 5)),
+    'never_opened': (NEVER_OPENED, (1, 5)),
+    'count_opened_links': (COUNT_OPENED_LINKS, (1,)),
+}
+
+
+def explain(conn, sql, params):
+    """Return the EXPLAIN QUERY PLAN detail lines for a statement"""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def plan_uses_index(plan):
+    """True if no step scans a whole table/index or sorts with a temporary b-tree.
+
+    Ranked full-text queries are the exception: their matches have to be
+    sorted by score, so a sort after a virtual-table lookup is allowed.
+    """
+    ranked = any('VIRTUAL TABLE' in step for step in plan)
+    for step in plan:
+        if step.startswith('SCAN ') and 'VIRTUAL TABLE' not in step and step != 'SCAN CONSTANT ROW':
+            return False
+        if 'USE TEMP B-TREE' in step and not ranked:
+            return False
+    return True
+
+
+def check_query_plans(conn, query_map=None):
+    """Explain every per-user query and report whether it is index-backed.
+
+    Returns a list of (name, ok, plan) tuples.
+    """
+    if query_map is None:
+        query_map = dict(PER_USER_QUERIES)
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'link_fts'").fetchone():
+            match = fts_query(1, 'q')
+            query_map['search_links_fts'] = (SEARCH_LINKS_FTS, (match,))
+            query_map['search_links_fts_page'] = (filtered(SEARCH_LINKS_FTS_PAGE), (match, 0.0, 0.0, 0, 25))
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'fuzzy_term_trigram'").fetchone():
+            query_map['fuzzy_candidates'] = (FUZZY_CANDIDATES, ('user_id : " 1 " AND term : ("pyt" OR "yth")', 50))
+    results = []
+    for name, (sql, params) in query_map.items():
+        plan = explain(conn, sql, params)
+        results.append((name, plan_uses_index(plan), plan))
+    return results
+
+
+if __name__ == '__main__':
+    import database
+
+    with database.get_pool().checkout() as conn:
+        results = check_query_plans(conn)
+    for name, ok, plan in results:
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: {' | '.join(plan)}")
+    sys.exit(0 if all(ok for _, ok, _ in results) else 1)
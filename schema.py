@@ -0,0 +1,596 @@
+import sqlite3
+
+import urls
+
+USER_TABLE = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        email TEXT NOT NULL UNIQUE,
+        password TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+LINK_TABLE = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        link TEXT NOT NULL,
+        description TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES USER(id) ON DELETE CASCADE
+    )
+"""
+
+# Values used for columns that legacy tables do not have yet
+LEGACY_DEFAULTS = {
+    'user_id': '1',
+    'created_at': 'NULL'
+}
+
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def rebuild_table(conn, table, create_sql):
+    """Recreate a legacy table with the current definition, keeping its rows.
+
+    The copy is built under a temporary name and renamed at the end so that
+    foreign keys in other tables keep pointing at the original name.
+    """
+    old_columns = table_columns(conn, table)
+    conn.execute(create_sql.format(table=f"{table}_new"))
+    new_columns = table_columns(conn, f"{table}_new")
+    select = [c if c in old_columns else LEGACY_DEFAULTS.get(c, 'NULL') for c in new_columns]
+    conn.execute(
+        f"INSERT INTO {table}_new ({', '.join(new_columns)}) "
+        f"SELECT {', '.join(select)} FROM {table}"
+    )
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+
+def migration_1_base_tables(conn):
+    """Create USER and LINK, upgrading tables written by older versions"""
+    for table, create_sql in (('USER', USER_TABLE), ('LINK', LINK_TABLE)):
+        columns = table_columns(conn, table)
+        if not columns:
+            conn.execute(create_sql.format(table=table))
+        elif 'created_at' not in columns or (table == 'LINK' and 'user_id' not in columns):
+            # SQLite cannot ADD COLUMN with a CURRENT_TIMESTAMP default, so rebuild instead
+            rebuild_table(conn, table, create_sql)
+
+
+def migration_2_link_indexes(conn):
+    """Index LINK for the per-user listing, search and date-range queries"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_link_user_id ON LINK (user_id, id DESC)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_link_user_created ON LINK (user_id, created_at)")
+
+
+LINK_FTS_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS link_fts_insert AFTER INSERT ON LINK BEGIN
+        INSERT INTO link_fts (rowid, name, description, link, user_id)
+        VALUES (new.id, new.name, new.description, new.link, new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS link_fts_delete AFTER DELETE ON LINK BEGIN
+        INSERT INTO link_fts (link_fts, rowid, name, description, link, user_id)
+        VALUES ('delete', old.id, old.name, old.description, old.link, old.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS link_fts_update AFTER UPDATE OF name, description, link, user_id ON LINK BEGIN
+        INSERT INTO link_fts (link_fts, rowid, name, description, link, user_id)
+        VALUES ('delete', old.id, old.name, old.description, old.link, old.user_id);
+        INSERT INTO link_fts (rowid, name, description, link, user_id)
+        VALUES (new.id, new.name, new.description, new.link, new.user_id);
+    END
+    """,
+]
+
+
+def migration_3_link_fts(conn):
+    """Full-text index over LINK kept in sync by triggers (skipped without FTS5).
+
+    user_id is indexed as a token so a search can be restricted to one user
+    inside the FTS index itself; its BM25 weight is zero.
+    """
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS link_fts USING fts5(
+                name, description, link, user_id,
+                content='LINK', content_rowid='id',
+                prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+    except sqlite3.OperationalError:
+        return
+    # executescript() would commit the migration transaction, so run one by one
+    for trigger in LINK_FTS_TRIGGERS:
+        conn.execute(trigger)
+    conn.execute("INSERT INTO link_fts (link_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO link_fts (link_fts, rank) VALUES ('rank', 'bm25(10.0, 2.0, 1.0, 0.0)')")
+
+
+USER_STATS_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS user_stats_insert AFTER INSERT ON LINK BEGIN
+        INSERT INTO user_stats (user_id, total_links) VALUES (new.user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET total_links = total_links + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_stats_delete AFTER DELETE ON LINK BEGIN
+        UPDATE user_stats SET total_links = total_links - 1 WHERE user_id = old.user_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_stats_move AFTER UPDATE OF user_id ON LINK
+    WHEN new.user_id != old.user_id BEGIN
+        UPDATE user_stats SET total_links = total_links - 1 WHERE user_id = old.user_id;
+        INSERT INTO user_stats (user_id, total_links) VALUES (new.user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET total_links = total_links + 1;
+    END
+    """,
+]
+
+
+def migration_4_user_stats(conn):
+    """Per-user link counters maintained by triggers on LINK"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            total_links INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    for trigger in USER_STATS_TRIGGERS:
+        conn.execute(trigger)
+    conn.execute("""
+        INSERT OR REPLACE INTO user_stats (user_id, total_links)
+        SELECT user_id, COUNT(*) FROM LINK GROUP BY user_id
+    """)
+
+
+USER_GENERATION_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS user_generation_insert AFTER INSERT ON LINK BEGIN
+        INSERT INTO user_stats (user_id) VALUES (new.user_id)
+        ON CONFLICT (user_id) DO UPDATE SET generation = generation + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_generation_update AFTER UPDATE ON LINK BEGIN
+        UPDATE user_stats SET generation = generation + 1 WHERE user_id IN (old.user_id, new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_generation_delete AFTER DELETE ON LINK BEGIN
+        UPDATE user_stats SET generation = generation + 1 WHERE user_id = old.user_id;
+    END
+    """,
+]
+
+
+def migration_5_user_generation(conn):
+    """Per-user change counter used to validate cached query results"""
+    conn.execute("ALTER TABLE user_stats ADD COLUMN generation INTEGER NOT NULL DEFAULT 0")
+    for trigger in USER_GENERATION_TRIGGERS:
+        conn.execute(trigger)
+
+
+def migration_6_link_url_index(conn):
+    """Index LINK by (user_id, link) for duplicate checks during import"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_link_user_link ON LINK (user_id, link)")
+
+
+def migration_7_url_hash(conn):
+    """Canonical-URL hash with a unique (user_id, url_hash) index for duplicate checks.
+
+    Existing duplicates keep a NULL hash (NULLs never collide in a unique
+    index) until dedupe.py merges them.
+    """
+    conn.execute("ALTER TABLE LINK ADD COLUMN url_hash INTEGER")
+    conn.create_function('url_hash', 1, urls.url_hash, deterministic=True)
+    conn.execute("UPDATE LINK SET url_hash = url_hash(link)")
+    conn.execute("""
+        UPDATE LINK SET url_hash = NULL WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id, url_hash ORDER BY id) AS position
+                FROM LINK
+            ) WHERE position > 1
+        )
+    """)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_link_user_url_hash ON LINK (user_id, url_hash)")
+    conn.execute("DROP INDEX IF EXISTS idx_link_user_link")
+
+
+def migration_8_link_health(conn):
+    """Columns filled in by the link health checker (health.py)"""
+    for column in (
+        "health_status INTEGER",
+        "health_latency_ms INTEGER",
+        "health_checked_at TIMESTAMP",
+        "health_etag TEXT",
+        "health_last_modified TEXT"
+    ):
+        conn.execute(f"ALTER TABLE LINK ADD COLUMN {column}")
+
+
+FETCH_JOB_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS fetch_job_insert AFTER INSERT ON LINK BEGIN
+        INSERT OR IGNORE INTO fetch_job (link_id) VALUES (new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS fetch_job_update AFTER UPDATE OF link ON LINK
+    WHEN new.link != old.link BEGIN
+        INSERT OR REPLACE INTO fetch_job (link_id) VALUES (new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS fetch_job_delete AFTER DELETE ON LINK BEGIN
+        DELETE FROM fetch_job WHERE link_id = old.id;
+    END
+    """,
+]
+
+
+def migration_9_enrichment(conn):
+    """Page metadata columns, the fetch job queue and the shared fetch cache (enrichment.py).
+
+    Triggers queue a job for every new link and for links whose URL changes,
+    and drop the job when its link is deleted.
+    """
+    for column in (
+        "meta_title TEXT",
+        "meta_description TEXT",
+        "canonical_link TEXT",
+        "favicon TEXT",
+        "enriched_at TIMESTAMP"
+    ):
+        conn.execute(f"ALTER TABLE LINK ADD COLUMN {column}")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS fetch_job (
+            link_id INTEGER PRIMARY KEY,
+            state TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            available_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            claimed_at TIMESTAMP
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_fetch_job_state ON fetch_job (state, available_at)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS fetch_cache (
+            url_hash INTEGER PRIMARY KEY,
+            status INTEGER,
+            title TEXT,
+            description TEXT,
+            canonical_link TEXT,
+            favicon TEXT,
+            fetched_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL
+        )
+    """)
+    for trigger in FETCH_JOB_TRIGGERS:
+        conn.execute(trigger)
+
+
+TAG_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS link_tag_insert AFTER INSERT ON link_tag BEGIN
+        UPDATE tag SET link_count = link_count + 1 WHERE id = new.tag_id;
+        UPDATE user_stats SET generation = generation + 1
+        WHERE user_id = (SELECT user_id FROM tag WHERE id = new.tag_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS link_tag_delete AFTER DELETE ON link_tag BEGIN
+        UPDATE tag SET link_count = link_count - 1 WHERE id = old.tag_id;
+        UPDATE user_stats SET generation = generation + 1
+        WHERE user_id = (SELECT user_id FROM tag WHERE id = old.tag_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS link_tag_link_delete AFTER DELETE ON LINK BEGIN
+        DELETE FROM link_tag WHERE link_id = old.id;
+    END
+    """,
+]
+
+
+def migration_10_tags(conn):
+    """Per-user tags and collections (tag.kind) with trigger-maintained link counts.
+
+    link_tag is keyed (tag_id, link_id) so a tag's links can be walked in id
+    order for keyset pagination; idx_link_tag_link serves the reverse lookup.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tag (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES USER(id),
+            kind TEXT NOT NULL DEFAULT 'tag',
+            name TEXT NOT NULL COLLATE NOCASE,
+            link_count INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (user_id, kind, name)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS link_tag (
+            tag_id INTEGER NOT NULL,
+            link_id INTEGER NOT NULL,
+            PRIMARY KEY (tag_id, link_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_link_tag_link ON link_tag (link_id, tag_id)")
+    for trigger in TAG_TRIGGERS:
+        conn.execute(trigger)
+
+
+def migration_11_api_tokens(conn):
+    """Bearer tokens for the JSON API, stored as SHA-256 hashes"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS api_token (
+            token_hash TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES USER(id),
+            name TEXT NOT NULL DEFAULT '',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_api_token_user ON api_token (user_id)")
+
+
+FUZZY_TERM_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS fuzzy_term_insert AFTER INSERT ON fuzzy_term BEGIN
+        INSERT INTO fuzzy_term_trigram (rowid, term, user_id)
+        VALUES (new.id, ' ' || new.term || ' ', ' ' || new.user_id || ' ');
+    END
+"""
+
+FUZZY_PENDING_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS fuzzy_pending_insert AFTER INSERT ON LINK BEGIN
+        INSERT OR IGNORE INTO fuzzy_pending (link_id) VALUES (new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS fuzzy_pending_update AFTER UPDATE OF name, description, link ON LINK BEGIN
+        INSERT OR IGNORE INTO fuzzy_pending (link_id) VALUES (new.id);
+    END
+    """,
+]
+
+# Words worth correcting: 3-40 characters and not just digits
+FUZZY_TERM_FILTER = "length(term) BETWEEN 3 AND 40 AND term GLOB '*[^0-9]*'"
+
+
+def rebuild_fuzzy_terms(conn):
+    """Fill fuzzy_term from the terms link_fts indexed for each user's links and clear the pending queue"""
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp.link_fts_instances USING fts5vocab(main, 'link_fts', 'instance')")
+    conn.execute(f"""
+        INSERT OR IGNORE INTO fuzzy_term (user_id, term)
+        SELECT DISTINCT l.user_id, v.term FROM temp.link_fts_instances v
+        JOIN LINK l ON l.id = v.doc
+        WHERE v.col != 'user_id' AND {FUZZY_TERM_FILTER}
+    """)
+    conn.execute("DROP TABLE temp.link_fts_instances")
+    conn.execute("DELETE FROM fuzzy_pending")
+
+
+def migration_12_fuzzy_terms(conn):
+    """Term dictionary of link_fts with a trigram index, for typo-tolerant search.
+
+    Misspelled query words are matched against the dictionary (tens of
+    thousands of words) rather than against every link. Terms are indexed
+    with a space on each side (' word ') so word starts and ends get
+    trigrams of their own. New and edited links are queued in
+    fuzzy_pending and their words are added by fuzzy.refresh_terms().
+    Skipped without link_fts or the trigram tokenizer (SQLite 3.34+). The
+    tables are replaced by per-user ones, and filled, in migration 16.
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'link_fts'").fetchone() is None:
+        return
+    conn.execute("CREATE TABLE IF NOT EXISTS fuzzy_term (id INTEGER PRIMARY KEY, term TEXT NOT NULL UNIQUE)")
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS fuzzy_term_trigram USING fts5(
+                term, content='', tokenize='trigram'
+            )
+        """)
+    except sqlite3.OperationalError:
+        conn.execute("DROP TABLE fuzzy_term")
+        return
+    conn.execute("CREATE TABLE IF NOT EXISTS fuzzy_pending (link_id INTEGER PRIMARY KEY)")
+    for trigger in FUZZY_PENDING_TRIGGERS:
+        conn.execute(trigger)
+
+
+def migration_13_shard_layout(conn):
+    """Number of shard files holding link data (0: everything in this file).
+
+    Only meaningful in the directory database; sharding.py changes it
+    while the app is stopped.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS shard_layout (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            shard_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO shard_layout (id) VALUES (1)")
+
+
+def migration_14_maintenance_log(conn):
+    """Runs of the maintenance tasks (maintenance.py): when, how long and how much space they freed.
+
+    A run is recorded before it starts, so the row also stops other
+    processes from starting the same task.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS maintenance_run (
+            id INTEGER PRIMARY KEY,
+            task TEXT NOT NULL,
+            started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            seconds REAL,
+            bytes_reclaimed INTEGER,
+            detail TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_maintenance_run_task ON maintenance_run (task, started_at)")
+
+
+CLICK_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS link_click_delete AFTER DELETE ON LINK BEGIN
+        DELETE FROM link_click_daily WHERE link_id = old.id;
+        DELETE FROM link_click_total WHERE link_id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS link_click_move AFTER UPDATE OF user_id ON LINK
+    WHEN new.user_id != old.user_id BEGIN
+        UPDATE link_click_daily SET user_id = new.user_id WHERE link_id = old.id;
+        UPDATE link_click_total SET user_id = new.user_id WHERE link_id = old.id;
+    END
+    """,
+]
+
+
+def migration_15_link_clicks(conn):
+    """Per-link click rollups (clicks.py) and the key signing click-tracking links.
+
+    Clicks are buffered in memory and added to the daily and all-time rows
+    in batches; there is no per-click table. link_click_daily is keyed
+    (link_id, day) for the flush upserts, and its user index covers the
+    "most visited lately" aggregation. click_secret only matters in the
+    directory database.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS link_click_daily (
+            link_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            clicks INTEGER NOT NULL,
+            PRIMARY KEY (link_id, day)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_link_click_daily_user ON link_click_daily (user_id, day, link_id, clicks)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS link_click_total (
+            link_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            clicks INTEGER NOT NULL,
+            last_clicked_at TIMESTAMP NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_link_click_total_user ON link_click_total (user_id, clicks)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS click_secret (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            secret TEXT NOT NULL
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO click_secret (id, secret) VALUES (1, lower(hex(randomblob(32))))")
+    for trigger in CLICK_TRIGGERS:
+        conn.execute(trigger)
+
+
+def migration_16_user_fuzzy_terms(conn):
+    """One term dictionary per user for typo-tolerant search.
+
+    A shared dictionary corrected one user's query words to words found
+    only in other users' links, and those words took the CANDIDATES slots
+    of the user's own. Each term now belongs to a user. The trigram index
+    also holds the user id, padded like the terms (' 42 '), so candidates
+    are looked up among one user's words inside the index. Skipped where
+    migration 12 was.
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'fuzzy_term_trigram'").fetchone() is None:
+        return
+    conn.execute("DROP TRIGGER IF EXISTS fuzzy_term_insert")
+    conn.execute("DROP TABLE fuzzy_term_trigram")
+    conn.execute("DROP TABLE fuzzy_term")
+    conn.execute("""
+        CREATE TABLE fuzzy_term (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            term TEXT NOT NULL,
+            UNIQUE (user_id, term)
+        )
+    """)
+    conn.execute("""
+        CREATE VIRTUAL TABLE fuzzy_term_trigram USING fts5(
+            term, user_id, content='', tokenize='trigram'
+        )
+    """)
+    conn.execute("INSERT INTO fuzzy_term_trigram (fuzzy_term_trigram, rank) VALUES ('rank', 'bm25(1.0, 0.0)')")
+    conn.execute(FUZZY_TERM_TRIGGER)
+    rebuild_fuzzy_terms(conn)
+
+
+# Ordered list of migrations; the position (1-based) is the schema version
+MIGRATIONS = [
+    migration_1_base_tables,
+    migration_2_link_indexes,
+    migration_3_link_fts,
+    migration_4_user_stats,
+    migration_5_user_generation,
+    migration_6_link_url_index,
+    migration_7_url_hash,
+    migration_8_link_health,
+    migration_9_enrichment,
+    migration_10_tags,
+    migration_11_api_tokens,
+    migration_12_fuzzy_terms,
+    migration_13_shard_layout,
+    migration_14_maintenance_log,
+    migration_15_link_clicks,
+    migration_16_user_fuzzy_terms,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(pool):
+    """Apply pending migrations, each in its own transaction"""
+    with pool.checkout() as conn:
+        if schema_version(conn) >= SCHEMA_VERSION:
+            return
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        with pool.transaction() as conn:
+            # Re-read inside the write lock in case another process migrated first
+            if schema_version(conn) >= version:
+                continue
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+
+
+def probe_capabilities(conn):
+    """Detect optional SQLite features once so queries can be chosen up front"""
+    capabilities = {
+        'sqlite_version': sqlite3.sqlite_version,
+        'schema_version': schema_version(conn),
+        'fts5': False,
+        'link_fts': conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'link_fts'"
+        ).fetchone() is not None,
+        'fuzzy': conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'fuzzy_term_trigram'"
+        ).fetchone() is not None
+    }
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.capability_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp.capability_probe")
+        capabilities['fts5'] = True
+    except sqlite3.OperationalError:
+        pass
+    return capabilities
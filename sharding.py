@@ -0,0 +1,154 @@
+import argparse
+import glob
+import os
+import re
+
+import database
+import queries
+import schema
+
+
+def data_files(count, path=None):
+    """Files holding link data under a layout with count shards"""
+    if not count:
+        return [path or database.DB_PATH]
+    return [database.shard_path(index, path) for index in range(count)]
+
+
+def existing_shard_files(path=None):
+    """Shard files on disk next to the directory database, including ones no layout uses any more"""
+    pattern = re.escape(database.shard_path('INDEX', path)).replace('INDEX', r'(\d+)')
+    return sorted(
+        (name for name in glob.glob(database.shard_path('*', path)) if re.fullmatch(pattern, name)),
+        key=lambda name: int(re.fullmatch(pattern, name).group(1))
+    )
+
+
+def user_ids(pool):
+    return [row[0] for row in pool.fetchall(queries.SHARD_USERS)]
+
+
+def delete_user(conn, user_id):
+    """Remove a user's links, tags and counters from one database file (triggers clean up the rest)"""
+    conn.execute(queries.DELETE_USER_LINKS, (user_id,))
+    conn.execute(queries.DELETE_USER_TAGS, (user_id,))
+    conn.execute(queries.DELETE_USER_STATS, (user_id,))
+
+
+def copy_user(source, target, user_id):
+    """Copy a user's links, tags, fetch jobs and click rollups into another database file.
+
+    Whatever target already holds for the user (left by an interrupted run)
+    is replaced. Links get new ids in target; tags, jobs and clicks follow them.
+    Search, stats and the typo-tolerant dictionary are filled in by the
+    target's triggers. Returns the number of links copied.
+    """
+    with source.checkout() as conn:
+        columns = [column for column in schema.table_columns(conn, 'LINK') if column != 'id']
+    links = source.fetchall(queries.SHARD_USER_LINKS.format(columns=', '.join(['id'] + columns)), (user_id,))
+    tags = source.fetchall(queries.SHARD_USER_TAGS, (user_id,))
+    link_tags = source.fetchall(queries.SHARD_USER_LINK_TAGS, (user_id,))
+    jobs = source.fetchall(queries.SHARD_USER_FETCH_JOBS, (user_id,))
+    daily_clicks = source.fetchall(queries.SHARD_USER_DAILY_CLICKS, (user_id,))
+    total_clicks = source.fetchall(queries.SHARD_USER_TOTAL_CLICKS, (user_id,))
+
+    insert = queries.MOVE_LINK.format(columns=', '.join(columns), placeholders=', '.join('?' * len(columns)))
+    with target.transaction() as conn:
+        delete_user(conn, user_id)
+        link_ids = {row[0]: conn.execute(insert, row[1:]).lastrowid for row in links}
+        tag_ids = {tag_id: conn.execute(queries.MOVE_TAG, (user_id, kind, name)).lastrowid for tag_id, kind, name in tags}
+        conn.executemany(queries.TAG_LINK, [(tag_ids[tag_id], link_ids[link_id]) for tag_id, link_id in link_tags])
+        conn.execute(queries.CLEAR_USER_FETCH_JOBS, (user_id,))
+        conn.executemany(queries.MOVE_FETCH_JOB, [(link_ids[job[0]], *job[1:]) for job in jobs])
+        conn.executemany(queries.MOVE_DAILY_CLICKS, [
+            (link_ids[link_id], day, user_id, count) for link_id, day, count in daily_clicks
+        ])
+        conn.executemany(queries.MOVE_TOTAL_CLICKS, [
+            (link_ids[link_id], user_id, count, last) for link_id, count, last in total_clicks
+        ])
+    return len(links)
+
+
+def rebalance(shard_count, path=None, progress=None):
+    """Move every user to the file the layout with shard_count shards assigns them.
+
+    Offline: the app, the API and background workers must be stopped, as
+    they read the layout once per process. Users are copied first, then the
+    new layout is recorded, then copies left in files that no longer own a
+    user are deleted, so an interrupted run can simply be repeated. Growing
+    from n to n + 1 shards only moves the users of the new shard; 0 merges
+    everything back into the directory database. Link ids of moved users
+    change. Returns {'users_moved', 'links_moved', 'copies_removed'}.
+    """
+    if shard_count < 0:
+        raise ValueError("shard_count must be 0 or more")
+    current = database.shard_count(path)
+    stats = {'users_moved': 0, 'links_moved': 0, 'copies_removed': 0}
+    for source_path in data_files(current, path):
+        source = database.get_pool(source_path)
+        for user_id in user_ids(source):
+            target_path = database.user_db_path(user_id, path, shard_count)
+            if target_path != source_path:
+                stats['links_moved'] += copy_user(source, database.get_pool(target_path), user_id)
+                stats['users_moved'] += 1
+                if progress:
+                    progress(stats)
+    database.set_shard_count(shard_count, path)
+
+    files = set(data_files(current, path)) | set(data_files(shard_count, path)) | set(existing_shard_files(path))
+    for file_path in sorted(files):
+        pool = database.get_pool(file_path)
+        for user_id in user_ids(pool):
+            if database.user_db_path(user_id, path, shard_count) != file_path:
+                with pool.transaction() as conn:
+                    delete_user(conn, user_id)
+                stats['copies_removed'] += 1
+    return stats
+
+
+def status(path=None):
+    """Users, links and size of every data file of the current layout"""
+    count = database.shard_count(path)
+    report = []
+    for file_path in data_files(count, path):
+        pool = database.get_pool(file_path)
+        report.append({
+            'file': file_path,
+            'users': len(user_ids(pool)),
+            'links': pool.fetchone(queries.SHARD_LINK_TOTAL)[0],
+            'bytes': sum(os.path.getsize(name) for name in (file_path, file_path + '-wal') if os.path.exists(name))
+        })
+    return count, report
+
+
+def print_progress(stats):
+    print(f"\r{stats['users_moved']} users ({stats['links_moved']} links) moved", end='', flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show or change how users are spread over shard files")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('status', help="users, links and size per data file")
+    command = commands.add_parser('rebalance', help="move users to a layout with SHARDS files (stop the app first)")
+    command.add_argument('shards', type=int, help="number of shard files (0: keep everything in the main database)")
+    parser.add_argument('--db', help="directory database (default: LINK_MANAGER_DB or link_manager.db)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.configure(args.db)
+    if args.command == 'rebalance':
+        stats = rebalance(args.shards, progress=print_progress)
+        print(f"\rMoved {stats['users_moved']} users ({stats['links_moved']} links) and removed "
+              f"{stats['copies_removed']} old copies; now using {args.shards or 'no'} shards")
+        unused = set(existing_shard_files()) - set(data_files(args.shards))
+        for name in sorted(unused):
+            print(f"{name} is no longer used and can be deleted")
+        return
+    count, report = status()
+    print(f"{count or 'No'} shards")
+    for entry in report:
+        print(f"{entry['file']}: {entry['users']} users, {entry['links']} links, {entry['bytes'] / 2 ** 20:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
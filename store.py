@@ -0,0 +1,431 @@
+import hashlib
+import re
+import secrets
+import sqlite3
+
+import cache
+import database
+import fuzzy
+import health
+import queries
+import urls
+
+
+def hash_password(password):
+    """Hash password using SHA-256"""
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def validate_email(email):
+    """Validate email format"""
+    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+    return re.match(pattern, email) is not None
+
+
+def register_user(name, email, password):
+    """Register a new user"""
+    try:
+        hashed_password = hash_password(password)
+        database.get_pool().execute(queries.REGISTER, (name, email, hashed_password))
+        return True, "Registration successful!"
+    except sqlite3.IntegrityError:
+        return False, "Email already exists!"
+    except Exception as e:
+        return False, f"Registration failed: {str(e)}"
+
+
+def login_user(email, password):
+    """Login user and return user info"""
+    hashed_password = hash_password(password)
+    return database.get_pool().fetchone(queries.LOGIN, (email, hashed_password))
+
+
+@cache.cached
+def get_user_links(user_id):
+    """Get all links for a specific user"""
+    return database.user_pool(user_id).fetchall(queries.USER_LINKS, (user_id,))
+
+
+@cache.cached
+def get_link(user_id, link_id):
+    """Get a single link owned by the user, or None"""
+    return database.user_pool(user_id).fetchone(queries.GET_LINK, (link_id, user_id))
+
+
+@cache.cached
+def get_links_page(user_id, cursor=None, limit=25, health_filter=None, tag_ids=(), match_all=False):
+    """Get one page of a user's links, newest first.
+
+    cursor is the id of the last link on the previous page (None for the
+    first page). health_filter is a key of health.HEALTH_FILTERS. tag_ids
+    (a tuple) narrows the page to links with any of those tags, or all of
+    them with match_all. Returns (rows, next_cursor); next_cursor is None on
+    the last page.
+    """
+    pool = database.user_pool(user_id)
+    condition = health.HEALTH_FILTERS.get(health_filter)
+    last_id = queries.MAX_ID if cursor is None else cursor
+    tag_ids = user_tag_ids(user_id, tag_ids, match_all)
+    if tag_ids is None:
+        return [], None
+    if not tag_ids:
+        rows = pool.fetchall(queries.user_links_page(condition), (user_id, last_id, limit + 1))
+    elif match_all:
+        rows = pool.fetchall(
+            queries.tagged_links_page(len(tag_ids), True, condition),
+            (tag_ids[0], last_id, *tag_ids[1:], user_id, limit + 1)
+        )
+    else:
+        params = [param for tag_id in tag_ids for param in (tag_id, last_id, user_id)]
+        rows = pool.fetchall(queries.tagged_links_page(len(tag_ids), False, condition), (*params, limit + 1))
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1][0]
+    return rows, None
+
+
+@cache.cached
+def count_user_links(user_id):
+    """Count a user's links from the trigger-maintained user_stats table"""
+    return database.user_pool(user_id).fetchone(queries.COUNT_USER_LINKS, (user_id,))[0]
+
+
+def get_user_stats(user_id):
+    """Get dashboard statistics without reading the user's links"""
+    total, last_7_days, last_30_days, last_added = database.user_pool(user_id).fetchone(queries.USER_STATS, (user_id,))
+    return {
+        'total': total,
+        'last_7_days': last_7_days,
+        'last_30_days': last_30_days,
+        'last_added': last_added
+    }
+
+
+TAG_KINDS = ('tag', 'collection')
+MAX_TAG_LENGTH = 50
+
+
+@cache.cached
+def get_tag_facets(user_id):
+    """The user's tags and collections with their link counts: rows of (id, kind, name, link_count)"""
+    return database.user_pool(user_id).fetchall(queries.TAG_FACETS, (user_id,))
+
+
+@cache.cached
+def get_link_tags(user_id, link_id):
+    """Names of a link's tags and collections as {'tag': [...], 'collection': [...]}"""
+    names = {kind: [] for kind in TAG_KINDS}
+    for kind, name in database.user_pool(user_id).fetchall(queries.LINK_TAGS, (link_id, user_id)):
+        names[kind].append(name)
+    for kind in names:
+        names[kind].sort(key=str.lower)
+    return names
+
+
+def user_tag_ids(user_id, tag_ids, match_all=False):
+    """Keep the user's own tag ids, rarest first so match-all filters start from the smallest set.
+
+    Returns None when the filter can't match anything (a match-all filter
+    with an id that isn't one of the user's tags).
+    """
+    counts = {row[0]: row[3] for row in get_tag_facets(user_id)}
+    known = sorted((tag_id for tag_id in set(tag_ids) if tag_id in counts), key=lambda tag_id: counts[tag_id])
+    if match_all and len(known) < len(set(tag_ids)):
+        return None
+    if tag_ids and not known:
+        return None
+    return tuple(known)
+
+
+def parse_tags(text):
+    """Split comma-separated tag names, dropping blanks and case-insensitive repeats"""
+    names = {}
+    for name in (text or '').split(','):
+        name = ' '.join(name.split())[:MAX_TAG_LENGTH]
+        if name:
+            names.setdefault(name.lower(), name)
+    return list(names.values())
+
+
+def save_link_tags(conn, user_id, link_id, tags=(), collections=()):
+    """Make a link's tags and collections exactly the given names, inside the caller's transaction"""
+    wanted = set()
+    for kind, names in (('tag', tags), ('collection', collections)):
+        for name in names:
+            conn.execute(queries.ADD_TAG, (user_id, kind, name))
+            wanted.add(conn.execute(queries.FIND_TAG, (user_id, kind, name)).fetchone()[0])
+    current = {row[0] for row in conn.execute(queries.LINK_TAG_IDS, (link_id,))}
+    conn.executemany(queries.UNTAG_LINK, [(tag_id, link_id) for tag_id in current - wanted])
+    conn.executemany(queries.TAG_LINK, [(tag_id, link_id) for tag_id in wanted - current])
+    conn.execute(queries.PRUNE_TAGS, (user_id,))
+
+
+def set_link_tags(user_id, link_id, tags=(), collections=()):
+    """Replace a link's tags and collections"""
+    try:
+        with database.user_pool(user_id).transaction() as conn:
+            if conn.execute(queries.LINK_OWNER, (link_id, user_id)).fetchone() is None:
+                return False, "Link not found."
+            save_link_tags(conn, user_id, link_id, tags, collections)
+        cache.query_cache.bump(user_id)
+        return True, "Tags updated successfully!"
+    except Exception as e:
+        return False, f"Failed to update tags: {str(e)}"
+
+
+def create_api_token(user_id, name=''):
+    """Create a JSON API token for the user; the token itself is only returned here"""
+    token = secrets.token_urlsafe(32)
+    database.get_pool().execute(queries.ADD_API_TOKEN, (hash_token(token), user_id, name))
+    return token
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def token_user_id(token):
+    """User id an API token belongs to, or None"""
+    row = database.get_pool().fetchone(queries.API_TOKEN_USER, (hash_token(token),))
+    return row[0] if row else None
+
+
+def revoke_api_tokens(user_id, name):
+    """Delete the user's tokens with this name; returns how many were deleted"""
+    return database.get_pool().execute(queries.DELETE_API_TOKENS, (user_id, name)).rowcount
+
+
+def is_duplicate_error(error):
+    """True if an IntegrityError came from the unique (user_id, url_hash) index"""
+    return 'url_hash' in str(error)
+
+
+def duplicate_message(user_id, link):
+    """Describe the saved link that has the same canonical URL"""
+    existing = database.user_pool(user_id).fetchone(queries.FIND_DUPLICATE, (user_id, urls.url_hash(link)))
+    if existing:
+        return f"This URL is already saved as \"{existing[1]}\" (ID {existing[0]})."
+    return "This URL is already saved."
+
+
+def insert_link(conn, user_id, name, link, description, tags=(), collections=()):
+    """Insert a link and its tags inside the caller's transaction; returns the new link id"""
+    cur = conn.execute(queries.ADD_LINK, (user_id, name, link, description, urls.url_hash(link)))
+    if tags or collections:
+        save_link_tags(conn, user_id, cur.lastrowid, tags, collections)
+    return cur.lastrowid
+
+
+def create_link(user_id, name, link, description, tags=(), collections=()):
+    """Like add_link, but returns (success, message, link_id); link_id is None on failure"""
+    try:
+        with database.user_pool(user_id).transaction() as conn:
+            link_id = insert_link(conn, user_id, name, link, description, tags, collections)
+        cache.query_cache.bump(user_id)
+        return True, "Link added successfully!", link_id
+    except sqlite3.IntegrityError as e:
+        if is_duplicate_error(e):
+            return False, duplicate_message(user_id, link), None
+        return False, f"Failed to add link: {str(e)}", None
+    except Exception as e:
+        return False, f"Failed to add link: {str(e)}", None
+
+
+def add_link(user_id, name, link, description, tags=(), collections=()):
+    """Add a new link for user"""
+    return create_link(user_id, name, link, description, tags, collections)[:2]
+
+
+def save_link(conn, link_id, user_id, name, link, description, tags=None, collections=None):
+    """Update a link and optionally its tags inside the caller's transaction; False if the user has no such link.
+
+    tags and collections, when given, replace the link's current ones (None
+    leaves that kind as it is).
+    """
+    cur = conn.execute(queries.UPDATE_LINK, (name, link, description, urls.url_hash(link), link_id, user_id))
+    if cur.rowcount == 0:
+        return False
+    if tags is not None or collections is not None:
+        current = {kind: [] for kind in TAG_KINDS}
+        for kind, tag_name in conn.execute(queries.LINK_TAGS, (link_id, user_id)):
+            current[kind].append(tag_name)
+        save_link_tags(
+            conn, user_id, link_id,
+            current['tag'] if tags is None else tags,
+            current['collection'] if collections is None else collections
+        )
+    return True
+
+
+def update_link(link_id, user_id, name, link, description, tags=None, collections=None):
+    """Update an existing link, and its tags and collections when given, in one transaction"""
+    try:
+        with database.user_pool(user_id).transaction() as conn:
+            found = save_link(conn, link_id, user_id, name, link, description, tags, collections)
+        cache.query_cache.bump(user_id)
+        if found:
+            return True, "Link updated successfully!"
+        return False, "Link not found."
+    except sqlite3.IntegrityError as e:
+        if is_duplicate_error(e):
+            return False, duplicate_message(user_id, link)
+        return False, f"Failed to update link: {str(e)}"
+    except Exception as e:
+        return False, f"Failed to update link: {str(e)}"
+
+
+def delete_link(link_id, user_id):
+    """Delete a link"""
+    try:
+        cur = database.user_pool(user_id).execute(queries.DELETE_LINK, (link_id, user_id))
+        cache.query_cache.bump(user_id)
+        if cur.rowcount > 0:
+            return True, "Link deleted successfully!"
+        return False, "Link not found."
+    except Exception as e:
+        return False, f"Failed to delete link: {str(e)}"
+
+
+class DuplicateLink(Exception):
+    """Raised inside a transaction to roll back a bulk add when one of its URLs is already saved"""
+
+
+def create_links(user_id, rows):
+    """Like add_links, but returns (success, message, link_ids); link_ids is empty on failure.
+
+    A duplicate URL, saved before or earlier in the same batch, is named by
+    its position in rows (counting from 0) and its URL.
+    """
+    link_ids = []
+    try:
+        with database.user_pool(user_id).transaction() as conn:
+            for index, (name, link, description) in enumerate(rows):
+                try:
+                    link_ids.append(insert_link(conn, user_id, name, link, description))
+                except sqlite3.IntegrityError as e:
+                    if is_duplicate_error(e):
+                        raise DuplicateLink(index, link)
+                    raise
+        cache.query_cache.bump(user_id)
+        return True, f"{len(link_ids)} links added successfully!", link_ids
+    except DuplicateLink as e:
+        index, link = e.args
+        return False, f"No links were added: link {index} ({link}) is already saved.", []
+    except Exception as e:
+        return False, f"Failed to add links: {str(e)}", []
+
+
+def add_links(user_id, rows):
+    """Add several links in one transaction; rows are (name, link, description)"""
+    return create_links(user_id, rows)[:2]
+
+
+class MissingLinks(Exception):
+    """Raised inside a transaction to roll back a bulk change that didn't find every link"""
+
+
+def update_links(user_id, rows):
+    """Update several links in one transaction; rows are (link_id, name, link, description).
+
+    Nothing is updated unless every id is one of the user's links.
+    """
+    params = [
+        (name, link, description, urls.url_hash(link), link_id, user_id)
+        for link_id, name, link, description in rows
+    ]
+    try:
+        with database.user_pool(user_id).transaction() as conn:
+            updated = conn.executemany(queries.UPDATE_LINK, params).rowcount
+            if updated < len(params):
+                raise MissingLinks(len(params) - updated)
+        cache.query_cache.bump(user_id)
+        return True, f"{updated} links updated successfully!"
+    except MissingLinks as e:
+        if len(params) == 1:
+            return False, "Link not found."
+        return False, f"No links were updated: {e.args[0]} of {len(params)} links not found."
+    except sqlite3.IntegrityError as e:
+        if is_duplicate_error(e):
+            return False, "No links were updated: one of the new URLs is already saved."
+        return False, f"Failed to update links: {str(e)}"
+    except Exception as e:
+        return False, f"Failed to update links: {str(e)}"
+
+
+def delete_links(user_id, link_ids):
+    """Delete several links in one transaction; nothing is deleted unless every id is one of the user's links"""
+    link_ids = set(link_ids)
+    params = [(link_id, user_id) for link_id in link_ids]
+    try:
+        with database.user_pool(user_id).transaction() as conn:
+            deleted = conn.executemany(queries.DELETE_LINK, params).rowcount
+            if deleted < len(link_ids):
+                raise MissingLinks(len(link_ids) - deleted)
+        cache.query_cache.bump(user_id)
+        return True, f"{deleted} links deleted successfully!"
+    except MissingLinks as e:
+        if len(link_ids) == 1:
+            return False, "Link not found."
+        return False, f"No links were deleted: {e.args[0]} of {len(link_ids)} links not found."
+    except Exception as e:
+        return False, f"Failed to delete links: {str(e)}"
+
+
+@cache.cached
+def search_links(user_id, query):
+    """Search links by name, description or URL, best matches first.
+
+    Rows are (id, name, link, description, created_at, name_highlight, snippet).
+    Without FTS5 support this falls back to LIKE matching in id order.
+    """
+    pool = database.user_pool(user_id)
+    if not pool.capabilities['link_fts']:
+        rows = pool.fetchall(queries.SEARCH_LINKS, (user_id, f"%{query}%", f"%{query}%"))
+        return [row + (row[1], row[3]) for row in rows]
+    match = queries.fts_query(user_id, query)
+    if match is None:
+        return []
+    return pool.fetchall(queries.SEARCH_LINKS_FTS, (match,))
+
+
+@cache.cached
+def search_links_page(user_id, query, cursor=None, limit=25, tag_ids=(), match_all=False, typo_tolerant=False):
+    """Get one page of search results in the same order as search_links.
+
+    cursor is the (rank, id) of the last row on the previous page (None for
+    the first page). tag_ids narrows the results as in get_links_page.
+    typo_tolerant also matches words similar to the query words (see fuzzy.py) and
+    is ignored where the database lacks the trigram index.
+    Returns (rows, next_cursor, total_matches).
+    """
+    pool = database.user_pool(user_id)
+    tag_ids = user_tag_ids(user_id, tag_ids, match_all)
+    if tag_ids is None:
+        return [], None, 0
+    if pool.capabilities['link_fts']:
+        if typo_tolerant and pool.capabilities['fuzzy']:
+            match = fuzzy.fuzzy_query(user_id, query)[0]
+        else:
+            match = queries.fts_query(user_id, query)
+        if match is None:
+            return [], None, 0
+        rank, last_id = cursor or (float('-inf'), 0)
+        page_filter = queries.tag_condition(len(tag_ids), match_all, 'l.id') if tag_ids else None
+        count_filter = queries.tag_condition(len(tag_ids), match_all, 'link_fts.rowid') if tag_ids else None
+        rows = pool.fetchall(
+            queries.filtered(queries.SEARCH_LINKS_FTS_PAGE, page_filter),
+            (match, rank, rank, last_id, *tag_ids, limit + 1)
+        )
+        total = pool.fetchone(queries.filtered(queries.COUNT_SEARCH_FTS, count_filter), (match, *tag_ids))[0]
+    else:
+        pattern = f"%{query}%"
+        last_id = queries.MAX_ID if cursor is None else cursor[1]
+        condition = queries.tag_condition(len(tag_ids), match_all) if tag_ids else None
+        rows = pool.fetchall(
+            queries.filtered(queries.SEARCH_LINKS_PAGE, condition),
+            (user_id, pattern, pattern, last_id, *tag_ids, limit + 1)
+        )
+        total = pool.fetchone(queries.filtered(queries.COUNT_SEARCH, condition), (user_id, pattern, pattern, *tag_ids))[0]
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        return rows[:limit], (last[7], last[0]), total
+    return rows, None, total
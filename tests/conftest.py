@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache  # noqa: E402
+import database  # noqa: E402
+import store  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh, migrated database file used by every module for the test"""
+    database.close_all()
+    cache.query_cache.clear()
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'test.db'))
+    database.get_pool()
+    yield database.DB_PATH
+    database.close_all()
+    cache.query_cache.clear()
+
+
+@pytest.fixture
+def user_id(db):
+    """Id of a registered user in the test database"""
+    store.register_user("Test User", "test@example.com", "secret")
+    return store.login_user("test@example.com", "secret")[0]
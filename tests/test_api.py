@@ -0,0 +1,162 @@
+import asyncio
+import http.client
+import json
+import threading
+
+import pytest
+
+import api
+import clicks
+import database
+import store
+
+
+@pytest.fixture
+def token(user_id):
+    return store.create_api_token(user_id, 'tests')
+
+
+def call(method, target, token=None, body=None):
+    headers = {'authorization': f"Bearer {token}"} if token else {}
+    request = api.Request(method, target, headers, json.dumps(body).encode() if body is not None else b'')
+    return api.dispatch(request)
+
+
+def test_requires_a_valid_token(user_id, token):
+    assert call('GET', '/links')[0] == 401
+    assert call('GET', '/links', 'not-a-token')[0] == 401
+    assert call('GET', '/links', token)[0] == 200
+
+    store.revoke_api_tokens(user_id, 'tests')
+    assert call('GET', '/links', token) == (401, {'error': "A valid bearer token is required"})
+
+
+def test_unknown_routes_and_methods(token):
+    assert call('GET', '/nothing', token)[0] == 404
+    assert call('PUT', '/links', token) == (405, {'error': "Use GET, POST for /links"})
+
+
+def test_create_returns_the_new_id(user_id, token):
+    status, payload = call('POST', '/links', token, {
+        'name': "Python", 'url': "python.org", 'tags': ["lang"], 'collections': "reading"
+    })
+    assert status == 201
+    link = store.get_link(user_id, payload['id'])
+    assert link[1:3] == ("Python", "https://python.org")
+    assert store.get_link_tags(user_id, payload['id']) == {'tag': ['lang'], 'collection': ['reading']}
+
+    status, payload = call('GET', f"/links/{payload['id']}", token)
+    assert status == 200 and payload['tags'] == ['lang']
+
+
+def test_create_rejects_bad_input_and_duplicates(token):
+    assert call('POST', '/links', token, {'url': "https://example.com"})[0] == 400
+    assert call('POST', '/links', token, {'name': "Bookmarklet", 'url': "javascript:alert(1)"})[0] == 400
+    assert call('POST', '/links', token, ["not", "an", "object"])[0] == 400
+    assert call('POST', '/links', token, {'name': "A", 'url': "https://example.com/a"})[0] == 201
+    status, payload = call('POST', '/links', token, {'name': "B", 'url': "http://www.example.com/a/"})
+    assert status == 409 and "already saved" in payload['error']
+
+
+def test_batch_create_returns_ids_or_names_the_duplicate(user_id, token):
+    status, payload = call('POST', '/links/batch', token, {'links': [
+        {'name': "A", 'url': "https://example.com/a"}, {'name': "B", 'url': "https://example.com/b"}
+    ]})
+    assert status == 201
+    assert [store.get_link(user_id, link_id)[1] for link_id in payload['ids']] == ["A", "B"]
+
+    status, payload = call('POST', '/links/batch', token, {'links': [
+        {'name': "C", 'url': "https://example.com/c"}, {'name': "B again", 'url': "https://example.com/b"}
+    ]})
+    assert status == 409
+    assert payload['error'] == "No links were added: link 1 (https://example.com/b) is already saved."
+    assert store.count_user_links(user_id) == 2
+
+
+def test_unknown_health_filter_is_rejected(token):
+    assert call('GET', '/links?health=broken', token)[0] == 200
+    status, payload = call('GET', '/links?health=dead', token)
+    assert status == 400 and "healthy" in payload['error']
+
+
+def test_patch_updates_fields_and_tags(user_id, token):
+    link_id = call('POST', '/links', token, {'name': "Old", 'url': "https://example.com", 'tags': "a, b",
+                                             'collections': ["keep"]})[1]['id']
+
+    assert call('PATCH', f"/links/{link_id}", token, {'name': "New", 'tags': ["c"]})[0] == 200
+
+    assert store.get_link(user_id, link_id)[1:3] == ("New", "https://example.com")
+    assert store.get_link_tags(user_id, link_id) == {'tag': ['c'], 'collection': ['keep']}
+    assert call('PATCH', "/links/999", token, {'name': "Missing"})[0] == 404
+
+
+def test_patch_is_all_or_nothing(user_id, token, monkeypatch):
+    link_id = call('POST', '/links', token, {'name': "Old", 'url': "https://example.com", 'tags': ["a"]})[1]['id']
+
+    def broken(*args):
+        raise RuntimeError("tag storage failed")
+
+    monkeypatch.setattr(store, 'save_link_tags', broken)
+    status, payload = call('PATCH', f"/links/{link_id}", token, {'name': "New", 'tags': ["b"]})
+
+    assert status == 400 and "tag storage failed" in payload['error']
+    assert store.get_link(user_id, link_id)[1] == "Old"
+    assert store.get_link_tags(user_id, link_id)['tag'] == ['a']
+
+
+def test_patch_to_a_saved_url_is_a_conflict(token):
+    call('POST', '/links', token, {'name': "A", 'url': "https://example.com/a"})
+    link_id = call('POST', '/links', token, {'name': "B", 'url': "https://example.com/b"})[1]['id']
+    assert call('PATCH', f"/links/{link_id}", token, {'url': "https://example.com/a"})[0] == 409
+
+
+def test_redirect_needs_a_valid_signature(user_id, token, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(clicks, 'record', lambda user_id, link_id: recorded.append((user_id, link_id)))
+    link_id = call('POST', '/links', token, {'name': "A", 'url': "https://example.com/a"})[1]['id']
+    sig = clicks.signature(user_id, link_id)
+
+    assert call('GET', f"/go/{link_id}?u={user_id}&s={sig}") == (302, {'location': "https://example.com/a"})
+    assert call('GET', f"/go/{link_id}?u={user_id}&s={'0' * len(sig)}")[0] == 404
+    assert call('GET', f"/go/{link_id}?u={user_id + 1}&s={sig}")[0] == 404
+    assert recorded == [(user_id, link_id)]
+
+
+def serve(loop, server, ready):
+    try:
+        loop.run_until_complete(server.serve(lambda _: ready.set()))
+    except asyncio.CancelledError:
+        pass
+    finally:
+        # Let cancelled connection handlers close their sockets before the loop goes away
+        pending = asyncio.all_tasks(loop)
+        if pending:
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.close()
+
+
+def test_server_round_trip(token):
+    server = api.ApiServer('127.0.0.1', 0, workers=2)
+    ready = threading.Event()
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=serve, args=(loop, server, ready), daemon=True)
+    thread.start()
+    assert ready.wait(5)
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', server.port, timeout=5)
+        conn.request('POST', '/links', json.dumps({'name': "Python", 'url': "python.org"}),
+                     {'Authorization': f"Bearer {token}", 'Content-Type': 'application/json'})
+        created = conn.getresponse()
+        assert created.status == 201
+        link_id = json.loads(created.read())['id']
+        # Same keep-alive connection
+        conn.request('GET', f"/links/{link_id}", headers={'Authorization': f"Bearer {token}"})
+        fetched = conn.getresponse()
+        assert fetched.status == 200
+        assert json.loads(fetched.read())['url'] == "https://python.org"
+        conn.close()
+    finally:
+        loop.call_soon_threadsafe(lambda: [task.cancel() for task in asyncio.all_tasks(loop)])
+        thread.join(5)
+        server.executor.shutdown()
+        database.close_all()
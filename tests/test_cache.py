@@ -0,0 +1,34 @@
+import sqlite3
+
+import cache
+import database
+import store
+
+
+def test_cached_reads_skip_the_generation_lookup_within_the_interval(user_id, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(cache.query_cache, 'recheck_interval', 5)
+    store.add_link(user_id, "Python", "https://python.org", "")
+    statements = []
+    database.set_trace_callback(statements.append)
+    try:
+        for _ in range(3):
+            assert len(store.get_user_links(user_id)) == 1
+    finally:
+        database.set_trace_callback(None)
+    assert sum('generation' in sql for sql in statements) == 1
+
+    # A write from another process doesn't bump this process's counter
+    with sqlite3.connect(database.DB_PATH) as conn:
+        conn.execute("UPDATE LINK SET name = 'Renamed' WHERE user_id = ?", (user_id,))
+    assert store.get_user_links(user_id)[0][1] == "Python"
+    now[0] += 5
+    assert store.get_user_links(user_id)[0][1] == "Renamed"
+
+
+def test_local_writes_show_up_immediately(user_id, monkeypatch):
+    monkeypatch.setattr(cache.query_cache, 'recheck_interval', 3600)
+    assert store.get_user_links(user_id) == []
+    store.add_link(user_id, "Python", "https://python.org", "")
+    assert len(store.get_user_links(user_id)) == 1
@@ -0,0 +1,74 @@
+import io
+import json
+
+import pytest
+
+import link_manager
+import store
+
+
+def run(monkeypatch, *argv, stdin=''):
+    monkeypatch.setattr('sys.stdin', io.StringIO(stdin))
+    return link_manager.main(['--user', 'test@example.com', *argv])
+
+
+def names(user_id):
+    return sorted(row[1] for row in store.get_user_links(user_id))
+
+
+def test_add_and_delete(user_id, monkeypatch, capsys):
+    assert run(monkeypatch, 'add', 'Python', 'python.org') == 0
+    link_id = store.get_user_links(user_id)[0][0]
+
+    assert run(monkeypatch, 'delete', str(link_id)) == 0
+    assert "1 links deleted" in capsys.readouterr().err
+    assert names(user_id) == []
+
+
+def test_delete_of_unknown_id_fails(user_id, monkeypatch, capsys):
+    run(monkeypatch, 'add', 'Python', 'python.org')
+    link_id = store.get_user_links(user_id)[0][0]
+    capsys.readouterr()
+
+    assert run(monkeypatch, 'delete', '999') == 1
+    assert capsys.readouterr().err.strip() == "Link not found."
+    assert run(monkeypatch, 'delete', str(link_id), '999') == 1
+    assert names(user_id) == ['Python']
+
+
+def test_add_stdin(user_id, monkeypatch):
+    lines = [json.dumps({'name': f"Link {n}", 'url': f"example.com/{n}"}) for n in range(3)]
+    assert run(monkeypatch, 'add', '--stdin', stdin="\n".join(lines) + "\n\n") == 0
+    assert names(user_id) == ["Link 0", "Link 1", "Link 2"]
+
+
+def test_add_stdin_reports_bad_lines_and_adds_nothing(user_id, monkeypatch, capsys):
+    stdin = "\n".join([
+        json.dumps({'name': "Good", 'url': "https://example.com/good"}),
+        json.dumps({'name': "  ", 'url': "https://example.com/blank"}),
+        json.dumps({'name': "No URL"}),
+        json.dumps({'name': "Bookmarklet", 'url': "javascript:void(0)"}),
+    ])
+    with pytest.raises(SystemExit) as exit_info:
+        run(monkeypatch, 'add', '--stdin', stdin=stdin)
+
+    assert exit_info.value.code == "add: 3 invalid lines, nothing was added"
+    err = capsys.readouterr().err
+    assert "stdin line 2: name is required" in err
+    assert "stdin line 3: not a web link: None" in err
+    assert "stdin line 4: not a web link" in err
+    assert names(user_id) == []
+
+
+@pytest.mark.parametrize('line', ['[1, 2]', '"just a string"', '{"name": "Broken'])
+def test_add_stdin_rejects_lines_that_are_not_objects(user_id, monkeypatch, line):
+    with pytest.raises(SystemExit) as exit_info:
+        run(monkeypatch, 'add', '--stdin', stdin=json.dumps({'name': "Ok", 'url': "example.com"}) + "\n" + line)
+    assert str(exit_info.value.code).startswith("stdin line 2:")
+    assert names(user_id) == []
+
+
+def test_update_stdin_checks_ids(user_id, monkeypatch):
+    with pytest.raises(SystemExit) as exit_info:
+        run(monkeypatch, 'update', '--stdin', stdin='{"id": "1", "name": "x"}\n')
+    assert exit_info.value.code == "stdin line 1: No link with id '1'"
@@ -0,0 +1,172 @@
+import sqlite3
+import threading
+
+import pytest
+
+import clicks
+import database
+import queries
+import schema
+import store
+import urls
+
+LEGACY_SCHEMA = """
+    CREATE TABLE USER (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        email TEXT NOT NULL UNIQUE,
+        password TEXT NOT NULL
+    );
+    CREATE TABLE LINK (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        link TEXT NOT NULL,
+        description TEXT
+    );
+"""
+
+
+def test_migrates_legacy_database(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.execute("INSERT INTO USER (name, email, password) VALUES ('Old', 'old@example.com', ?)",
+                 (store.hash_password('pw'),))
+    conn.executemany("INSERT INTO LINK (name, link, description) VALUES (?, ?, ?)", [
+        ('Python', 'https://python.org', 'Language'),
+        ('Python again', 'https://www.python.org/', ''),
+        ('SQLite', 'https://sqlite.org', 'Database'),
+    ])
+    conn.commit()
+    conn.close()
+
+    pool = database.open_pool(path)
+    try:
+        with pool.checkout() as conn:
+            assert schema.schema_version(conn) == schema.SCHEMA_VERSION
+        rows = pool.fetchall("SELECT id, user_id, url_hash, created_at FROM LINK ORDER BY id")
+        assert [row[1] for row in rows] == [1, 1, 1]
+        assert rows[0][2] == urls.url_hash('https://python.org')
+        # The older of two links with the same canonical URL keeps the hash, the other waits for dedupe.py
+        assert rows[1][2] is None
+        assert pool.fetchone(queries.COUNT_USER_LINKS, (1,))[0] == 3
+
+        # Running the migrations again is a no-op
+        schema.migrate(pool)
+        assert pool.fetchone("SELECT COUNT(*) FROM LINK")[0] == 3
+    finally:
+        pool.close_all()
+
+
+def test_retries_while_locked(tmp_path):
+    path = str(tmp_path / 'locked.db')
+    pool = database.ConnectionPool(path, busy_timeout_ms=0, retries=6)
+    pool.execute("CREATE TABLE t (x INTEGER)")
+    blocker = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    blocker.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.2, blocker.execute, ("COMMIT",)).start()
+
+    pool.execute("INSERT INTO t VALUES (1)")
+
+    assert pool.fetchone("SELECT COUNT(*) FROM t")[0] == 1
+    assert pool.stats()['lock_retries'] > 0
+    blocker.close()
+    pool.close_all()
+
+
+def test_gives_up_after_retries(tmp_path):
+    path = str(tmp_path / 'locked.db')
+    pool = database.ConnectionPool(path, busy_timeout_ms=0, retries=1)
+    pool.execute("CREATE TABLE t (x INTEGER)")
+    blocker = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(sqlite3.OperationalError, match='locked'):
+            pool.execute("INSERT INTO t VALUES (1)")
+        assert pool.stats()['lock_retries'] == 1
+    finally:
+        blocker.execute("ROLLBACK")
+        blocker.close()
+        pool.close_all()
+
+
+def test_transaction_rolls_back_and_nests(db):
+    pool = database.get_pool()
+    pool.execute("CREATE TABLE t (x INTEGER)")
+    with pytest.raises(ZeroDivisionError):
+        with pool.transaction() as conn:
+            conn.execute("INSERT INTO t VALUES (1)")
+            1 / 0
+    with pool.transaction():
+        with pool.transaction() as conn:
+            conn.execute("INSERT INTO t VALUES (2)")
+    assert pool.fetchall("SELECT x FROM t") == [(2,)]
+
+
+def test_failed_commit_rolls_back(db):
+    pool = database.get_pool()
+    pool.execute("CREATE TABLE parent (id INTEGER PRIMARY KEY)")
+    pool.execute("CREATE TABLE child (parent_id INTEGER REFERENCES parent (id) DEFERRABLE INITIALLY DEFERRED)")
+    pool.execute("PRAGMA foreign_keys = ON")
+    # The deferred foreign key fails the COMMIT, which leaves SQLite's transaction open
+    with pytest.raises(sqlite3.IntegrityError):
+        with pool.transaction() as conn:
+            conn.execute("INSERT INTO child VALUES (1)")
+    with pool.checkout() as conn:
+        assert not conn.in_transaction
+
+    with pool.transaction() as conn:
+        conn.execute("INSERT INTO parent VALUES (1)")
+    other = sqlite3.connect(db)
+    try:
+        assert other.execute("SELECT COUNT(*) FROM parent").fetchone()[0] == 1
+        assert other.execute("SELECT COUNT(*) FROM child").fetchone()[0] == 0
+    finally:
+        other.close()
+
+
+def test_keyset_pages_cover_every_link_once(user_id):
+    store.add_links(user_id, [(f"Link {n}", f"https://example.com/{n}", '') for n in range(23)])
+    seen, cursor, pages = [], None, 0
+    while True:
+        rows, cursor = store.get_links_page(user_id, cursor, limit=10)
+        seen.extend(row[0] for row in rows)
+        pages += 1
+        if cursor is None:
+            break
+    assert pages == 3
+    assert seen == sorted(seen, reverse=True)
+    assert len(set(seen)) == 23
+
+
+def test_search_pages_cover_every_match_once(user_id):
+    store.add_links(user_id, [(f"Python tip {n}", f"https://example.com/tip/{n}", '') for n in range(12)])
+    store.add_link(user_id, "Unrelated", "https://example.com/other", '')
+    rows, cursor, total = store.search_links_page(user_id, 'python', limit=5)
+    seen = [row[0] for row in rows]
+    while cursor is not None:
+        rows, cursor, _ = store.search_links_page(user_id, 'python', cursor, limit=5)
+        seen.extend(row[0] for row in rows)
+    assert total == 12
+    assert len(seen) == len(set(seen)) == 12
+
+
+def test_jump_hash_is_stable_and_moves_few_keys():
+    # Fixed values: a change here would move existing users to other shards
+    assert [database.jump_hash(key, 10) for key in (0, 1, 2, 3, 2 ** 63)] == [0, 6, 6, 8, 5]
+    assert [database.user_shard(user_id, 4) for user_id in range(1, 9)] == [3, 3, 2, 3, 0, 1, 1, 3]
+    keys = range(10000)
+    before = [database.jump_hash(key, 8) for key in keys]
+    after = [database.jump_hash(key, 9) for key in keys]
+    moved = [(old, new) for old, new in zip(before, after) if old != new]
+    assert all(new == 8 for _, new in moved)
+    assert 0.08 < len(moved) / len(before) < 0.14
+    assert all(0 <= bucket < 8 for bucket in before)
+
+
+def test_click_signature(db):
+    sig = clicks.signature(1, 42)
+    assert clicks.verify(1, 42, sig)
+    assert not clicks.verify(2, 42, sig)
+    assert not clicks.verify(1, 43, sig)
+    assert not clicks.verify(1, 42, sig[:-1] + ('0' if sig[-1] != '0' else '1'))
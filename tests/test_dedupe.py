@@ -0,0 +1,28 @@
+import database
+import dedupe
+import store
+
+
+def add_unhashed_copy(user_id, url, name):
+    """A link written before url_hash existed, as dedupe.py finds them"""
+    with database.get_pool().transaction() as conn:
+        return conn.execute(
+            "INSERT INTO LINK (user_id, name, link, description) VALUES (?, ?, ?, '')", (user_id, name, url)
+        ).lastrowid
+
+
+def test_merge_moves_tags_to_the_survivor(user_id):
+    store.create_link(user_id, "Python", "https://python.org", "")
+    survivor = store.get_user_links(user_id)[0][0]
+    with database.get_pool().transaction() as conn:
+        store.save_link_tags(conn, user_id, survivor, ["lang"], ["Reading"])
+        duplicate = add_unhashed_copy(user_id, "https://www.python.org/", "Python again")
+        store.save_link_tags(conn, user_id, duplicate, ["lang", "docs"], ["Work"])
+
+    report = dedupe.dedupe_links()
+
+    assert report == [{'user_id': user_id, 'url': report[0]['url'], 'kept': survivor, 'merged': [duplicate]}]
+    assert [row[0] for row in store.get_user_links(user_id)] == [survivor]
+    tags = store.get_link_tags(user_id, survivor)
+    assert sorted(tags['tag']) == ["docs", "lang"] and sorted(tags['collection']) == ["Reading", "Work"]
+    assert {row[2]: row[3] for row in store.get_tag_facets(user_id)} == {"docs": 1, "lang": 1, "Reading": 1, "Work": 1}
@@ -0,0 +1,132 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import database
+import enrichment
+import store
+
+PAGE = b"""<html><head>
+<title>Stand-in page</title>
+<meta name="description" content="Served by the test">
+<link rel="canonical" href="/canonical">
+<link rel="icon" href="/static/icon.png">
+</head><body>Hello</body></html>"""
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/page':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(PAGE)))
+            self.end_headers()
+            self.wfile.write(PAGE)
+        elif self.path == '/to-ftp':
+            self.send_response(302)
+            self.send_header('Location', 'ftp://files.example.com/secret')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        else:
+            self.send_error(404)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def allow_loopback(monkeypatch):
+    monkeypatch.setattr(enrichment, 'ALLOW_PRIVATE_ADDRESSES', True)
+
+
+def job_states():
+    return dict(database.get_pool().fetchall("SELECT link_id, state FROM fetch_job"))
+
+
+def link_metadata(link_id):
+    return database.get_pool().fetchone(
+        "SELECT meta_title, meta_description, canonical_link, favicon FROM LINK WHERE id = ?", (link_id,)
+    )
+
+
+def test_enriches_links_from_stand_in_server(user_id, server, allow_loopback):
+    store.add_link(user_id, "Page", f"{server}/page", "")
+    store.add_link(user_id, "Missing", f"{server}/missing", "")
+    worker = enrichment.EnrichmentWorker(workers=2)
+
+    assert worker.run_until_empty() == 2
+
+    page, missing = [row[0] for row in database.get_pool().fetchall("SELECT id FROM LINK ORDER BY id")]
+    assert link_metadata(page) == ("Stand-in page", "Served by the test", f"{server}/canonical",
+                                   f"{server}/static/icon.png")
+    # A 404 is a result: the job is done, with no metadata
+    assert link_metadata(missing) == (None, None, None, None)
+    assert job_states() == {}
+    assert worker.stats['fetches'] == 2
+
+
+def test_refuses_private_addresses_and_other_schemes(monkeypatch):
+    for url in ('http://127.0.0.1/', 'http://localhost:8080/', 'http://10.1.2.3/', 'http://169.254.169.254/latest',
+                'http://[::1]/', 'http://[::ffff:192.168.0.1]/', 'ftp://example.com/file'):
+        with pytest.raises(ValueError):
+            enrichment.check_fetchable(url)
+    monkeypatch.setattr(enrichment.socket, 'getaddrinfo', lambda *args, **kwargs: [(2, 1, 6, '', ('93.184.215.14', 80))])
+    enrichment.check_fetchable('https://example.com/')
+
+
+def test_private_links_fail_without_a_request(user_id, server):
+    store.add_link(user_id, "Local", f"{server}/page", "")
+    worker = enrichment.EnrichmentWorker(workers=1)
+
+    worker.run_until_empty()
+
+    assert list(job_states().values()) == ['pending']
+    assert worker.stats['failures'] == 1 and worker.stats['links'] == 0
+
+
+def test_redirects_are_checked(user_id, server, allow_loopback):
+    store.add_link(user_id, "Redirect", f"{server}/to-ftp", "")
+    worker = enrichment.EnrichmentWorker(workers=1)
+
+    worker.run_until_empty()
+
+    assert worker.stats['failures'] == 1
+    assert list(job_states().values()) == ['pending']
+
+
+def test_missing_status_is_a_failure(user_id, monkeypatch):
+    store.add_link(user_id, "No status", "https://example.com/", "")
+    monkeypatch.setattr(enrichment, 'fetch_metadata', lambda url, timeout: (None, None, None, None, None))
+    worker = enrichment.EnrichmentWorker(workers=1)
+
+    worker.run_until_empty()
+
+    assert worker.stats['failures'] == 1
+    assert list(job_states().values()) == ['pending']
+
+
+def test_failed_batch_requeues_claimed_jobs(user_id, monkeypatch):
+    store.add_link(user_id, "Link", "https://example.com/", "")
+    worker = enrichment.EnrichmentWorker(workers=1, poll_interval=0.01)
+
+    def broken(pool, jobs):
+        worker._stop.set()
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(worker, 'process', broken)
+    worker.run_forever()
+
+    assert list(job_states().values()) == ['pending']
+    attempts = database.get_pool().fetchone("SELECT attempts FROM fetch_job")[0]
+    assert attempts == 1
@@ -0,0 +1,56 @@
+import fuzzy
+import pages
+import store
+
+
+def test_edit_distance_counts_swaps_as_one_edit():
+    assert fuzzy.edit_distance('python', 'python') == 0
+    assert fuzzy.edit_distance('pyhton', 'python') == 1
+    assert fuzzy.edit_distance('pythn', 'python') == 1
+    assert fuzzy.edit_distance('jvaa', 'java') == 1
+    assert fuzzy.edit_distance('kitten', 'sitting') == 3
+
+
+def test_fold_and_trigrams():
+    assert fuzzy.words("Café CRÈME, déjà-vu") == ['cafe', 'creme', 'deja', 'vu']
+    assert fuzzy.similarity('python', 'python') == 1
+    assert fuzzy.similarity('python', 'pyhton') > fuzzy.similarity('python', 'java')
+
+
+def test_typo_tolerant_search_finds_misspelled_words(user_id):
+    store.add_link(user_id, "Postgres tuning guide", "https://example.com/postgres", "Indexes and vacuum")
+    store.add_link(user_id, "Kubernetes basics", "https://example.com/k8s", "")
+
+    rows, _, total = store.search_links_page(user_id, 'postgers', typo_tolerant=True)
+    assert total == 1
+    assert rows[0][1] == "Postgres tuning guide"
+    assert store.search_links_page(user_id, 'postgers')[2] == 0
+
+    match, corrections = fuzzy.fuzzy_query(user_id, 'kubernets')
+    assert corrections == {'kubernets': 'kubernetes'}
+    # Words far from anything in the dictionary are not "corrected"
+    assert fuzzy.fuzzy_query(user_id, 'zzzzqq')[1] == {}
+
+
+def test_dictionary_is_per_user(user_id):
+    store.register_user("Other User", "other@example.com", "secret")
+    other_id = store.login_user("other@example.com", "secret")[0]
+    store.add_link(user_id, "Zephyrcorp roadmap", "https://example.com/roadmap", "")
+
+    data = pages.search_page_data(other_id, 'zephyrcorq')
+    assert data['total'] == 0 and data['corrections'] == {}
+    assert fuzzy.fuzzy_query(other_id, 'zephyrcorq')[1] == {}
+
+    store.add_link(other_id, "Zephyrcore notes", "https://example.com/notes", "")
+    assert fuzzy.fuzzy_query(other_id, 'zephyrcorq')[1] == {'zephyrcorq': 'zephyrcore'}
+    assert fuzzy.fuzzy_query(user_id, 'zephyrcorq')[1] == {'zephyrcorq': 'zephyrcorp'}
+    assert [term for term, _ in fuzzy.similar_terms('zephyrcorx', other_id)] == ['zephyrcore']
+
+
+def test_corrections_only_when_the_search_finds_something(user_id):
+    store.add_link(user_id, "Zephyrcorp roadmap", "https://example.com/roadmap", "")
+
+    data = pages.search_page_data(user_id, 'zephyrcorq')
+    assert data['total'] == 1 and data['corrections'] == {'zephyrcorq': 'zephyrcorp'}
+    data = pages.search_page_data(user_id, 'zephyrcorq kubernetes')
+    assert data['total'] == 0 and data['corrections'] == {}
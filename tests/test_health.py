@@ -0,0 +1,156 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import database
+import health
+import store
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    requests = []
+
+    def respond(self, status, headers=()):
+        self.requests.append((self.command, self.headers['Host'].split(':')[0], self.path, time.monotonic()))
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_HEAD(self):
+        if self.path == '/ok':
+            self.respond(200, [('ETag', '"v1"')])
+        elif self.path == '/moved':
+            self.respond(301, [('Location', '/ok')])
+        elif self.path == '/no-head':
+            self.respond(405)
+        elif self.path == '/cached':
+            self.respond(304 if self.headers.get('If-None-Match') == '"v1"' else 200, [('ETag', '"v1"')])
+        elif self.path == '/caf%C3%A9?q=%C3%BC':
+            self.respond(200)
+        elif self.path == '/huge':
+            self.respond(200, [('X-Padding', 'x' * 70000)])
+        else:
+            self.respond(404)
+
+    def do_GET(self):
+        self.respond(200 if self.path == '/no-head' else 404)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    StandInHandler.requests = []
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def health_by_name(user_id):
+    return dict(database.get_pool().fetchall(
+        "SELECT name, health_status FROM LINK WHERE user_id = ?", (user_id,)
+    ))
+
+
+def test_checks_links_against_stand_in_server(user_id, server):
+    base = f"http://127.0.0.1:{server}"
+    store.add_links(user_id, [
+        ("ok", f"{base}/ok", ""),
+        ("moved", f"{base}/moved", ""),
+        ("no head", f"{base}/no-head", ""),
+        ("gone", f"{base}/gone", ""),
+        ("closed port", "http://127.0.0.1:9/", ""),
+        ("ftp", "ftp://127.0.0.1/file.txt", ""),
+    ])
+
+    stats = health.run_health_check(user_id, delay=0)
+
+    assert health_by_name(user_id) == {
+        "ok": 200, "moved": 200, "no head": 200, "gone": 404, "closed port": health.NETWORK_ERROR, "ftp": None
+    }
+    assert stats['checked'] == 5 and stats['skipped'] == 1
+    assert stats['healthy'] == 3 and stats['broken'] == 2
+    assert ('GET', '127.0.0.1', '/no-head') in [request[:3] for request in StandInHandler.requests]
+
+
+def test_not_modified_keeps_previous_status(user_id, server):
+    store.add_link(user_id, "cached", f"http://127.0.0.1:{server}/cached", "")
+    health.run_health_check(user_id, delay=0)
+    stats = health.run_health_check(user_id, delay=0)
+
+    assert stats['not_modified'] == 1
+    assert health_by_name(user_id) == {"cached": 200}
+
+
+def test_cooling_host_does_not_block_other_hosts(user_id, server):
+    # Two host names for the same stand-in server; one worker in total
+    store.add_links(user_id, [(f"slow {n}", f"http://127.0.0.1:{server}/ok?n={n}", "") for n in range(3)])
+    store.add_link(user_id, "other", f"http://localhost:{server}/ok", "")
+    links = sorted(health.iter_links_to_check(user_id))
+
+    stats = asyncio.run(health.HealthChecker(concurrency=1, per_host=1, delay=0.3).run(links))
+
+    assert stats['checked'] == 4
+    hosts = [request[1] for request in StandInHandler.requests]
+    # The other host is checked while the first one cools down, not after all of its links
+    assert hosts.index('localhost') == 1
+    first_host = [request[3] for request in StandInHandler.requests if request[1] == '127.0.0.1']
+    assert all(later - earlier >= 0.29 for earlier, later in zip(first_host, first_host[1:]))
+
+
+def test_host_delay_outlives_its_queue(user_id, server, monkeypatch):
+    # With room to read one link ahead, the first host's queue empties before its second link is read
+    monkeypatch.setattr(health, 'READ_AHEAD', 1)
+    store.add_link(user_id, "first", f"http://127.0.0.1:{server}/ok?n=1", "")
+    store.add_link(user_id, "other", f"http://localhost:{server}/ok", "")
+    store.add_link(user_id, "second", f"http://127.0.0.1:{server}/ok?n=2", "")
+    links = sorted(health.iter_links_to_check(user_id))
+
+    asyncio.run(health.HealthChecker(concurrency=1, per_host=1, delay=0.4).run(links))
+
+    first_host = [request[3] for request in StandInHandler.requests if request[1] == '127.0.0.1']
+    assert len(first_host) == 2 and first_host[1] - first_host[0] >= 0.39
+
+
+def test_oversized_response_head_is_unreachable(user_id, server):
+    store.add_link(user_id, "huge", f"http://127.0.0.1:{server}/huge", "")
+    store.add_link(user_id, "ok", f"http://127.0.0.1:{server}/ok", "")
+
+    stats = health.run_health_check(user_id, delay=0)
+
+    assert stats['checked'] == 2
+    assert health_by_name(user_id) == {"huge": health.NETWORK_ERROR, "ok": 200}
+
+
+def test_non_ascii_urls_are_encoded(user_id, server, monkeypatch):
+    hosts = []
+    open_connection = asyncio.open_connection
+
+    def connect_to_stand_in(host, port, **kwargs):
+        hosts.append(host)
+        return open_connection('127.0.0.1', server, **kwargs)
+
+    monkeypatch.setattr(health.asyncio, 'open_connection', connect_to_stand_in)
+    store.add_link(user_id, "café", f"http://bücher.example:{server}/café?q=ü", "")
+
+    health.run_health_check(user_id, delay=0)
+
+    assert health_by_name(user_id) == {"café": 200}
+    assert hosts == ['xn--bcher-kva.example']
+    assert StandInHandler.requests[0][1:3] == ('xn--bcher-kva.example', '/caf%C3%A9?q=%C3%BC')
+
+
+def test_limits_must_be_positive(capsys):
+    with pytest.raises(SystemExit) as exit:
+        health.main(['--per-host', '0'])
+    assert exit.value.code == 2
+    assert 'must be at least 1' in capsys.readouterr().err
@@ -0,0 +1,77 @@
+import io
+
+import importer
+import store
+
+BOOKMARKS = b"""<!DOCTYPE NETSCAPE-Bookmark-file-1>
+<DL><p>
+    <DT><H3>Bookmarks bar</H3>
+    <DL><p>
+        <DT><A HREF="https://python.org" ADD_DATE="1700000000">Python</A>
+        <DD>The language
+        <DT><H3>Databases</H3>
+        <DL><p>
+            <DT><A HREF="https://sqlite.org">SQLite</A>
+        </DL><p>
+        <DT><A HREF="https://pypi.org">PyPI</A>
+    </DL><p>
+    <DT><A HREF="https://example.com/loose">Loose</A>
+    <DT><A HREF="javascript:alert(1)">Bookmarklet</A>
+</DL><p>
+"""
+
+
+def collections_by_name(user_id):
+    return {
+        row[1]: sorted(store.get_link_tags(user_id, row[0])['collection'])
+        for row in store.get_user_links(user_id)
+    }
+
+
+def test_html_import_turns_folders_into_collections(user_id):
+    stats = importer.import_file(user_id, io.BytesIO(BOOKMARKS), 'html', batch_size=2)
+
+    assert (stats['read'], stats['imported'], stats['invalid']) == (5, 4, 1)
+    assert collections_by_name(user_id) == {
+        "Python": ["Bookmarks bar"],
+        "SQLite": ["Bookmarks bar/Databases"],
+        "PyPI": ["Bookmarks bar"],
+        "Loose": [],
+    }
+    python = [row for row in store.get_user_links(user_id) if row[1] == "Python"][0]
+    assert python[3] == "The language"
+    assert python[4].startswith("2023-11-14")
+
+
+def test_existing_links_join_collections_only_when_asked(user_id):
+    store.add_link(user_id, "Saved before", "https://www.python.org/", "")
+    stats = importer.import_file(user_id, io.BytesIO(BOOKMARKS), 'html')
+
+    assert stats['imported'] == 3 and stats['duplicates'] == 1
+    assert collections_by_name(user_id)["Saved before"] == []
+
+    stats = importer.import_file(user_id, io.BytesIO(BOOKMARKS), 'html', collect_existing=True)
+
+    assert stats['imported'] == 0 and stats['duplicates'] == 4
+    assert collections_by_name(user_id)["Saved before"] == ["Bookmarks bar"]
+    assert {row[2]: row[3] for row in store.get_tag_facets(user_id)} == {
+        "Bookmarks bar": 2, "Bookmarks bar/Databases": 1
+    }
+
+
+def test_csv_and_jsonl_imports(user_id):
+    csv_file = b"Title,URL,Folder\nDocs,docs.python.org,Reading\nNo url,,\n"
+    jsonl_file = b'{"name": "Rust", "href": "rust-lang.org", "collection": "Reading"}\nnot json\n[1]\n'
+
+    assert importer.import_file(user_id, io.BytesIO(csv_file), 'csv')['imported'] == 1
+    stats = importer.import_file(user_id, io.BytesIO(jsonl_file), 'jsonl')
+
+    assert (stats['imported'], stats['invalid']) == (1, 2)
+    assert collections_by_name(user_id) == {"Docs": ["Reading"], "Rust": ["Reading"]}
+
+
+def test_csv_with_a_byte_order_mark(user_id):
+    csv_file = "Name,URL\nDocs,docs.python.org\n".encode('utf-8-sig')
+
+    assert importer.import_file(user_id, io.BytesIO(csv_file), 'csv')['imported'] == 1
+    assert [row[1] for row in store.get_user_links(user_id)] == ["Docs"]
@@ -0,0 +1,53 @@
+import os
+import sqlite3
+import threading
+
+import maintenance
+import store
+
+
+def test_backup_pauses_between_steps_and_copies_everything(user_id, db, tmp_path, monkeypatch):
+    store.add_links(user_id, [(f"Link {n}", f"https://example.com/{n}", "x" * 500) for n in range(500)])
+    sleeps = []
+    monkeypatch.setattr(maintenance.time, 'sleep', sleeps.append)
+
+    stats = maintenance.backup_file(db, str(tmp_path / 'copy.db'), pages=16, sleep=0.01)
+
+    # One pause after every step but the last
+    assert stats['steps'] > 2
+    assert sleeps == [0.01] * (stats['steps'] - 1)
+    assert maintenance.verify_backup(str(tmp_path / 'copy.db')) == []
+    copy = sqlite3.connect(str(tmp_path / 'copy.db'))
+    assert copy.execute("SELECT COUNT(*) FROM LINK").fetchone()[0] == 500
+    assert copy.execute("PRAGMA journal_mode").fetchone()[0] == 'delete'
+    copy.close()
+
+
+def test_backup_reads_one_snapshot_while_writers_commit(user_id, db, tmp_path):
+    store.add_links(user_id, [(f"Link {n}", f"https://example.com/{n}", "x" * 500) for n in range(500)])
+    stop = threading.Event()
+
+    def write():
+        n = 0
+        while not stop.is_set():
+            store.add_link(user_id, f"During {n}", f"https://example.com/during/{n}", "")
+            n += 1
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        stats = maintenance.backup_file(db, str(tmp_path / 'copy.db'), pages=8, sleep=0.001)
+    finally:
+        stop.set()
+        writer.join()
+    assert stats['restarts'] == 0
+    assert maintenance.verify_backup(str(tmp_path / 'copy.db')) == []
+
+
+def test_backup_sets_are_verified_and_pruned(user_id, tmp_path):
+    directory = str(tmp_path / 'backups')
+    for _ in range(3):
+        result = maintenance.backup(directory, keep=2)
+    assert len(maintenance.backup_sets(directory)) == 2
+    assert os.path.basename(result['set']) == maintenance.backup_sets(directory)[-1]
+    assert not [name for name in os.listdir(directory) if name.endswith('.partial')]
@@ -0,0 +1,26 @@
+import pandas as pd
+
+import pages
+import store
+
+CREATED = [
+    '2024-03-01 12:30:00', '2024-03-01T12:30:00+02:00', '2024-03-01T23:59:59.123456Z',
+    '2024-03-01', '20240301', '2024-13-45 00:00:00', 'yesterday', '', None,
+    '2024-03-01 12:30:00',
+]
+
+
+def test_format_dates_matches_format_date():
+    expected = [pages.format_date(value) for value in CREATED]
+
+    assert pages.format_dates(pd.Series(CREATED)).tolist() == expected
+    assert pages.format_dates(pd.Series([None, None])).tolist() == ['Unknown', 'Unknown']
+    assert pages.format_dates(pd.Series([], dtype=object)).tolist() == []
+
+
+def test_manage_table_uses_format_date(user_id):
+    store.add_link(user_id, "Python", "https://python.org", "")
+    links, _ = store.get_links_page(user_id, None, 10)
+    table = pages.manage_table(links)
+
+    assert table['Created'].tolist() == [pages.format_date(links[0][pages.PAGE_COLUMNS.index('Created')])]
@@ -0,0 +1,42 @@
+import store
+
+
+def add(user_id, count):
+    store.add_links(user_id, [(f"Link {n}", f"https://example.com/{n}", "") for n in range(count)])
+    return [row[0] for row in store.get_user_links(user_id)]
+
+
+def test_delete_links_reports_the_count(user_id):
+    ids = add(user_id, 3)
+    assert store.delete_links(user_id, ids[:2]) == (True, "2 links deleted successfully!")
+    assert [row[0] for row in store.get_user_links(user_id)] == ids[2:]
+
+
+def test_delete_links_deletes_nothing_unless_every_link_is_found(user_id):
+    ids = add(user_id, 2)
+    store.register_user("Other", "other@example.com", "secret")
+    other_id = store.login_user("other@example.com", "secret")[0]
+    other_link = add(other_id, 1)[0]
+
+    assert store.delete_links(user_id, [999]) == (False, "Link not found.")
+    assert store.delete_links(user_id, [ids[0], 999]) == (False, "No links were deleted: 1 of 2 links not found.")
+    assert store.delete_links(user_id, [ids[0], other_link])[0] is False
+    assert len(store.get_user_links(user_id)) == 2
+    assert len(store.get_user_links(other_id)) == 1
+    # Repeated ids count once
+    assert store.delete_links(user_id, [ids[0], ids[0]]) == (True, "1 links deleted successfully!")
+
+
+def test_update_links_updates_nothing_unless_every_link_is_found(user_id):
+    ids = add(user_id, 2)
+
+    assert store.update_links(user_id, [(999, "Gone", "https://example.com/gone", "")]) == (False, "Link not found.")
+    assert store.update_links(user_id, [
+        (ids[0], "Renamed", "https://example.com/renamed", ""),
+        (999, "Gone", "https://example.com/gone", ""),
+    ]) == (False, "No links were updated: 1 of 2 links not found.")
+    assert "Renamed" not in [row[1] for row in store.get_user_links(user_id)]
+
+    assert store.update_links(user_id, [
+        (link_id, f"Renamed {n}", f"https://example.com/renamed/{n}", "") for n, link_id in enumerate(ids)
+    ]) == (True, "2 links updated successfully!")
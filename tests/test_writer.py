@@ -0,0 +1,127 @@
+import sqlite3
+
+import pytest
+
+import database
+import store
+import writer
+
+
+@pytest.fixture
+def batch_writer(db):
+    batch_writer = writer.BatchWriter()
+    yield batch_writer
+    batch_writer.stop(timeout=5)
+
+
+def link_names(user_id):
+    return [row[1] for row in store.get_user_links(user_id)]
+
+
+def test_duplicate_rolls_back_only_its_operation(user_id, batch_writer):
+    # Queued before the writer starts, so all three share one transaction
+    futures = [
+        batch_writer.add_link(user_id, "First", "https://example.com/a", "", wait=False),
+        batch_writer.add_link(user_id, "Duplicate", "https://www.example.com/a/", "", wait=False),
+        batch_writer.add_link(user_id, "Second", "https://example.com/b", "", ['docs'], wait=False),
+    ]
+    batch_writer.start()
+    results = [future.result(timeout=5) for future in futures]
+
+    assert results[0] == (True, "Link added successfully!")
+    assert results[1][0] is False and "already saved" in results[1][1]
+    assert results[2] == (True, "Link added successfully!")
+    assert batch_writer.stats()['batches'] == 1
+    assert sorted(link_names(user_id)) == ["First", "Second"]
+    second = [row[0] for row in store.get_user_links(user_id) if row[1] == "Second"][0]
+    assert store.get_link_tags(user_id, second)['tag'] == ['docs']
+
+
+def test_update_and_delete_report_missing_links(user_id, batch_writer):
+    batch_writer.start()
+    assert batch_writer.update_link(999, user_id, "Name", "https://example.com", "") == (False, "Link not found.")
+    assert batch_writer.delete_link(999, user_id) == (False, "Link not found.")
+
+
+def test_error_outside_the_transaction_fails_the_batch_and_keeps_running(user_id, batch_writer, monkeypatch):
+    user_pool = database.user_pool
+    monkeypatch.setattr(database, 'user_pool', lambda user_id: 1 / 0)
+    future = batch_writer.add_link(user_id, "Lost", "https://example.com/lost", "", wait=False)
+    batch_writer.start()
+
+    with pytest.raises(ZeroDivisionError):
+        future.result(timeout=5)
+    assert batch_writer.add_link(user_id, "Also lost", "https://example.com/x", "")[0] is False
+
+    monkeypatch.setattr(database, 'user_pool', user_pool)
+    assert batch_writer.add_link(user_id, "Saved", "https://example.com/saved", "") == (True, "Link added successfully!")
+    assert link_names(user_id) == ["Saved"]
+    assert batch_writer.stats()['failed'] == 2
+
+
+def test_lock_outliving_retries_fails_the_batch(user_id, batch_writer, db):
+    pool = database.get_pool()
+    pool.busy_timeout_ms, pool.retries = 0, 1
+    blocker = sqlite3.connect(db, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        success, message = batch_writer.start().add_link(user_id, "Locked", "https://example.com/locked", "")
+    finally:
+        blocker.execute("ROLLBACK")
+        blocker.close()
+
+    assert success is False and 'locked' in message
+    assert batch_writer.add_link(user_id, "Unlocked", "https://example.com/unlocked", "")[0] is True
+    assert link_names(user_id) == ["Unlocked"]
+
+
+def test_queued_durability_acknowledges_before_writing(user_id, db):
+    batch_writer = writer.BatchWriter(durability='queued')
+    try:
+        # The writer isn't running yet, so nothing can have been written
+        assert batch_writer.add_link(user_id, "Queued", "https://example.com/q", "") == (True, "Link queued to be added.")
+        assert batch_writer.add_link(user_id, "Dup", "https://example.com/q", "") == (True, "Link queued to be added.")
+        assert link_names(user_id) == []
+        batch_writer.start().flush()
+        assert link_names(user_id) == ["Queued"]
+        assert batch_writer.stats()['failed'] == 1
+    finally:
+        batch_writer.stop(timeout=5)
+
+
+def test_durability_survives_a_restart_and_a_new_pool(user_id, db):
+    batch_writer = writer.BatchWriter(durability='full')
+    statements = []
+    try:
+        assert batch_writer.start().add_link(user_id, "First", "https://example.com/1", "")[0]
+        batch_writer.stop(timeout=5)
+        database.close_all()
+        database.set_trace_callback(statements.append)
+        assert batch_writer.start().add_link(user_id, "Second", "https://example.com/2", "")[0]
+    finally:
+        database.set_trace_callback(None)
+        batch_writer.stop(timeout=5)
+    assert "PRAGMA synchronous = FULL" in statements
+
+
+def test_rejects_unknown_durability():
+    with pytest.raises(ValueError):
+        writer.BatchWriter(durability='eventually')
+
+
+def test_update_changes_fields_and_tags_in_one_savepoint(user_id, batch_writer, monkeypatch):
+    batch_writer.start()
+    batch_writer.add_link(user_id, "Old", "https://example.com/a", "", ['a'], ['keep'])
+    link_id = store.get_user_links(user_id)[0][0]
+
+    assert batch_writer.update_link(link_id, user_id, "New", "https://example.com/a", "", ['b']) == \
+        (True, "Link updated successfully!")
+    assert store.get_link_tags(user_id, link_id) == {'tag': ['b'], 'collection': ['keep']}
+
+    def broken(*args):
+        raise sqlite3.OperationalError("tag storage failed")
+
+    monkeypatch.setattr(store, 'save_link_tags', broken)
+    success, message = batch_writer.update_link(link_id, user_id, "Newer", "https://example.com/a", "", ['c'])
+    assert success is False and "tag storage failed" in message
+    assert link_names(user_id) == ["New"]
@@ -0,0 +1,77 @@
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+ALLOWED_SCHEMES = ('http', 'https', 'ftp')
+
+
+def normalize_url(url):
+    """Clean up a URL the way the Add Link form does.
+
+    Adds https:// when the scheme is missing, lowercases scheme and host and
+    drops an empty fragment. Returns None for values that are not web links
+    (e.g. javascript: bookmarklets or place: queries).
+    """
+    url = (url or '').strip()
+    if not url:
+        return None
+    if '://' not in url:
+        if ':' in url.split('/', 1)[0] and not url.split(':', 1)[1][:1].isdigit():
+            # scheme without '//' such as javascript:... or mailto:...
+            return None
+        url = 'https://' + url
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return None
+    if parts.scheme.lower() not in ALLOWED_SCHEMES or not parts.hostname:
+        return None
+    netloc = parts.netloc.rsplit('@', 1)
+    netloc[-1] = netloc[-1].lower()
+    return urlunsplit((parts.scheme.lower(), '@'.join(netloc), parts.path, parts.query, parts.fragment))
+
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid',
+    'mc_cid', 'mc_eid', '_ga', '_gl', 'ref_src'
+}
+DEFAULT_PORTS = {'http': 80, 'https': 443, 'ftp': 21}
+
+
+def canonical_url(url):
+    """Reduce a URL to the form used for duplicate detection.
+
+    On top of normalize_url() this treats http and https as the same, drops
+    a leading www., default ports, the fragment, tracking parameters
+    (utm_* and friends) and trailing slashes, and sorts the query string.
+    Returns None for values that are not web links.
+    """
+    url = normalize_url(url)
+    if url is None:
+        return None
+    parts = urlsplit(url)
+    scheme = 'https' if parts.scheme == 'http' else parts.scheme
+    host = parts.hostname
+    if host.startswith('www.'):
+        host = host[4:]
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port != DEFAULT_PORTS.get(parts.scheme):
+        host = f"{host}:{port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS
+    )
+    path = parts.path.rstrip('/')
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+
+def url_hash(url):
+    """64-bit signed hash of the canonical URL, stored in LINK.url_hash"""
+    canonical = canonical_url(url)
+    if canonical is None:
+        canonical = (url or '').strip()
+    digest = hashlib.blake2b(canonical.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
@@ -0,0 +1,273 @@
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+import cache
+import database
+import queries
+import store
+
+# Send the app's single-link writes through the batch writer when LINK_MANAGER_BATCH_WRITES is set
+ENABLED = os.environ.get('LINK_MANAGER_BATCH_WRITES', '') not in ('', '0')
+# Largest number of operations committed together
+MAX_BATCH = int(os.environ.get('LINK_MANAGER_WRITE_BATCH', '500'))
+# How long a batch may wait for more operations once the queue is drained. With the
+# default of 0 batches form on their own from whatever queues up during the previous commit.
+MAX_DELAY = float(os.environ.get('LINK_MANAGER_WRITE_DELAY_MS', '0')) / 1000
+# 'full': every group commit is fsynced before its operations are acknowledged.
+# 'normal': acknowledged once committed to the WAL; the last commits can be lost
+# on power failure (not on an application crash), but nothing waits for the disk.
+# 'queued': acknowledged as soon as the operation is queued, before it is even
+# written; failures (e.g. a duplicate URL) are only counted and logged, and an
+# application crash loses whatever was still queued.
+DURABILITY = os.environ.get('LINK_MANAGER_WRITE_DURABILITY', 'normal')
+# synchronous setting the writer's connections use for each durability level
+DURABILITY_LEVELS = {'full': 'FULL', 'normal': 'NORMAL', 'queued': 'NORMAL'}
+
+
+def _add(conn, user_id, name, link, description, tags=(), collections=()):
+    store.insert_link(conn, user_id, name, link, description, tags, collections)
+    return True, "Link added successfully!"
+
+
+def _update(conn, user_id, link_id, name, link, description, tags=None, collections=None):
+    if store.save_link(conn, link_id, user_id, name, link, description, tags, collections):
+        return True, "Link updated successfully!"
+    return False, "Link not found."
+
+
+def _delete(conn, user_id, link_id):
+    if conn.execute(queries.DELETE_LINK, (link_id, user_id)).rowcount > 0:
+        return True, "Link deleted successfully!"
+    return False, "Link not found."
+
+
+# Operation name: (function run inside the batch transaction, verb for error messages)
+OPERATIONS = {
+    'add': (_add, 'add link'),
+    'update': (_update, 'update link'),
+    'delete': (_delete, 'delete link'),
+}
+# What callers get back with durability='queued'
+QUEUED_MESSAGES = {
+    'add': "Link queued to be added.",
+    'update': "Link queued to be updated.",
+    'delete': "Link queued to be deleted.",
+}
+
+
+class BatchWriter:
+    """Single writer thread that group-commits queued link writes.
+
+    Callers from any thread queue operations and get a Future resolving to
+    the same (success, message) tuple the store functions return. The writer
+    takes everything waiting (up to max_batch, lingering up to max_delay for
+    more when that is set) and runs it in one BEGIN IMMEDIATE
+    transaction per database file (one, unless storage is sharded). Each
+    operation gets its own savepoint, so a duplicate URL only fails that
+    operation. Futures are resolved after COMMIT, or right away with
+    durability='queued'. If a batch fails outside its transaction, its
+    futures get the exception and the writer carries on with the next batch.
+    """
+
+    def __init__(self, max_batch=MAX_BATCH, max_delay=MAX_DELAY, durability=DURABILITY):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"durability must be one of {', '.join(DURABILITY_LEVELS)}")
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.durability = durability
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stopping = False
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.operations = 0
+        self.failed = 0
+        self.commit_seconds = 0.0
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self.run, name='batch-writer', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Write everything already queued, then stop the writer thread"""
+        self._stopping = True
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, operation, user_id, *args):
+        """Queue one operation; returns a Future for its (success, message)"""
+        if operation not in OPERATIONS:
+            raise ValueError(f"Unknown operation: {operation}")
+        if self._stopping:
+            raise RuntimeError("The batch writer is stopped")
+        future = Future()
+        self._queue.put((operation, user_id, args, future))
+        if self.durability == 'queued':
+            acknowledged = Future()
+            acknowledged.set_result((True, QUEUED_MESSAGES[operation]))
+            return acknowledged
+        return future
+
+    def _result(self, operation, future, wait):
+        if not wait:
+            return future
+        try:
+            return future.result()
+        except Exception as e:
+            return False, f"Failed to {OPERATIONS[operation][1]}: {str(e)}"
+
+    def add_link(self, user_id, name, link, description, tags=(), collections=(), wait=True):
+        """Like store.add_link; with wait=False returns the Future without blocking"""
+        return self._result('add', self.submit('add', user_id, name, link, description, tags, collections), wait)
+
+    def update_link(self, link_id, user_id, name, link, description, tags=None, collections=None, wait=True):
+        return self._result(
+            'update', self.submit('update', user_id, link_id, name, link, description, tags, collections), wait
+        )
+
+    def delete_link(self, link_id, user_id, wait=True):
+        return self._result('delete', self.submit('delete', user_id, link_id), wait)
+
+    def flush(self):
+        """Block until everything queued so far has been written (or has failed)"""
+        self._queue.join()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.task_done()
+                self._stopping = True
+                break
+            batch.append(item)
+        return batch
+
+    def run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stopping:
+                    return
+                continue
+            if first is None:
+                self._queue.task_done()
+                if self._stopping and self._queue.empty():
+                    return
+                continue
+            batch = self._collect(first)
+            try:
+                groups = {}
+                for item in batch:
+                    groups.setdefault(database.user_pool(item[1]), []).append(item)
+                for pool, items in groups.items():
+                    self.write(pool, items)
+            except Exception as e:
+                self._fail(batch, e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _fail(self, batch, error):
+        """Hand an unexpected error to every operation of a batch that has no result yet"""
+        print(f"Batch writer: a batch of {len(batch)} operations failed: {error!r}", file=sys.stderr)
+        unresolved = [future for _, _, _, future in batch if not future.done()]
+        with self._lock:
+            self.failed += len(unresolved)
+        for future in unresolved:
+            future.set_exception(error)
+
+    def write(self, pool, batch):
+        """Run a batch in one transaction and resolve its futures after COMMIT"""
+        with pool.checkout() as conn:
+            # Set on every batch: after a restart or a reopened pool the thread's connection is a new one
+            conn.execute(f"PRAGMA synchronous = {DURABILITY_LEVELS[self.durability]}")
+        results = []
+        started = time.perf_counter()
+        try:
+            with pool.transaction() as conn:
+                for operation, user_id, args, future in batch:
+                    results.append(self._apply(conn, operation, user_id, args))
+        except Exception as e:
+            results = [(False, f"Failed to {OPERATIONS[item[0]][1]}: {str(e)}") for item in batch]
+        elapsed = time.perf_counter() - started
+
+        for user_id in {item[1] for item in batch}:
+            cache.query_cache.bump(user_id)
+        with self._lock:
+            self.batches += 1
+            self.operations += len(batch)
+            self.failed += sum(1 for success, _ in results if not success)
+            self.commit_seconds += elapsed
+        for (operation, user_id, args, future), result in zip(batch, results):
+            if self.durability == 'queued' and not result[0]:
+                print(f"Batch writer: queued {operation} for user {user_id} failed: {result[1]}", file=sys.stderr)
+            future.set_result(result)
+
+    def _apply(self, conn, operation, user_id, args):
+        func, verb = OPERATIONS[operation]
+        conn.execute("SAVEPOINT batch_op")
+        try:
+            result = func(conn, user_id, *args)
+        except sqlite3.IntegrityError as e:
+            conn.execute("ROLLBACK TO batch_op")
+            if operation != 'delete' and store.is_duplicate_error(e):
+                result = False, store.duplicate_message(user_id, args[1 if operation == 'add' else 2])
+            else:
+                result = False, f"Failed to {verb}: {str(e)}"
+        except sqlite3.OperationalError as e:
+            if database.is_lock_error(e):
+                raise
+            conn.execute("ROLLBACK TO batch_op")
+            result = False, f"Failed to {verb}: {str(e)}"
+        conn.execute("RELEASE batch_op")
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'batches': self.batches,
+                'operations': self.operations,
+                'failed': self.failed,
+                'average_batch': self.operations / self.batches if self.batches else 0.0,
+                'commit_ms': self.commit_seconds * 1000,
+                'durability': self.durability
+            }
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Return the process-wide batch writer, starting it on first use"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = BatchWriter().start()
+        return _writer
+
+
+def link_writes():
+    """Where single-link writes go: the batch writer when enabled, otherwise store directly.
+
+    Both offer add_link(), update_link() and delete_link() with the same
+    arguments and (success, message) results.
+    """
+    return get_writer() if ENABLED else store